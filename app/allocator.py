@@ -1,12 +1,36 @@
 from __future__ import annotations
 
-from collections import defaultdict
+import time
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING
 
 from app.config import AppConfig
+from app.metrics import REGISTRY
 from app.models import AllocationResult, Request, TimeRange
+from app.profiling import span
+
+if TYPE_CHECKING:
+    from app.free_rooms import FreeRoomSummary
 
 NO_ROOM = "no free room"
 NO_DAY = "no day in shulde"
+ROOM_CLASSES = ("any", "any2", "any6", "big", "big2", "big6")
+
+_BATCH_SECONDS = REGISTRY.histogram("allocation_batch_seconds", "Latency of one allocate_batch call.")
+_REQUEST_SECONDS = REGISTRY.histogram(
+    "allocation_request_seconds",
+    "Average per-request allocation latency within a batch.",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1),
+)
+_RESULTS = REGISTRY.counter("allocation_results_total", "Allocation results by status.")
+_SUMMARY_HITS = REGISTRY.counter("allocation_summary_hits_total", "Requests answered from the free-room summary.")
+
+Reservations = dict[str, dict[str, list[TimeRange]]]
+
+
+def new_reservations() -> Reservations:
+    """Empty day -> room -> reserved slots map shared across allocate_batch calls."""
+    return defaultdict(lambda: defaultdict(list))
 
 
 class RoomAllocator:
@@ -19,9 +43,31 @@ class RoomAllocator:
         self,
         requests: list[Request],
         occupied: dict[str, dict[str, list[TimeRange]]],
+        reserved: Reservations | None = None,
+        summary: FreeRoomSummary | None = None,
+    ) -> list[AllocationResult]:
+        """Allocates `requests` in order.
+
+        Pass the same `reserved` (see `new_reservations`) to consecutive calls to
+        keep several chunks conflict-free as if they were one batch. A `summary`
+        built from the same `occupied` answers room-class requests in standard
+        pair slots without scanning the schedule; results are identical.
+        """
+        with span("allocator.allocate_batch"):
+            return self._allocate_batch(
+                requests, occupied, new_reservations() if reserved is None else reserved, summary
+            )
+
+    def _allocate_batch(
+        self,
+        requests: list[Request],
+        occupied: dict[str, dict[str, list[TimeRange]]],
+        reserved_by_batch: Reservations,
+        summary: FreeRoomSummary | None,
     ) -> list[AllocationResult]:
+        started = time.perf_counter()
         results: list[AllocationResult] = []
-        reserved_by_batch: dict[str, dict[str, list[TimeRange]]] = defaultdict(lambda: defaultdict(list))
+        summary_hits = 0
 
         for request in requests:
             day_key = request.day.isoformat()
@@ -29,7 +75,12 @@ class RoomAllocator:
                 results.append(AllocationResult(request=request, room="", status=NO_DAY))
                 continue
 
-            selected_room = self._pick_room(request, occupied[day_key], reserved_by_batch[day_key])
+            free_rooms = summary.free_rooms(day_key, request.room_type, request.slot) if summary else None
+            if free_rooms is not None:
+                summary_hits += 1
+                selected_room = _first_unreserved(request.slot, free_rooms, reserved_by_batch[day_key])
+            else:
+                selected_room = self._pick_room(request, occupied[day_key], reserved_by_batch[day_key])
             if not selected_room:
                 results.append(AllocationResult(request=request, room="", status=NO_ROOM))
                 continue
@@ -37,6 +88,9 @@ class RoomAllocator:
             reserved_by_batch[day_key][selected_room].append(request.slot)
             results.append(AllocationResult(request=request, room=selected_room, status="ok"))
 
+        _record_batch_metrics(results, time.perf_counter() - started)
+        if summary_hits:
+            _SUMMARY_HITS.inc(summary_hits)
         return results
 
     def _pick_room(
@@ -54,23 +108,49 @@ class RoomAllocator:
         return None
 
     def _candidate_rooms(self, room_type: str) -> list[str]:
-        room_type = room_type.lower()
-        all_rooms = [room for rooms in self._config.allowed_rooms.values() for room in rooms]
-
-        if room_type == "any":
-            return all_rooms
-        if room_type == "any2":
-            return self._config.allowed_rooms.get(2, [])
-        if room_type == "any6":
-            return self._config.allowed_rooms.get(6, [])
-        if room_type == "big":
-            return [room for rooms in self._config.big_rooms.values() for room in rooms]
-        if room_type == "big2":
-            return self._config.big_rooms.get(2, [])
-        if room_type == "big6":
-            return self._config.big_rooms.get(6, [])
-
-        return [room_type]
+        return candidate_rooms(self._config, room_type)
+
+
+def candidate_rooms(config: AppConfig, room_type: str) -> list[str]:
+    """Rooms tried for `room_type`, in preference order; an unknown type is a concrete room number."""
+    room_type = room_type.lower()
+    all_rooms = [room for rooms in config.allowed_rooms.values() for room in rooms]
+
+    if room_type == "any":
+        return all_rooms
+    if room_type == "any2":
+        return config.allowed_rooms.get(2, [])
+    if room_type == "any6":
+        return config.allowed_rooms.get(6, [])
+    if room_type == "big":
+        return [room for rooms in config.big_rooms.values() for room in rooms]
+    if room_type == "big2":
+        return config.big_rooms.get(2, [])
+    if room_type == "big6":
+        return config.big_rooms.get(6, [])
+
+    return [room_type]
+
+
+def _record_batch_metrics(results: list[AllocationResult], elapsed: float) -> None:
+    _BATCH_SECONDS.observe(elapsed)
+    if results:
+        _REQUEST_SECONDS.observe(elapsed / len(results))
+    for status, count in Counter(item.status for item in results).items():
+        _RESULTS.inc(count, status=status)
+
+
+def _first_unreserved(
+    request_slot: TimeRange,
+    free_rooms: tuple[str, ...],
+    reserved_for_day: dict[str, list[TimeRange]],
+) -> str | None:
+    # Reservations are checked here rather than baked into the summary, so any
+    # number of batches can share one summary with their own reservation maps.
+    for room in free_rooms:
+        if _is_free(request_slot, reserved_for_day.get(room, [])):
+            return room
+    return None
 
 
 def _is_free(request_slot: TimeRange, occupied_slots: list[TimeRange]) -> bool:
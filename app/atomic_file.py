@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+
+def write_atomic(path: Path, data: str | bytes) -> None:
+    """Replaces `path` with `data` so readers see either the old file or the new one.
+
+    The temporary file is named after the writing process and thread: the
+    refresher and reader processes (or two threads of one process) may save
+    the same file at once, and each must rename only what it wrote itself.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        if isinstance(data, bytes):
+            tmp_path.write_bytes(data)
+        else:
+            tmp_path.write_text(data, encoding="utf-8")
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
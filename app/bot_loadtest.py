@@ -0,0 +1,229 @@
+"""Load test for the bot message path.
+
+Drives `TelegramBotStub._handle_message` with simulated chats from several
+threads against a stand-in RUZ server, refreshes the schedule halfway through,
+and reports throughput, reply latency percentiles and double bookings.
+
+    python -m app.bot_loadtest --config config.json --chats 5000 --concurrency 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from app.allocator import ROOM_CLASSES
+from app.config import AppConfig, load_config
+from app.free_rooms import format_slot, parse_pair_slots
+from app.ruz_standin import FaultOptions, RuzStandInServer, SyntheticPayloads
+from app.telegram_bot import IncomingMessage, TelegramBotStub
+
+FIRST_NAMES = ("Иван", "Анна", "Пётр", "Мария", "Олег", "Елена")
+LAST_NAMES = ("Петров", "Смирнова", "Иванов", "Кузнецова", "Соколов", "Попова")
+GOALS = ("Семинар", "Консультация", "Встреча клуба", "Пересдача", "Репетиция")
+
+
+@dataclass
+class LoadTestReport:
+    messages: int
+    lines: int
+    seconds: float
+    latencies: list[float] = field(repr=False)
+    statuses: Counter[str]
+    double_bookings: list[str]
+    refreshed: bool
+
+    @property
+    def throughput(self) -> float:
+        return self.messages / self.seconds if self.seconds else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Nearest-rank percentile of reply latency in seconds."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+    def render(self) -> str:
+        statuses = ", ".join(f"{status}={count}" for status, count in sorted(self.statuses.items()))
+        return "\n".join(
+            [
+                f"Messages: {self.messages} ({self.lines} lines) in {self.seconds:.2f} s, {self.throughput:.1f} msg/s",
+                "Latency: "
+                + ", ".join(f"p{q}={self.percentile(q) * 1000:.2f} ms" for q in (50, 95, 99))
+                + f", max={max(self.latencies, default=0.0) * 1000:.2f} ms",
+                f"Statuses: {statuses}",
+                f"Refresh during run: {'yes' if self.refreshed else 'no'}",
+                f"Double bookings: {len(self.double_bookings)}",
+                *(f"  {item}" for item in self.double_bookings[:20]),
+            ]
+        )
+
+
+class _RecordingBot(TelegramBotStub):
+    """Keeps replies instead of printing them."""
+
+    def __init__(self, config: AppConfig) -> None:
+        super().__init__(config)
+        self.replies: dict[str, str] = {}
+
+    def _send_message(self, chat_id: str, text: str) -> None:
+        self.replies[chat_id] = text
+
+
+def generate_messages(config: AppConfig, chats: int, days: list[date], seed: int = 0) -> list[IncomingMessage]:
+    """Peak-hour mix: mostly room classes in standard pairs, some odd times, exact rooms and typos."""
+    rng = random.Random(seed)
+    pairs = parse_pair_slots(config.pair_slots)
+    rooms = [room for items in config.allowed_rooms.values() for room in items]
+    messages = []
+    for chat in range(chats):
+        lines = []
+        for _ in range(rng.choice((1, 1, 1, 2, 3, 5))):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(GOALS)}"
+            day = rng.choice(days).strftime("%d.%m")
+            kind = rng.random()
+            if kind < 0.1:
+                lines.append(f"{name} {day} 25:00")
+                continue
+            if kind < 0.3:
+                hour = rng.randrange(8, 20)
+                start, end = f"{hour:02d}:10", f"{hour + 1:02d}:00"
+            else:
+                start, end = format_slot(rng.choice(pairs)).split("-")
+            room_type = rng.choice(rooms) if kind > 0.9 else rng.choice(ROOM_CLASSES)
+            lines.append(f"{name} {day} {start} {end} {room_type}")
+        messages.append(IncomingMessage(chat_id=f"chat-{chat}", text="\n".join(lines)))
+    return messages
+
+
+def find_double_bookings(replies: dict[str, str]) -> list[str]:
+    booked: dict[tuple[str, str], list[tuple[str, str, str]]] = defaultdict(list)
+    conflicts = []
+    for chat_id, text in replies.items():
+        for record in json.loads(text):
+            if record.get("status") != "ok":
+                continue
+            key = (record["date"], record["room"])
+            for other_chat, start, end in booked[key]:
+                if record["start"] < end and start < record["end"]:
+                    conflicts.append(
+                        f"{key[0]} room {key[1]}: {chat_id} {record['start']}-{record['end']} "
+                        f"vs {other_chat} {start}-{end}"
+                    )
+            booked[key].append((chat_id, record["start"], record["end"]))
+    return conflicts
+
+
+def run_load_test(
+    config: AppConfig,
+    chats: int = 2000,
+    concurrency: int = 8,
+    seed: int = 0,
+    standin_latency: float = 0.0,
+    work_dir: Path | None = None,
+) -> LoadTestReport:
+    """Runs the bot path against a synthetic stand-in RUZ; the schedule is refreshed after half the messages."""
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = work_dir or Path(tmp)
+        standin = RuzStandInServer(
+            ("127.0.0.1", 0), SyntheticPayloads(config, seed=seed), config, FaultOptions(latency_seconds=standin_latency)
+        )
+        threading.Thread(target=standin.serve_forever, daemon=True).start()
+        try:
+            run_config = replace(
+                config,
+                base_url=standin.base_url,
+                schedule_cache_path=str(work_dir / "clean_schedule.json"),
+                metrics_path=str(work_dir / "metrics.prom"),
+            )
+            return _drive(run_config, chats, concurrency, seed, standin)
+        finally:
+            standin.shutdown()
+            standin.server_close()
+
+
+def _drive(config: AppConfig, chats: int, concurrency: int, seed: int, standin: RuzStandInServer) -> LoadTestReport:
+    bot = _RecordingBot(config)
+    bot.service.ensure_schedule_cache()
+    today = date.today()
+    days = [today + timedelta(days=offset) for offset in range(14)]
+    messages = generate_messages(config, chats, days, seed)
+    latencies: list[float] = []
+    lock = threading.Lock()
+    halfway = threading.Event()
+    refreshed = threading.Event()
+
+    # The stand-in serves a different synthetic timetable after the refresh, like
+    # a real schedule update landing in the middle of peak hour.
+    def refresh_midway() -> None:
+        halfway.wait()
+        standin.payloads = SyntheticPayloads(config, seed=seed + 1)
+        bot.service.refresh_schedule_cache()
+        refreshed.set()
+
+    def handle(message: IncomingMessage) -> None:
+        started = time.perf_counter()
+        bot._handle_message(message)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if len(latencies) == len(messages) // 2:
+                halfway.set()
+
+    refresher = threading.Thread(target=refresh_midway, name="loadtest-refresh")
+    refresher.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        list(pool.map(handle, messages))
+    halfway.set()
+    refresher.join()
+    seconds = time.perf_counter() - started
+
+    statuses: Counter[str] = Counter()
+    for text in bot.replies.values():
+        statuses.update(record["status"] for record in json.loads(text))
+    return LoadTestReport(
+        messages=len(messages),
+        lines=sum(len(message.text.splitlines()) for message in messages),
+        seconds=seconds,
+        latencies=latencies,
+        statuses=statuses,
+        double_bookings=find_double_bookings(bot.replies),
+        refreshed=refreshed.is_set(),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bot load test against a stand-in RUZ")
+    parser.add_argument("--config", default="config.json", help="Rooms, buildings and pair slots to simulate")
+    parser.add_argument("--chats", type=int, default=2000, help="Simulated chats, one message each")
+    parser.add_argument("--concurrency", type=int, default=8, help="Threads calling the bot at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--standin-latency", type=float, default=0.0, help="RUZ response delay for the refresh")
+    args = parser.parse_args()
+
+    report = run_load_test(
+        load_config(Path(args.config)),
+        chats=args.chats,
+        concurrency=args.concurrency,
+        seed=args.seed,
+        standin_latency=args.standin_latency,
+    )
+    print(f"Load test at {datetime.now().isoformat(timespec='seconds')}")
+    print(report.render())
+    if report.double_bookings:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
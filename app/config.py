@@ -7,6 +7,17 @@ from typing import Any
 
 
 DEFAULT_CONFIG_PATH = Path("config.json")
+DEFAULT_REFRESH_TIMES = ("04:00", "16:00")
+DEFAULT_PAIR_SLOTS = (
+    "07:30-09:05",
+    "09:15-10:50",
+    "11:00-12:35",
+    "13:00-14:35",
+    "14:45-16:20",
+    "16:30-18:05",
+    "18:15-19:50",
+    "20:00-21:35",
+)
 
 
 @dataclass(frozen=True)
@@ -20,19 +31,27 @@ class AppConfig:
     contact_fields: dict[str, str]
     schedule_window_days_before: int
     schedule_window_months_after: int
-<<<<<<< codex/implement-schedule-management-system-msv8qj
     schedule_range_start_param: str
     schedule_range_finish_param: str
     schedule_range_date_format: str
     schedule_lang_param: str
     schedule_lang_value: int
-=======
-    schedule_range_from_param: str
-    schedule_range_to_param: str
-    schedule_range_date_format: str
->>>>>>> main
     schedule_cache_path: str
     refresh_poll_seconds: int
+    metrics_path: str = "data/metrics.prom"
+    pdf_font_path: str = ""
+    refresh_times: tuple[str, ...] = DEFAULT_REFRESH_TIMES
+    refresh_retry_base_seconds: float = 30.0
+    refresh_retry_max_seconds: float = 1800.0
+    stale_while_revalidate: bool = False
+    schedule_revalidate_after_seconds: int = 43200
+    schedule_max_staleness_seconds: int = 0
+    pair_slots: tuple[str, ...] = DEFAULT_PAIR_SLOTS
+    schedule_changelog_entries: int = 50
+    server_host: str = "127.0.0.1"
+    server_port: int = 8080
+    ruz_timeout_seconds: float = 30.0
+    shared_snapshot_path: str = ""
 
     @staticmethod
     def from_dict(data: dict[str, Any]) -> "AppConfig":
@@ -44,22 +63,38 @@ class AppConfig:
             contact_fields={str(k): str(v) for k, v in data.get("contact_fields", {}).items()},
             schedule_window_days_before=int(data.get("schedule_window_days_before", 1)),
             schedule_window_months_after=int(data.get("schedule_window_months_after", 1)),
-<<<<<<< codex/implement-schedule-management-system-msv8qj
             schedule_range_start_param=str(data.get("schedule_range_start_param", data.get("schedule_range_from_param", "start"))),
             schedule_range_finish_param=str(data.get("schedule_range_finish_param", data.get("schedule_range_to_param", "finish"))),
             schedule_range_date_format=str(data.get("schedule_range_date_format", "%Y-%m-%d")),
             schedule_lang_param=str(data.get("schedule_lang_param", "lng")),
             schedule_lang_value=int(data.get("schedule_lang_value", 1)),
-=======
-            schedule_range_from_param=str(data.get("schedule_range_from_param", "dateFrom")),
-            schedule_range_to_param=str(data.get("schedule_range_to_param", "dateTo")),
-            schedule_range_date_format=str(data.get("schedule_range_date_format", "%Y-%m-%d")),
->>>>>>> main
             schedule_cache_path=str(data.get("schedule_cache_path", "data/clean_schedule.json")),
             refresh_poll_seconds=int(data.get("refresh_poll_seconds", 30)),
+            metrics_path=str(data.get("metrics_path", "data/metrics.prom")),
+            pdf_font_path=str(data.get("pdf_font_path", "")),
+            refresh_times=tuple(str(x) for x in data.get("refresh_times", DEFAULT_REFRESH_TIMES)),
+            refresh_retry_base_seconds=float(data.get("refresh_retry_base_seconds", 30)),
+            refresh_retry_max_seconds=float(data.get("refresh_retry_max_seconds", 1800)),
+            stale_while_revalidate=_bool_field(data, "stale_while_revalidate", False),
+            schedule_revalidate_after_seconds=int(data.get("schedule_revalidate_after_seconds", 43200)),
+            schedule_max_staleness_seconds=int(data.get("schedule_max_staleness_seconds", 0)),
+            pair_slots=tuple(str(x) for x in data.get("pair_slots", DEFAULT_PAIR_SLOTS)),
+            schedule_changelog_entries=int(data.get("schedule_changelog_entries", 50)),
+            server_host=str(data.get("server_host", "127.0.0.1")),
+            server_port=int(data.get("server_port", 8080)),
+            ruz_timeout_seconds=float(data.get("ruz_timeout_seconds", 30)),
+            shared_snapshot_path=str(data.get("shared_snapshot_path", "")),
         )
 
 
+def _bool_field(data: dict[str, Any], name: str, default: bool) -> bool:
+    # bool("false") is True: only JSON true/false are accepted.
+    value = data.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError(f"Invalid {name} {value!r}, expected true or false")
+    return value
+
+
 def load_config(path: Path = DEFAULT_CONFIG_PATH) -> AppConfig:
     with path.open("r", encoding="utf-8") as file:
         payload = json.load(file)
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import http.client
+import threading
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Callable, Mapping
+from urllib.parse import urljoin, urlsplit
+
+from app.metrics import REGISTRY
+from app.ruz_client import USER_AGENT, load_json
+
+if TYPE_CHECKING:
+    from urllib.request import OpenerDirector
+
+_DEDUPLICATED = REGISTRY.counter(
+    "ruz_fetch_deduplicated_total", "RUZ requests answered by an identical in-flight or recent request."
+)
+_CONNECTIONS = REGISTRY.counter("ruz_connections_opened_total", "HTTP connections opened to RUZ by the shared pool.")
+_RATE_WAIT_SECONDS = REGISTRY.histogram("ruz_rate_limit_wait_seconds", "Time RUZ requests waited for the rate limiter.")
+
+# Errors of a kept-alive connection that the server closed while it was idle;
+# the request is resent once on a fresh connection.
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+# Redirects followed like urllib does; more hops than this fail the request.
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+MAX_REDIRECTS = 10
+
+
+class RuzHttpError(RuntimeError):
+    """RUZ answered with an HTTP error status."""
+
+    def __init__(self, url: str, status: int) -> None:
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` requests per second on average, `burst` at once.
+
+    A caller that finds the bucket empty reserves the next token and sleeps
+    until it is due, so waiting callers are served in arrival order.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._rate = rate
+        self._burst = max(burst, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self._burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes one token, waiting if needed; returns the seconds waited. A rate of 0 never waits."""
+        if self._rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections per host; at most `max_connections` requests in flight.
+
+    Redirects are followed, up to `MAX_REDIRECTS`. The connections go straight
+    to the host, so a URL that `proxies` (by default the `http_proxy` /
+    `https_proxy` / `no_proxy` environment, as for urllib) sends through a
+    proxy is downloaded with urllib instead, without keep-alive.
+    """
+
+    def __init__(self, max_connections: int = 4, proxies: Mapping[str, str] | None = None) -> None:
+        self._slots = threading.BoundedSemaphore(max(max_connections, 1))
+        self._idle: dict[tuple[str, str, int | None], list[http.client.HTTPConnection]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._proxies = dict(_environment_proxies() if proxies is None else proxies)
+        self._proxy_opener: OpenerDirector | None = None
+        self.opened = 0
+
+    def get(self, url: str, timeout: float) -> bytes:
+        for _ in range(MAX_REDIRECTS + 1):
+            if self._uses_proxy(url):
+                return self._get_through_proxy(url, timeout)
+            status, location, body = self._get_direct(url, timeout)
+            if status not in REDIRECT_STATUSES:
+                break
+            if not location:
+                raise RuzHttpError(url, status)
+            url = urljoin(url, location)
+        if status >= 300:
+            raise RuzHttpError(url, status)
+        return body
+
+    def _get_direct(self, url: str, timeout: float) -> tuple[int, str | None, bytes]:
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname or "", parts.port)
+        target = f"{parts.path or '/'}?{parts.query}" if parts.query else parts.path or "/"
+        with self._slots:
+            connection, reused = self._checkout(key, timeout)
+            try:
+                try:
+                    response = self._send(connection, target)
+                except _STALE_CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    connection.close()
+                    connection = self._open(key, timeout)
+                    response = self._send(connection, target)
+                body = response.read()
+            except BaseException:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                with self._lock:
+                    self._idle[key].append(connection)
+        return response.status, response.getheader("Location"), body
+
+    def _uses_proxy(self, url: str) -> bool:
+        parts = urlsplit(url)
+        if parts.scheme not in self._proxies:
+            return False
+        from urllib.request import proxy_bypass
+
+        return not proxy_bypass(parts.hostname or "")
+
+    def _get_through_proxy(self, url: str, timeout: float) -> bytes:
+        from urllib.error import HTTPError
+        from urllib.request import ProxyHandler, Request, build_opener
+
+        with self._lock:
+            if self._proxy_opener is None:
+                self._proxy_opener = build_opener(ProxyHandler(self._proxies))
+            opener = self._proxy_opener
+        with self._slots:
+            try:
+                with opener.open(Request(url, headers={"User-Agent": USER_AGENT}), timeout=timeout) as response:
+                    return response.read()
+            except HTTPError as error:
+                raise RuzHttpError(url, error.code) from None
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, defaultdict(list)
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _checkout(self, key: tuple[str, str, int | None], timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle[key]
+            connection = idle.pop() if idle else None
+        if connection is None:
+            return self._open(key, timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _open(self, key: tuple[str, str, int | None], timeout: float) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        factory = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        with self._lock:
+            self.opened += 1
+        _CONNECTIONS.inc()
+        return factory(host, port, timeout=timeout)
+
+    def _send(self, connection: http.client.HTTPConnection, target: str) -> http.client.HTTPResponse:
+        connection.request("GET", target, headers={"User-Agent": USER_AGENT})
+        return connection.getresponse()
+
+
+def _environment_proxies() -> dict[str, str]:
+    from urllib.request import getproxies
+
+    return {scheme: proxy for scheme, proxy in getproxies().items() if scheme in ("http", "https")}
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.finished_at: float | None = None
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class SharedFetchPool:
+    """One RUZ fetch scheduler for every tenant of a process.
+
+    Identical requests (same URL: building, range, date format and language)
+    are downloaded once: callers arriving while it is in flight wait for it,
+    and callers within `dedup_seconds` after it finished get the same decoded
+    payload. Failures are shared with the callers that waited but never
+    remembered. All downloads go through one `ConnectionPool` and one
+    `RateLimiter`, so the load on RUZ does not grow with the number of tenants.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 4,
+        requests_per_second: float = 0.0,
+        burst: int = 4,
+        dedup_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.connections = ConnectionPool(max_connections)
+        self.limiter = RateLimiter(requests_per_second, burst)
+        self._dedup_seconds = dedup_seconds
+        self._clock = clock
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.downloads = 0
+
+    def load_json(self, url: str, timeout: float) -> Any:
+        """`JsonLoader` for `RuzScheduleClient`; the returned payload is shared and must not be modified."""
+        with self._lock:
+            self._forget_expired(self._clock())
+            call = self._calls.get(url)
+            owner = call is None
+            if owner:
+                call = self._calls[url] = _Call()
+                self.downloads += 1
+        if not owner:
+            _DEDUPLICATED.inc(state="recent" if call.done.is_set() else "in_flight")
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for the shared request {url}")
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = load_json(url, timeout, fetch=self._download)
+        except BaseException as error:
+            call.error = error
+            with self._lock:
+                self._calls.pop(url, None)
+            raise
+        finally:
+            call.finished_at = self._clock()
+            call.done.set()
+        return call.value
+
+    def close(self) -> None:
+        self.connections.close()
+
+    def _download(self, url: str, timeout: float) -> bytes:
+        waited = self.limiter.acquire()
+        _RATE_WAIT_SECONDS.observe(waited)
+        return self.connections.get(url, timeout)
+
+    def _forget_expired(self, now: float) -> None:
+        expired = [
+            url
+            for url, call in self._calls.items()
+            if call.finished_at is not None and now - call.finished_at >= self._dedup_seconds
+        ]
+        for url in expired:
+            del self._calls[url]
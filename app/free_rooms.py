@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Mapping
+
+from app.atomic_file import write_atomic
+from app.allocator import ROOM_CLASSES, candidate_rooms
+from app.config import AppConfig
+from app.metrics import REGISTRY
+from app.models import TimeRange
+from app.profiling import span
+
+SUMMARY_FORMAT_VERSION = 1
+
+_BUILD_SECONDS = REGISTRY.histogram("free_room_summary_build_seconds", "Time to precompute the free-room summary.")
+_ENTRIES = REGISTRY.gauge("free_room_summary_entries", "Day x room class x pair slot entries in the summary.")
+
+SummaryKey = tuple[str, str, TimeRange]
+
+
+class FreeRoomSummary:
+    """Free rooms per day, room class and standard pair slot.
+
+    Rooms are kept in the allocator's preference order, so the first room of an
+    entry not reserved by the current batch is exactly what `RoomAllocator`
+    would pick by scanning the schedule. Reservations are not part of the
+    summary: it describes the schedule only and is shared by every batch.
+    `free` may also be a read-only view such as the one `SharedSnapshot` maps.
+    """
+
+    def __init__(self, free: Mapping[SummaryKey, tuple[str, ...]], source: str = "") -> None:
+        self._free = free
+        self.source = source
+
+    @classmethod
+    def build(
+        cls,
+        occupied: dict[str, dict[str, list[TimeRange]]],
+        config: AppConfig,
+        source: str = "",
+    ) -> FreeRoomSummary:
+        return cls({}, source=source).rebuild_days(occupied, config, occupied.keys(), source)
+
+    def rebuild_days(
+        self,
+        occupied: dict[str, dict[str, list[TimeRange]]],
+        config: AppConfig,
+        days: Iterable[str],
+        source: str,
+    ) -> FreeRoomSummary:
+        """Returns a copy with only `days` recomputed from `occupied`; days missing there are dropped."""
+        slots = parse_pair_slots(config.pair_slots)
+        classes = {room_class: candidate_rooms(config, room_class) for room_class in ROOM_CLASSES}
+        rooms = sorted({room for candidates in classes.values() for room in candidates})
+        days = set(days)
+        free = {key: value for key, value in self._free.items() if key[0] not in days}
+        with _BUILD_SECONDS.time(), span("free_rooms.build"):
+            for day in days & occupied.keys():
+                busy_by_room = occupied[day]
+                for slot in slots:
+                    free_now = {
+                        room
+                        for room in rooms
+                        if not any(slot.overlaps(busy) for busy in busy_by_room.get(room, ()))
+                    }
+                    for room_class, candidates in classes.items():
+                        free[(day, room_class, slot)] = tuple(room for room in candidates if room in free_now)
+        _ENTRIES.set(len(free))
+        return FreeRoomSummary(free, source=source)
+
+    def free_rooms(self, day: str, room_type: str, slot: TimeRange) -> tuple[str, ...] | None:
+        """Free rooms for the request, or None when it is not a room class in a standard slot on a known day."""
+        return self._free.get((day, room_type.lower(), slot))
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def items(self) -> Iterable[tuple[SummaryKey, tuple[str, ...]]]:
+        return self._free.items()
+
+    def to_payload(self) -> dict:
+        days: dict[str, dict[str, dict[str, list[str]]]] = {}
+        for (day, room_class, slot), free in self._free.items():
+            days.setdefault(day, {}).setdefault(room_class, {})[format_slot(slot)] = list(free)
+        return {"format": SUMMARY_FORMAT_VERSION, "source": self.source, "days": days}
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> FreeRoomSummary:
+        free: dict[SummaryKey, tuple[str, ...]] = {}
+        for day, classes in payload["days"].items():
+            for room_class, by_slot in classes.items():
+                for token, rooms in by_slot.items():
+                    free[(day, room_class, _parse_slot(token))] = tuple(rooms)
+        return cls(free, source=str(payload.get("source", "")))
+
+
+class FreeRoomSummaryRepository:
+    """Stores the summary next to the schedule cache."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @classmethod
+    def for_cache(cls, cache_path: Path) -> FreeRoomSummaryRepository:
+        return cls(cache_path.with_name(f"{cache_path.stem}.free_rooms.json"))
+
+    def load(self, source: str) -> FreeRoomSummary | None:
+        """Returns the stored summary only if it was built from `source`."""
+        try:
+            payload = json.loads(self._path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if payload.get("format") != SUMMARY_FORMAT_VERSION or payload.get("source") != source:
+            return None
+        return FreeRoomSummary.from_payload(payload)
+
+    def save(self, summary: FreeRoomSummary) -> Path:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self._path, json.dumps(summary.to_payload(), ensure_ascii=False))
+        return self._path
+
+
+def summary_source(config: AppConfig, fetched_at: dict[int, float]) -> str:
+    """Identifies the schedule snapshot and room/slot settings a summary was built from."""
+    key = {
+        "fetched_at": sorted(fetched_at.items()),
+        "rooms": {room_class: candidate_rooms(config, room_class) for room_class in ROOM_CLASSES},
+        "slots": list(config.pair_slots),
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def parse_pair_slots(tokens: Iterable[str]) -> tuple[TimeRange, ...]:
+    result = []
+    for token in tokens:
+        try:
+            result.append(_parse_slot(token))
+        except ValueError:
+            raise ValueError(f"Invalid pair slot {token!r}, expected HH:MM-HH:MM") from None
+    return tuple(result)
+
+
+def format_slot(slot: TimeRange) -> str:
+    return f"{slot.start.strftime('%H:%M')}-{slot.end.strftime('%H:%M')}"
+
+
+def _parse_slot(token: str) -> TimeRange:
+    start, end = token.strip().split("-")
+    return TimeRange(
+        start=datetime.strptime(start.strip(), "%H:%M").time(),
+        end=datetime.strptime(end.strip(), "%H:%M").time(),
+    )
@@ -1,14 +1,14 @@
 from __future__ import annotations
 
 import argparse
-import json
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from app.config import load_config
-from app.parser import RequestParser
-from app.pdf_mode import PdfPayloadBuilder
-from app.service import RoomService
-from app.telegram_bot import run_bot
+if TYPE_CHECKING:
+    from app.service import RoomService
+
+# Mode-specific modules are imported inside the branches that use them: the CLI
+# is started from cron many times a day and most runs need only one mode.
 
 
 def run() -> None:
@@ -17,21 +17,98 @@ def run() -> None:
     parser.add_argument("--input", help="Path to text file with one request per line")
     parser.add_argument(
         "--mode",
-        choices=["allocate", "pdf", "refresh", "bot"],
+        choices=["allocate", "pdf", "refresh", "bot", "serve", "stats"],
         default="allocate",
-        help="allocate = print decisions, pdf = save printable payload, refresh = update cache, bot = run bot stub",
+        help=(
+            "allocate = print decisions, pdf = save printable payload, refresh = update cache, "
+            "bot = run bot stub, serve = run HTTP/JSON API, stats = print runtime metrics"
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        default="output/report.txt",
+        help="Output file for pdf mode; a .pdf suffix renders a real PDF grouped by day and room",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="allocate mode: read --input lazily and print JSON Lines, reporting malformed lines instead of failing",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Requests per allocation chunk for --stream and pdf mode")
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=1,
+        help="Processes used to parse very large --input files (non-stream allocate)",
+    )
+    parser.add_argument("--profile", action="store_true", help="Run the selected mode under cProfile with spans enabled")
+    parser.add_argument("--profile-output", default="output/profile.pstats", help="pstats file for --profile")
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also trace allocations with tracemalloc and save the peak and top allocation sites",
     )
-    parser.add_argument("--output", default="output/report.txt", help="Output file for pdf mode")
     args = parser.parse_args()
 
+    if not args.profile:
+        _run_mode(args)
+        return
+
+    from app.profiling import print_profile_summary, profile_call
+
+    _, artifacts = profile_call(
+        lambda: _run_mode(args),
+        output_path=Path(args.profile_output),
+        trace_memory=args.profile_memory,
+    )
+    print_profile_summary(artifacts)
+
+
+def _run_mode(args: argparse.Namespace) -> None:
     config_path = Path(args.config)
+
+    if args.mode == "bot":
+        from app.telegram_bot import run_bot
+
+        run_bot(config_path)
+        return
+
+    from app.config import load_config
+
     config = load_config(config_path)
+
+    if args.mode == "serve":
+        from app.profiling import install_span_toggle_signal
+        from app.server import run_server
+
+        install_span_toggle_signal()
+        run_server(config)
+        return
+
+    if args.mode == "stats":
+        from app.metrics import render_stats
+
+        print(render_stats(Path(config.metrics_path), Path(config.schedule_cache_path)), end="")
+        return
+
+    from app.service import RoomService
+
     service = RoomService(config)
 
     if args.mode == "refresh":
         occupied = service.refresh_schedule_cache()
         stats = service.last_fetch_stats
         print(f"Cache updated: {config.schedule_cache_path}. Days loaded: {len(occupied)}")
+        if service.last_failed_buildings:
+            ages = service.building_ages()
+            kept = ", ".join(
+                f"{number} ({ages[number] / 3600:.1f} h old)" if number in ages else f"{number} (no data)"
+                for number in service.last_failed_buildings
+            )
+            print(f"Failed buildings kept previous data: {kept}")
+        diff = service.last_schedule_diff
+        if diff is not None:
+            print(f"Changes: {diff.summary_line()}")
         if stats:
             print(
                 "Fetch stats: "
@@ -40,44 +117,73 @@ def run() -> None:
                 f"missing_date_time={stats.skipped_no_time_or_date}, bad_date_time={stats.skipped_bad_date_or_time}, "
                 f"out_of_range={stats.skipped_out_of_range}"
             )
-        return
-
-    if args.mode == "bot":
-        run_bot(config_path)
+        service.write_metrics()
         return
 
     if not args.input:
         raise ValueError("--input is required for allocate/pdf mode")
 
-    lines = [line for line in Path(args.input).read_text(encoding="utf-8").splitlines() if line.strip()]
-    requests = [RequestParser.parse(line) for line in lines]
-
-    allocations = service.allocate(requests)
-
-    if args.mode == "allocate":
-        print(
-            json.dumps(
-                [
-                    {
-                        "name": item.request.full_name,
-                        "goal": item.request.goal,
-                        "date": item.request.day.isoformat(),
-                        "start": item.request.slot.start.strftime("%H:%M"),
-                        "end": item.request.slot.end.strftime("%H:%M"),
-                        "room": item.room,
-                        "status": item.status,
-                    }
-                    for item in allocations
-                ],
-                ensure_ascii=False,
-                indent=2,
-            )
-        )
+    if args.stream:
+        if args.mode != "allocate":
+            raise ValueError("--stream is supported only in allocate mode")
+        _run_streaming_allocate(service, Path(args.input), args.chunk_size)
+        service.write_metrics()
         return
 
-    builder = PdfPayloadBuilder(config)
-    result_path = builder.save_report(allocations, Path(args.output))
-    print(f"Saved report payload to: {result_path}")
+    if args.mode == "pdf":
+        result_path = _run_streaming_report(service, Path(args.input), Path(args.output), args.chunk_size)
+        service.write_metrics()
+        print(f"Saved report payload to: {result_path}")
+        return
+
+    import json
+    import sys
+
+    from app.parser import RequestParser
+
+    lines = Path(args.input).read_text(encoding="utf-8").splitlines()
+    batch = RequestParser.parse_many(lines, workers=args.parse_workers)
+    for error in batch.errors:
+        print(f"{args.input}:{error.line_number}: {error.message}", file=sys.stderr)
+
+    allocations = service.allocate(batch.requests)
+    service.write_metrics()
+    print(json.dumps([item.to_payload() for item in allocations], ensure_ascii=False, indent=2))
+
+
+def _run_streaming_allocate(service: RoomService, input_path: Path, chunk_size: int) -> None:
+    import sys
+
+    from app.streaming import stream_allocations, write_json_lines
+
+    occupied, summary = service.ensure_schedule_and_summary()
+    with input_path.open("r", encoding="utf-8") as lines:
+        records = stream_allocations(lines, service.allocator, occupied, chunk_size=chunk_size, summary=summary)
+        write_json_lines(records, sys.stdout)
+
+
+def _run_streaming_report(service: RoomService, input_path: Path, output_path: Path, chunk_size: int) -> Path:
+    """Allocates --input chunk by chunk into the report; a PDF is grouped by day, one day in memory at a time."""
+    import sys
+    from typing import Iterator
+
+    from app.models import AllocationResult
+    from app.streaming import allocate_in_chunks
+
+    occupied, summary = service.ensure_schedule_and_summary()
+    with input_path.open("r", encoding="utf-8") as lines:
+
+        def allocations() -> Iterator[AllocationResult]:
+            for batch, results in allocate_in_chunks(lines, service.allocator, occupied, chunk_size, summary=summary):
+                for error in batch.errors:
+                    print(f"{input_path}:{error.line_number}: {error.message}", file=sys.stderr)
+                yield from results
+
+        if output_path.suffix.lower() == ".pdf":
+            from app.pdf_mode import group_by_day
+
+            return service.report_builder.save_report(group_by_day(allocations()), output_path)
+        return service.report_builder.save_report(allocations(), output_path)
 
 
 if __name__ == "__main__":
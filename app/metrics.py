@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Iterator
+
+from app.atomic_file import write_atomic
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+# Labels added to every sample recorded in the current context, see `default_labels`.
+_DEFAULT_LABELS: ContextVar[dict[str, str]] = ContextVar("metrics_default_labels", default={})
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, lock: threading.Lock) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._lock = lock
+
+    def samples(self) -> list[tuple[str, LabelKey, float]]:
+        raise NotImplementedError
+
+    def render(self, match: LabelKey = ()) -> list[str]:
+        samples = [sample for sample in self.samples() if set(match) <= set(sample[1])]
+        if not samples:
+            return []
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, lock: threading.Lock) -> None:
+        super().__init__(name, help_text, lock)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> list[tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Last observed value, optionally split by labels."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, lock: threading.Lock) -> None:
+        super().__init__(name, help_text, lock)
+        self._values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def value(self, **labels: str) -> float | None:
+        with self._lock:
+            return self._values.get(_label_key(labels))
+
+    def samples(self) -> list[tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket histogram compatible with Prometheus text format."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, lock: threading.Lock, buckets: tuple[float, ...]) -> None:
+        super().__init__(name, help_text, lock)
+        self._buckets = tuple(sorted(buckets))
+        self._counts: dict[LabelKey, list[int]] = {}
+        self._sums: dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self._buckets) + 1))
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(_label_key(labels), []))
+
+    def samples(self) -> list[tuple[str, LabelKey, float]]:
+        result: list[tuple[str, LabelKey, float]] = []
+        with self._lock:
+            for key in sorted(self._counts):
+                cumulative = 0
+                for bound, count in zip(self._buckets + (float("inf"),), self._counts[key]):
+                    cumulative += count
+                    result.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+                result.append((f"{self.name}_sum", key, self._sums[key]))
+                result.append((f"{self.name}_count", key, cumulative))
+        return result
+
+
+class MetricsRegistry:
+    """Thread-safe collection of named metrics for one process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Serializes the read-merge-write of a metrics file by threads of one
+        # process (bot replies, refresher): without it one thread's merge could
+        # replace another's with a file read before that merge was written.
+        self._write_lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+        # Counter and histogram samples last added to each file, so a later write adds only the growth since.
+        self._written: dict[Path, dict[str, float]] = {}
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help_text, self._lock), Counter)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(name, lambda: Gauge(name, help_text, self._lock), Gauge)
+
+    def histogram(self, name: str, help_text: str = "", buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help_text, self._lock, buckets), Histogram)
+
+    def render(self, **match: str) -> str:
+        """Text exposition; with `match`, only the samples carrying all of those labels."""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        key = tuple((name, str(value)) for name, value in sorted(match.items()))
+        lines = [line for metric in metrics for line in metric.render(key)]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write(self, path: Path, **match: str) -> Path:
+        """Merges the text exposition into `path`, keeping families from earlier runs that this process did not touch.
+
+        Every CLI invocation is a separate process, so a refresh run and a later
+        allocate run each contribute their own families to the same file.
+        Counters and histograms keep adding up across runs: each write adds what
+        this process counted since its previous write to the values in the
+        file. Gauges are replaced by this process's values.
+        `match` limits the file to samples with those labels, as in `render`.
+        """
+        fresh = _split_families(self.render(**match))
+        with self._write_lock:
+            previous = _split_families(path.read_text(encoding="utf-8")) if path.exists() else {}
+            written = self._written.setdefault(path.resolve(), {})
+            merged = dict(previous)
+            for name, block in fresh.items():
+                if _family_kind(block) in ("counter", "histogram"):
+                    block = _accumulate(previous.get(name), block, written)
+                merged[name] = block
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(path, "".join(merged[name] for name in sorted(merged)))
+        return path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+        with self._write_lock:
+            self._written.clear()
+
+    def _get_or_create(self, name: str, factory: Callable[[], _Metric], kind: type[_Metric]):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self._metrics[name] = metric
+        if not isinstance(metric, kind):
+            raise ValueError(f"Metric {name} is already registered as {metric.kind}")
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+
+@contextmanager
+def default_labels(**labels: str) -> Iterator[None]:
+    """Adds `labels` to every metric recorded or read in this context; explicit labels win.
+
+    Context variables are not inherited by new threads: a thread started
+    inside the block has to enter it again.
+    """
+    token = _DEFAULT_LABELS.set({**_DEFAULT_LABELS.get(), **labels})
+    try:
+        yield
+    finally:
+        _DEFAULT_LABELS.reset(token)
+
+
+def render_stats(metrics_path: Path, cache_path: Path, now: float | None = None) -> str:
+    """Returns the persisted exposition plus a live refresh-age gauge."""
+    text = metrics_path.read_text(encoding="utf-8") if metrics_path.exists() else ""
+    if cache_path.exists():
+        age = max((now if now is not None else time.time()) - cache_path.stat().st_mtime, 0.0)
+        text += (
+            "# HELP schedule_refresh_age_seconds Seconds since the schedule cache was last written.\n"
+            "# TYPE schedule_refresh_age_seconds gauge\n"
+            f"schedule_refresh_age_seconds {_format_value(round(age, 3))}\n"
+        )
+    return text
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in {**_DEFAULT_LABELS.get(), **labels}.items()))
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _split_families(text: str) -> dict[str, str]:
+    families: dict[str, list[str]] = {}
+    current: str | None = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            current = line.split()[2]
+            families[current] = []
+        if current is not None and line.strip():
+            families[current].append(line)
+    return {name: "\n".join(lines) + "\n" for name, lines in families.items()}
+
+
+def _family_kind(block: str) -> str | None:
+    for line in block.splitlines():
+        if line.startswith("# TYPE "):
+            return line.split()[3]
+    return None
+
+
+def _accumulate(previous: str | None, fresh: str, written: dict[str, float]) -> str:
+    """`fresh` with the values of `previous` (same family, from the file) plus the growth since the last write."""
+    totals: dict[str, float] = {}
+    if previous is not None and _family_kind(previous) == _family_kind(fresh):
+        totals = {key: value for key, value in _samples(previous)}
+    header = [line for line in fresh.splitlines() if line.startswith("#")]
+    for key, value in _samples(fresh):
+        totals[key] = totals.get(key, 0.0) + value - written.get(key, 0.0)
+        written[key] = value
+    return "\n".join(header + [f"{key} {_format_value(value)}" for key, value in totals.items()]) + "\n"
+
+
+def _samples(block: str) -> Iterator[tuple[str, float]]:
+    for line in block.splitlines():
+        if line and not line.startswith("#"):
+            key, _, value = line.rpartition(" ")
+            yield key, float(value)
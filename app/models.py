@@ -33,3 +33,14 @@ class AllocationResult:
     request: Request
     room: str
     status: str
+
+    def to_payload(self) -> dict[str, str]:
+        return {
+            "name": self.request.full_name,
+            "goal": self.request.goal,
+            "date": self.request.day.isoformat(),
+            "start": self.request.slot.start.strftime("%H:%M"),
+            "end": self.request.slot.end.strftime("%H:%M"),
+            "room": self.room,
+            "status": self.status,
+        }
@@ -1,9 +1,44 @@
 from __future__ import annotations
 
-from datetime import datetime
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Iterator
 
 from app.models import Request, TimeRange
 
+INVALID_REQUEST = "invalid request"
+PARALLEL_CHUNK_SIZE = 20_000
+
+_DAY_RE = re.compile(r"(\d{1,2})\.(\d{1,2})")
+_CLOCK_RE = re.compile(r"(\d{1,2}):(\d{1,2})")
+
+
+@dataclass(frozen=True)
+class ParseError:
+    """One rejected input line."""
+
+    line_number: int
+    line: str
+    message: str
+
+    def to_payload(self) -> dict[str, object]:
+        return {"line": self.line_number, "status": INVALID_REQUEST, "error": self.message}
+
+
+@dataclass
+class ParseBatch:
+    """Parsed requests with their 1-based input line numbers, plus per-line errors."""
+
+    entries: list[tuple[int, Request]] = field(default_factory=list)
+    errors: list[ParseError] = field(default_factory=list)
+
+    @property
+    def requests(self) -> list[Request]:
+        return [request for _, request in self.entries]
+
 
 class RequestParser:
     """Parses incoming plain-text requests.
@@ -14,24 +49,84 @@ class RequestParser:
 
     @staticmethod
     def parse(raw_line: str, year: int | None = None) -> Request:
-        cleaned = raw_line.strip().strip("[]")
-        parts = cleaned.split()
-        if len(parts) < 6:
-            raise ValueError(f"Invalid request format: {raw_line}")
+        return _parse_line(raw_line, year or datetime.now().year)
+
+    @staticmethod
+    def parse_many(lines: Iterable[str], year: int | None = None, workers: int = 1) -> ParseBatch:
+        """Parses every non-empty line, collecting errors instead of raising.
+
+        With `workers > 1` and more than `PARALLEL_CHUNK_SIZE` lines the input is
+        split into chunks parsed in a process pool; results keep input order.
+        """
+        numbered = [(number, line) for number, line in enumerate(lines, start=1) if line.strip()]
+        current_year = year or datetime.now().year
+        if workers <= 1 or len(numbered) <= PARALLEL_CHUNK_SIZE:
+            return RequestParser.parse_numbered(numbered, current_year)
+
+        from concurrent.futures import ProcessPoolExecutor
 
-        first_name, last_name = parts[0], parts[1]
-        day_token, start_token, end_token, room_type = parts[-4], parts[-3], parts[-2], parts[-1]
-        goal = " ".join(parts[2:-4])
+        chunks = [numbered[index : index + PARALLEL_CHUNK_SIZE] for index in range(0, len(numbered), PARALLEL_CHUNK_SIZE)]
+        batch = ParseBatch()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(RequestParser.parse_numbered, chunks, [current_year] * len(chunks)):
+                batch.entries.extend(part.entries)
+                batch.errors.extend(part.errors)
+        return batch
 
+    @staticmethod
+    def parse_numbered(numbered: Iterable[tuple[int, str]], year: int | None = None) -> ParseBatch:
         current_year = year or datetime.now().year
-        day = datetime.strptime(f"{day_token}.{current_year}", "%d.%m.%Y").date()
-        start = datetime.strptime(start_token, "%H:%M").time()
-        end = datetime.strptime(end_token, "%H:%M").time()
-
-        return Request(
-            full_name=f"{first_name} {last_name}",
-            goal=goal,
-            day=day,
-            slot=TimeRange(start=start, end=end),
-            room_type=room_type,
-        )
+        batch = ParseBatch()
+        for number, line in numbered:
+            try:
+                batch.entries.append((number, _parse_line(line, current_year)))
+            except ValueError as error:
+                batch.errors.append(ParseError(line_number=number, line=line, message=str(error)))
+        return batch
+
+    @staticmethod
+    def iter_batches(lines: Iterable[str], chunk_size: int, year: int | None = None) -> Iterator[ParseBatch]:
+        """Lazily yields one `ParseBatch` per `chunk_size` non-empty lines."""
+        current_year = year or datetime.now().year
+        numbered = ((number, line.rstrip("\r\n")) for number, line in enumerate(lines, start=1) if line.strip())
+        while True:
+            chunk = list(islice(numbered, max(chunk_size, 1)))
+            if not chunk:
+                return
+            yield RequestParser.parse_numbered(chunk, current_year)
+
+
+def _parse_line(raw_line: str, year: int) -> Request:
+    parts = raw_line.strip().strip("[]").split()
+    if len(parts) < 6:
+        raise ValueError(f"Invalid request format: {raw_line}")
+
+    return Request(
+        full_name=f"{parts[0]} {parts[1]}",
+        goal=" ".join(parts[2:-4]),
+        day=_parse_day(parts[-4], year),
+        slot=TimeRange(start=_parse_clock(parts[-3]), end=_parse_clock(parts[-2])),
+        room_type=parts[-1],
+    )
+
+
+@lru_cache(maxsize=2048)
+def _parse_day(token: str, year: int) -> date:
+    match = _DAY_RE.fullmatch(token)
+    if not match:
+        raise ValueError(f"Invalid day: {token}")
+    try:
+        return date(year, int(match.group(2)), int(match.group(1)))
+    except ValueError as error:
+        raise ValueError(f"Invalid day: {token} ({error})") from None
+
+
+@lru_cache(maxsize=2048)
+def _parse_clock(token: str) -> time:
+    match = _CLOCK_RE.fullmatch(token)
+    if not match:
+        raise ValueError(f"Invalid time: {token}")
+    try:
+        return time(int(match.group(1)), int(match.group(2)))
+    except ValueError as error:
+        raise ValueError(f"Invalid time: {token} ({error})") from None
@@ -1,36 +1,131 @@
 from __future__ import annotations
 
+import pickle
+import tempfile
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
 
 from app.config import AppConfig
 from app.models import AllocationResult
 
 
+def report_sort_key(item: AllocationResult) -> tuple[str, str, str, str]:
+    """Orders allocations by day, room and start time, as expected by the grouped PDF report."""
+    return (item.request.day.isoformat(), item.room or "~", item.request.slot.start.strftime("%H:%M"), item.status)
+
+
+def group_by_day(allocations: Iterable[AllocationResult]) -> Iterator[AllocationResult]:
+    """Yields `allocations` ordered by `report_sort_key`, holding only one day in memory.
+
+    Each allocation is first spilled to a temporary file of its day; the days
+    are then read back in order and sorted one at a time.
+    """
+    with tempfile.TemporaryDirectory(prefix="report-days-") as directory:
+        files: dict[str, BinaryIO] = {}
+        try:
+            for item in allocations:
+                day = item.request.day.isoformat()
+                file = files.get(day)
+                if file is None:
+                    file = files[day] = (Path(directory) / f"{day}.pickle").open("w+b")
+                pickle.dump(item, file, protocol=pickle.HIGHEST_PROTOCOL)
+            for day in sorted(files):
+                file = files[day]
+                file.seek(0)
+                items: list[AllocationResult] = []
+                while True:
+                    try:
+                        items.append(pickle.load(file))
+                    except EOFError:
+                        break
+                yield from sorted(items, key=report_sort_key)
+        finally:
+            for file in files.values():
+                file.close()
+
+
 class PdfPayloadBuilder:
-    """Builds a lightweight printable payload for future PDF rendering."""
+    """Builds the printable allocation report as text or as a paginated PDF.
+
+    Both outputs are produced row by row from any iterable of allocations, so the
+    report can be regenerated after every batch without holding it in memory.
+    """
 
     def __init__(self, config: AppConfig) -> None:
         self._config = config
 
-    def build_text_report(self, allocations: list[AllocationResult]) -> str:
-        lines = ["Room allocation report", "====================", ""]
-        if self._config.contact_fields:
-            lines.append("Configured contacts:")
-            for key, value in self._config.contact_fields.items():
-                lines.append(f"- {key}: {value}")
-            lines.append("")
+    def build_text_report(self, allocations: Iterable[AllocationResult]) -> str:
+        return "\n".join(self.iter_text_lines(allocations))
 
-        lines.append("Requests:")
+    def iter_text_lines(self, allocations: Iterable[AllocationResult]) -> Iterator[str]:
+        yield from self._header_lines()
+        yield "Requests:"
         for item in allocations:
-            lines.append(
+            yield (
                 f"- {item.request.full_name} | {item.request.goal} | {item.request.day.isoformat()} "
                 f"{item.request.slot.start.strftime('%H:%M')}-{item.request.slot.end.strftime('%H:%M')} "
                 f"=> {item.room or item.status}"
             )
 
-        return "\n".join(lines)
+    def save_report(self, allocations: Iterable[AllocationResult], output_path: Path) -> Path:
+        """Writes a PDF when `output_path` ends with `.pdf`, otherwise the text report."""
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        if output_path.suffix.lower() == ".pdf":
+            return self.save_pdf_report(allocations, output_path)
+
+        with output_path.open("w", encoding="utf-8") as file:
+            for index, line in enumerate(self.iter_text_lines(allocations)):
+                if index:
+                    file.write("\n")
+                file.write(line)
+        return output_path
+
+    def save_pdf_report(self, allocations: Iterable[AllocationResult], output_path: Path) -> Path:
+        """Writes a PDF grouped by day and room.
+
+        Groups are started whenever the day or room changes, so pass allocations
+        sorted with `report_sort_key` (or through `group_by_day`) to get one
+        section per day and room.
+        """
+        from app.pdf_writer import PdfWriter, load_font
 
-    def save_report(self, allocations: list[AllocationResult], output_path: Path) -> Path:
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        output_path.write_text(self.build_text_report(allocations), encoding="utf-8")
+        with output_path.open("wb") as file:
+            writer = PdfWriter(file, load_font(self._config.pdf_font_path))
+            writer.add_line("Room allocation report", size=16.0)
+            for line in self._contact_lines():
+                writer.add_line(line)
+
+            current_day: str | None = None
+            current_room: str | None = None
+            for item in allocations:
+                day = item.request.day.isoformat()
+                room = item.room or item.status
+                if day != current_day:
+                    writer.add_line(day, size=13.0, space_before=10.0)
+                    current_day, current_room = day, None
+                if room != current_room:
+                    label = f"Room {room}" if item.room else room
+                    writer.add_line(label, size=11.0, indent=10.0, space_before=4.0)
+                    current_room = room
+                writer.add_line(
+                    f"{item.request.slot.start.strftime('%H:%M')}-{item.request.slot.end.strftime('%H:%M')}  "
+                    f"{item.request.full_name} | {item.request.goal}",
+                    indent=24.0,
+                )
+            writer.close()
         return output_path
+
+    def _header_lines(self) -> Iterator[str]:
+        yield "Room allocation report"
+        yield "===================="
+        yield ""
+        if self._config.contact_fields:
+            yield from self._contact_lines()
+            yield ""
+
+    def _contact_lines(self) -> Iterator[str]:
+        if self._config.contact_fields:
+            yield "Configured contacts:"
+            for key, value in self._config.contact_fields.items():
+                yield f"- {key}: {value}"
@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+A4_SIZE = (595.28, 841.89)
+
+# Searched in order when no font is configured; the first existing file is embedded.
+DEFAULT_FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+)
+
+
+class BuiltinFont:
+    """Standard Helvetica with WinAnsi encoding; characters outside cp1252 become '?'."""
+
+    def __init__(self) -> None:
+        self.name = "Helvetica"
+
+    def encode(self, text: str) -> bytes:
+        raw = text.encode("cp1252", errors="replace")
+        escaped = raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        return b"(" + escaped + b")"
+
+    def width(self, text: str, size: float) -> float:
+        # Average Helvetica advance; good enough for wrapping.
+        return len(text) * size * 0.52
+
+    def write_objects(self, writer: PdfWriter, font_id: int) -> None:
+        writer.write_object(
+            font_id,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        )
+
+
+class TrueTypeFont:
+    """Embeds a TrueType file as a CID font (Identity-H), so Cyrillic renders correctly.
+
+    Only the tables needed for layout are parsed; the font file itself is copied
+    into the PDF in chunks when the document is closed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.name = "F" + "".join(ch for ch in path.stem if ch.isalnum())
+        data = path.read_bytes()
+        tables = _read_table_directory(data)
+        head = tables["head"]
+        hhea = tables["hhea"]
+        self._units_per_em = struct.unpack_from(">H", data, head + 18)[0]
+        self._bbox = struct.unpack_from(">4h", data, head + 36)
+        self._ascent, self._descent = struct.unpack_from(">hh", data, hhea + 4)
+        metrics_count = struct.unpack_from(">H", data, hhea + 34)[0]
+        self._advances = [
+            struct.unpack_from(">H", data, tables["hmtx"] + index * 4)[0] for index in range(metrics_count)
+        ]
+        self._cmap = _read_cmap(data, tables["cmap"])
+        self._used: dict[int, int] = {}
+
+    def glyph(self, char: str) -> int:
+        return self._cmap.get(ord(char), 0)
+
+    def encode(self, text: str) -> bytes:
+        glyphs = []
+        for char in text:
+            glyph = self.glyph(char)
+            self._used.setdefault(glyph, ord(char))
+            glyphs.append(glyph)
+        return b"<" + "".join(f"{glyph:04X}" for glyph in glyphs).encode("ascii") + b">"
+
+    def width(self, text: str, size: float) -> float:
+        return sum(self._advance(self.glyph(char)) for char in text) * size / self._units_per_em
+
+    def write_objects(self, writer: PdfWriter, font_id: int) -> None:
+        descendant_id, descriptor_id, file_id, to_unicode_id = (writer.new_object_id() for _ in range(4))
+        scale = 1000 / self._units_per_em
+        widths = " ".join(f"{glyph} [{round(self._advance(glyph) * scale)}]" for glyph in sorted(self._used))
+        bbox = " ".join(str(round(value * scale)) for value in self._bbox)
+
+        writer.write_object(
+            font_id,
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /{self.name} /Encoding /Identity-H "
+            f"/DescendantFonts [{descendant_id} 0 R] /ToUnicode {to_unicode_id} 0 R >>".encode("ascii"),
+        )
+        writer.write_object(
+            descendant_id,
+            f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{self.name} "
+            f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            f"/FontDescriptor {descriptor_id} 0 R /CIDToGIDMap /Identity /W [{widths}] >>".encode("ascii"),
+        )
+        writer.write_object(
+            descriptor_id,
+            f"<< /Type /FontDescriptor /FontName /{self.name} /Flags 32 /FontBBox [{bbox}] /ItalicAngle 0 "
+            f"/Ascent {round(self._ascent * scale)} /Descent {round(self._descent * scale)} "
+            f"/CapHeight {round(self._ascent * scale)} /StemV 80 /FontFile2 {file_id} 0 R >>".encode("ascii"),
+        )
+        writer.write_file_stream(file_id, self.path)
+        writer.write_stream(to_unicode_id, self._to_unicode_cmap())
+
+    def _advance(self, glyph: int) -> int:
+        if glyph < len(self._advances):
+            return self._advances[glyph]
+        return self._advances[-1]
+
+    def _to_unicode_cmap(self) -> bytes:
+        mappings = [(glyph, codepoint) for glyph, codepoint in sorted(self._used.items()) if codepoint <= 0xFFFF]
+        lines = [
+            "/CIDInit /ProcSet findresource begin",
+            "12 dict begin",
+            "begincmap",
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            "/CMapName /Adobe-Identity-UCS def",
+            "/CMapType 2 def",
+            "1 begincodespacerange",
+            "<0000> <FFFF>",
+            "endcodespacerange",
+        ]
+        for index in range(0, len(mappings), 100):
+            block = mappings[index : index + 100]
+            lines.append(f"{len(block)} beginbfchar")
+            lines.extend(f"<{glyph:04X}> <{codepoint:04X}>" for glyph, codepoint in block)
+            lines.append("endbfchar")
+        lines.extend(["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"])
+        return "\n".join(lines).encode("ascii")
+
+
+def load_font(font_path: str = "") -> BuiltinFont | TrueTypeFont:
+    """Returns the configured TrueType font, the first available default one, or Helvetica."""
+    candidates = [font_path] if font_path else list(DEFAULT_FONT_CANDIDATES)
+    for candidate in candidates:
+        path = Path(candidate)
+        if path.is_file():
+            return TrueTypeFont(path)
+    return BuiltinFont()
+
+
+class PdfWriter:
+    """Minimal streaming PDF writer: one text column, automatic page breaks.
+
+    Each page is written to the stream as soon as it is full, so memory use does
+    not grow with the number of lines. Only object offsets and page ids are kept.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        font: BuiltinFont | TrueTypeFont,
+        page_size: tuple[float, float] = A4_SIZE,
+        margin: float = 40.0,
+    ) -> None:
+        self._stream = stream
+        self._font = font
+        self._width, self._height = page_size
+        self._margin = margin
+        self._offsets: dict[int, int] = {}
+        self._page_ids: list[int] = []
+        self._next_id = 1
+        self._catalog_id = self.new_object_id()
+        self._pages_id = self.new_object_id()
+        self._font_id = self.new_object_id()
+        self._operations: list[bytes] = []
+        self._page_open = False
+        self._cursor = 0.0
+        self._closed = False
+        self._position = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids) + (1 if self._page_open else 0)
+
+    def new_object_id(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def add_line(self, text: str, size: float = 10.0, indent: float = 0.0, space_before: float = 0.0) -> None:
+        max_width = self._width - 2 * self._margin - indent
+        for part in _wrap(text, lambda value: self._font.width(value, size), max_width):
+            leading = size * 1.35
+            if not self._page_open or self._cursor - leading - space_before < self._margin:
+                self._start_page()
+                space_before = 0.0
+            self._cursor -= leading + space_before
+            space_before = 0.0
+            x = self._margin + indent
+            self._operations.append(
+                b"BT /F1 %s Tf %s %s Td " % (_num(size), _num(x), _num(self._cursor))
+                + self._font.encode(part)
+                + b" Tj ET\n"
+            )
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        if not self._page_open:
+            self._start_page()
+        self._flush_page()
+        self._font.write_objects(self, self._font_id)
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self.write_object(
+            self._pages_id,
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode("ascii"),
+        )
+        self.write_object(self._catalog_id, f"<< /Type /Catalog /Pages {self._pages_id} 0 R >>".encode("ascii"))
+
+        xref_offset = self._position
+        total = self._next_id
+        self._write(f"xref\n0 {total}\n0000000000 65535 f \n".encode("ascii"))
+        for object_id in range(1, total):
+            self._write(f"{self._offsets[object_id]:010d} 00000 n \n".encode("ascii"))
+        self._write(
+            f"trailer\n<< /Size {total} /Root {self._catalog_id} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode(
+                "ascii"
+            )
+        )
+        self._closed = True
+
+    def write_object(self, object_id: int, body: bytes) -> None:
+        self._offsets[object_id] = self._position
+        self._write(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+
+    def write_stream(self, object_id: int, data: bytes) -> None:
+        compressed = zlib.compress(data)
+        self._offsets[object_id] = self._position
+        self._write(b"%d 0 obj\n<< /Length %d /Filter /FlateDecode >>\nstream\n" % (object_id, len(compressed)))
+        self._write(compressed)
+        self._write(b"\nendstream\nendobj\n")
+
+    def write_file_stream(self, object_id: int, path: Path, chunk_size: int = 1 << 16) -> None:
+        """Embeds a file as a compressed stream without loading it whole into memory."""
+        length_id = self.new_object_id()
+        self._offsets[object_id] = self._position
+        self._write(
+            b"%d 0 obj\n<< /Length %d 0 R /Length1 %d /Filter /FlateDecode >>\nstream\n"
+            % (object_id, length_id, path.stat().st_size)
+        )
+        compressor = zlib.compressobj()
+        written = 0
+        with path.open("rb") as source:
+            while chunk := source.read(chunk_size):
+                block = compressor.compress(chunk)
+                written += len(block)
+                self._write(block)
+        block = compressor.flush()
+        written += len(block)
+        self._write(block)
+        self._write(b"\nendstream\nendobj\n")
+        self.write_object(length_id, str(written).encode("ascii"))
+
+    def _start_page(self) -> None:
+        if self._page_open:
+            self._flush_page()
+        self._page_open = True
+        self._cursor = self._height - self._margin
+
+    def _flush_page(self) -> None:
+        page_number = len(self._page_ids) + 1
+        footer_size = 8.0
+        footer = str(page_number)
+        footer_x = (self._width - self._font.width(footer, footer_size)) / 2
+        self._operations.append(
+            b"BT /F1 %s Tf %s %s Td " % (_num(footer_size), _num(footer_x), _num(self._margin / 2))
+            + self._font.encode(footer)
+            + b" Tj ET\n"
+        )
+        content_id = self.new_object_id()
+        page_id = self.new_object_id()
+        self.write_stream(content_id, b"".join(self._operations))
+        self.write_object(
+            page_id,
+            (
+                f"<< /Type /Page /Parent {self._pages_id} 0 R /MediaBox [0 0 {_num(self._width).decode()} "
+                f"{_num(self._height).decode()}] /Resources << /Font << /F1 {self._font_id} 0 R >> >> "
+                f"/Contents {content_id} 0 R >>"
+            ).encode("ascii"),
+        )
+        self._page_ids.append(page_id)
+        self._operations = []
+        self._page_open = False
+
+    def _write(self, data: bytes) -> None:
+        self._stream.write(data)
+        self._position += len(data)
+
+
+def _wrap(text: str, measure: Callable[[str], float], max_width: float) -> list[str]:
+    if measure(text) <= max_width:
+        return [text]
+    lines: list[str] = []
+    current = ""
+    for word in text.split(" "):
+        candidate = f"{current} {word}" if current else word
+        if current and measure(candidate) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    lines.append(current)
+    return lines
+
+
+def _num(value: float) -> bytes:
+    return (f"{value:.2f}".rstrip("0").rstrip(".")).encode("ascii")
+
+
+def _read_table_directory(data: bytes) -> dict[str, int]:
+    table_count = struct.unpack_from(">H", data, 4)[0]
+    tables: dict[str, int] = {}
+    for index in range(table_count):
+        tag, _, offset, _ = struct.unpack_from(">4sIII", data, 12 + index * 16)
+        tables[tag.decode("latin-1")] = offset
+    missing = {"head", "hhea", "hmtx", "cmap"} - tables.keys()
+    if missing:
+        raise ValueError(f"Unsupported font, missing tables: {sorted(missing)}")
+    return tables
+
+
+def _read_cmap(data: bytes, cmap_offset: int) -> dict[int, int]:
+    """Reads the Unicode BMP (format 4) subtable into a codepoint -> glyph map."""
+    _, subtable_count = struct.unpack_from(">HH", data, cmap_offset)
+    for index in range(subtable_count):
+        platform, encoding, offset = struct.unpack_from(">HHI", data, cmap_offset + 4 + index * 8)
+        start = cmap_offset + offset
+        if (platform, encoding) in {(3, 1), (0, 3), (0, 4)} and struct.unpack_from(">H", data, start)[0] == 4:
+            return _read_cmap_format4(data, start)
+    raise ValueError("Unsupported font, no Unicode BMP cmap")
+
+
+def _read_cmap_format4(data: bytes, start: int) -> dict[int, int]:
+    segment_count = struct.unpack_from(">H", data, start + 6)[0] // 2
+    ends_at = start + 14
+    starts_at = ends_at + segment_count * 2 + 2
+    deltas_at = starts_at + segment_count * 2
+    range_offsets_at = deltas_at + segment_count * 2
+    mapping: dict[int, int] = {}
+    for segment in range(segment_count):
+        end = struct.unpack_from(">H", data, ends_at + segment * 2)[0]
+        first = struct.unpack_from(">H", data, starts_at + segment * 2)[0]
+        delta = struct.unpack_from(">h", data, deltas_at + segment * 2)[0]
+        range_offset_position = range_offsets_at + segment * 2
+        range_offset = struct.unpack_from(">H", data, range_offset_position)[0]
+        for codepoint in range(first, end + 1):
+            if codepoint == 0xFFFF:
+                continue
+            if range_offset == 0:
+                glyph = (codepoint + delta) & 0xFFFF
+            else:
+                glyph_position = range_offset_position + range_offset + (codepoint - first) * 2
+                glyph = struct.unpack_from(">H", data, glyph_position)[0]
+                if glyph:
+                    glyph = (glyph + delta) & 0xFFFF
+            if glyph:
+                mapping[codepoint] = glyph
+    return mapping
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, ContextManager, Iterator, TypeVar
+
+# Spans are imported by every hot module, so the profilers themselves are
+# imported only when a profile is actually requested.
+if TYPE_CHECKING:
+    import tracemalloc
+
+T = TypeVar("T")
+
+_DISABLED_SPAN = nullcontext()
+
+
+class SpanRecorder:
+    """Named wall-time spans that cost one attribute check while disabled."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._totals: dict[str, list[float]] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def toggle(self) -> bool:
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def span(self, name: str) -> ContextManager[None]:
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return self._timed(name)
+
+    def snapshot(self) -> dict[str, tuple[int, float]]:
+        with self._lock:
+            return {name: (int(count), total) for name, (count, total) in self._totals.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+    def report(self) -> str:
+        rows = sorted(self.snapshot().items(), key=lambda item: item[1][1], reverse=True)
+        lines = [f"{'span':<36} {'calls':>8} {'total_s':>10} {'avg_ms':>10}"]
+        for name, (count, total) in rows:
+            lines.append(f"{name:<36} {count:>8} {total:>10.4f} {total / count * 1000:>10.3f}")
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                entry = self._totals.setdefault(name, [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+
+SPANS = SpanRecorder()
+
+
+def span(name: str) -> ContextManager[None]:
+    return SPANS.span(name)
+
+
+def install_span_toggle_signal() -> bool:
+    """Toggles SPANS on SIGUSR1; turning them off prints the collected report to stderr.
+
+    Lets a long-running bot or API server be sampled without a restart. Returns False where
+    the signal is unavailable (Windows) or when called outside the main thread.
+    """
+    import signal
+
+    signum = getattr(signal, "SIGUSR1", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def _handle(_signum, _frame) -> None:
+        if SPANS.toggle():
+            SPANS.reset()
+            return
+        print(SPANS.report(), file=sys.stderr, end="")
+
+    signal.signal(signum, _handle)
+    return True
+
+
+@dataclass(frozen=True)
+class ProfileArtifacts:
+    stats_path: Path
+    spans_path: Path
+    memory_path: Path | None
+    peak_memory_bytes: int | None
+
+
+def profile_call(
+    func: Callable[[], T],
+    output_path: Path,
+    trace_memory: bool = False,
+) -> tuple[T | None, ProfileArtifacts]:
+    """Runs `func` under cProfile (and optionally tracemalloc) and dumps the artifacts.
+
+    Artifacts are written even when `func` raises or is interrupted, so a
+    long-running bot can be stopped with Ctrl+C and still leave a profile.
+    """
+    import cProfile
+    import tracemalloc
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    spans_path = output_path.with_suffix(".spans.txt")
+    memory_path = output_path.with_suffix(".memory.txt") if trace_memory else None
+    peak: int | None = None
+    result: T | None = None
+
+    SPANS.reset()
+    SPANS.enable()
+    if trace_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = func()
+    finally:
+        profiler.disable()
+        SPANS.disable()
+        profiler.dump_stats(str(output_path))
+        spans_path.write_text(SPANS.report(), encoding="utf-8")
+        if memory_path is not None:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory_path.write_text(_format_memory_report(snapshot, peak), encoding="utf-8")
+
+    return result, ProfileArtifacts(
+        stats_path=output_path,
+        spans_path=spans_path,
+        memory_path=memory_path,
+        peak_memory_bytes=peak,
+    )
+
+
+def print_profile_summary(artifacts: ProfileArtifacts, limit: int = 15) -> None:
+    import pstats
+
+    stream = sys.stderr
+    stats = pstats.Stats(str(artifacts.stats_path), stream=stream)
+    stats.sort_stats("cumulative").print_stats(limit)
+    print(f"Profile saved to: {artifacts.stats_path}", file=stream)
+    print(f"Span timings saved to: {artifacts.spans_path}", file=stream)
+    if artifacts.memory_path is not None:
+        print(
+            f"Peak traced memory: {artifacts.peak_memory_bytes} bytes, top allocations in: {artifacts.memory_path}",
+            file=stream,
+        )
+
+
+def _format_memory_report(snapshot: tracemalloc.Snapshot, peak: int, limit: int = 25) -> str:
+    lines = [f"peak_bytes={peak}", ""]
+    for stat in snapshot.statistics("lineno")[:limit]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+from datetime import datetime, time, timedelta
+from typing import TYPE_CHECKING, Callable, Iterable
+from zoneinfo import ZoneInfo
+
+from app.config import DEFAULT_REFRESH_TIMES
+from app.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from app.config import AppConfig
+    from app.service import RoomService
+
+MSK_TZ = ZoneInfo("Europe/Moscow")
+
+# Upper bound for a single sleep, so a wall-clock jump (NTP, suspend) is noticed
+# within an hour instead of sleeping through the next slot.
+MAX_SLEEP_SECONDS = 3600.0
+
+logger = logging.getLogger(__name__)
+
+_FAILURES = REGISTRY.counter("schedule_refresh_failures_total", "Scheduled refresh attempts that raised.")
+_NEXT_REFRESH = REGISTRY.gauge("schedule_next_refresh_timestamp_seconds", "Unix time of the next scheduled refresh.")
+
+
+class ScheduleRefresher:
+    """Background refresher that sleeps until the next MSK refresh slot.
+
+    A slot counts as done once a refresh succeeded at or after it, so a slot
+    missed while the process was down (or while a tick was late) is caught up
+    immediately on the next check. Failed refreshes are retried with jittered
+    exponential backoff until they succeed or `stop()` is called.
+    """
+
+    def __init__(
+        self,
+        service: RoomService,
+        refresh_times: Iterable[time] | None = None,
+        retry_base_seconds: float = 30.0,
+        retry_max_seconds: float = 1800.0,
+        clock: Callable[[], datetime] | None = None,
+    ) -> None:
+        self._service = service
+        if refresh_times is None:
+            refresh_times = parse_refresh_times(DEFAULT_REFRESH_TIMES)
+        self._refresh_times = tuple(sorted(refresh_times))
+        if not self._refresh_times:
+            raise ValueError("At least one refresh time is required")
+        self._retry_base_seconds = max(retry_base_seconds, 0.0)
+        self._retry_max_seconds = max(retry_max_seconds, self._retry_base_seconds)
+        self._clock = clock or (lambda: datetime.now(MSK_TZ))
+        self._stop = threading.Event()
+        updated_at = service.schedule_updated_at()
+        self._last_refresh_at = datetime.fromtimestamp(updated_at, MSK_TZ) if updated_at is not None else None
+
+    @classmethod
+    def from_config(cls, service: RoomService, config: AppConfig) -> ScheduleRefresher:
+        return cls(
+            service,
+            refresh_times=parse_refresh_times(config.refresh_times),
+            retry_base_seconds=config.refresh_retry_base_seconds,
+            retry_max_seconds=config.refresh_retry_max_seconds,
+        )
+
+    @property
+    def last_refresh_at(self) -> datetime | None:
+        return self._last_refresh_at
+
+    def previous_slot(self, now: datetime) -> datetime:
+        """Latest refresh slot at or before `now`."""
+        now = now.astimezone(MSK_TZ)
+        for day_offset in (0, -1):
+            day = now.date() + timedelta(days=day_offset)
+            for slot in reversed(self._refresh_times):
+                candidate = datetime.combine(day, slot, tzinfo=MSK_TZ)
+                if candidate <= now:
+                    return candidate
+        raise AssertionError("unreachable: yesterday always has a slot")
+
+    def next_slot(self, now: datetime) -> datetime:
+        """Earliest refresh slot strictly after `now`."""
+        now = now.astimezone(MSK_TZ)
+        for day_offset in (0, 1):
+            day = now.date() + timedelta(days=day_offset)
+            for slot in self._refresh_times:
+                candidate = datetime.combine(day, slot, tzinfo=MSK_TZ)
+                if candidate > now:
+                    return candidate
+        raise AssertionError("unreachable: tomorrow always has a slot")
+
+    def is_due(self, now: datetime | None = None) -> bool:
+        now = now or self._clock()
+        return self._last_refresh_at is None or self._last_refresh_at < self.previous_slot(now)
+
+    def tick(self, now: datetime | None = None) -> bool:
+        """Refreshes once if a slot is due; returns True when a refresh ran."""
+        now = now or self._clock()
+        if not self.is_due(now):
+            return False
+        self._refresh(now)
+        return True
+
+    def run_forever(self) -> None:
+        """Runs until `stop()`; sleeps exactly until the next slot between refreshes."""
+        while not self._stop.is_set():
+            now = self._clock()
+            if self.is_due(now):
+                self._refresh_with_retry()
+                continue
+            next_slot = self.next_slot(now)
+            _NEXT_REFRESH.set(next_slot.timestamp())
+            self._stop.wait(min((next_slot - now).total_seconds(), MAX_SLEEP_SECONDS))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _refresh_with_retry(self) -> bool:
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                self._refresh(self._clock())
+                return True
+            except Exception:
+                _FAILURES.inc()
+                delay = self.retry_delay(attempt)
+                logger.exception("Schedule refresh failed, retrying in %.1f s", delay)
+                attempt += 1
+                if self._stop.wait(delay):
+                    break
+        return False
+
+    def retry_delay(self, attempt: int, rng: Callable[[], float] = random.random) -> float:
+        """Exponential backoff with jitter: a random delay between half and all of base * 2**attempt, capped."""
+        ceiling = min(self._retry_max_seconds, self._retry_base_seconds * (2 ** min(attempt, 32)))
+        return ceiling * (0.5 + rng() / 2)
+
+    def _refresh(self, now: datetime) -> None:
+        self._service.refresh_schedule_cache()
+        self._last_refresh_at = now.astimezone(MSK_TZ)
+        self._service.write_metrics()
+
+
+def parse_refresh_times(tokens: Iterable[str]) -> tuple[time, ...]:
+    result = []
+    for token in tokens:
+        try:
+            result.append(datetime.strptime(token.strip(), "%H:%M").time())
+        except ValueError:
+            raise ValueError(f"Invalid refresh time {token!r}, expected HH:MM") from None
+    return tuple(sorted(set(result)))
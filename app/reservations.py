@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Mapping
+
+from app.allocator import RoomAllocator, candidate_rooms
+from app.config import AppConfig
+from app.metrics import REGISTRY
+from app.models import AllocationResult, Request, TimeRange
+
+if TYPE_CHECKING:
+    from app.free_rooms import FreeRoomSummary
+
+# Optimistic rounds before a day is allocated while holding its lock, which
+# cannot conflict; bounds the work a request can lose to busy neighbours.
+MAX_OPTIMISTIC_ATTEMPTS = 3
+
+_COMMITS = REGISTRY.counter("reservation_commits_total", "Per-day reservation commits by outcome.")
+_CONFLICTS = REGISTRY.counter("reservation_conflicts_total", "Picks rejected at commit because the slot was taken.")
+
+# Committed bookings of one day: version and room -> booked slots. Both the
+# tuple and the mapping are replaced, never mutated, so readers need no lock.
+DayState = tuple[int, Mapping[str, tuple[TimeRange, ...]]]
+_EMPTY_DAY: DayState = (0, {})
+
+
+class ReservationLedger:
+    """Rooms granted to earlier batches, shared by every client of one service.
+
+    Unlike the per-batch map from `new_reservations`, the ledger outlives a
+    single call. Each day is a versioned, copy-on-write state. A batch computes
+    its picks against a snapshot without locking, then commits under the day's
+    lock: if the version is unchanged everything is accepted; otherwise each
+    pick is checked against what was committed meanwhile and only the requests
+    whose room and slot were taken are recomputed. Batches for different days
+    never touch the same lock. Days that left the schedule window are dropped
+    with `forget_before`.
+    """
+
+    def __init__(self) -> None:
+        self._days: dict[str, DayState] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def book(
+        self,
+        requests: list[Request],
+        allocator: RoomAllocator,
+        occupied: dict[str, dict[str, list[TimeRange]]],
+        summary: FreeRoomSummary | None = None,
+    ) -> list[AllocationResult]:
+        """Allocates and records `requests`; results are returned in input order."""
+        by_day: dict[str, list[int]] = defaultdict(list)
+        for index, request in enumerate(requests):
+            by_day[request.day.isoformat()].append(index)
+
+        results: list[AllocationResult | None] = [None] * len(requests)
+        for day, indexes in by_day.items():
+            pending = indexes
+            for _ in range(MAX_OPTIMISTIC_ATTEMPTS):
+                version, picks = self._pick(day, pending, requests, allocator, occupied, summary)
+                with self._day_lock(day):
+                    pending = self._commit(day, version, pending, picks, results)
+                if not pending:
+                    break
+            else:
+                with self._day_lock(day):
+                    version, picks = self._pick(day, pending, requests, allocator, occupied, summary)
+                    self._commit(day, version, pending, picks, results)
+        return [item for item in results if item is not None]
+
+    def free_rooms(
+        self,
+        config: AppConfig,
+        day: str,
+        slot: TimeRange,
+        room_type: str,
+        occupied: dict[str, dict[str, list[TimeRange]]],
+        summary: FreeRoomSummary | None = None,
+    ) -> list[str] | None:
+        """Rooms of `room_type` free in the schedule and not booked; None when the day is not in the schedule."""
+        if day not in occupied:
+            return None
+        candidates = summary.free_rooms(day, room_type, slot) if summary else None
+        if candidates is None:
+            busy_by_room = occupied[day]
+            candidates = tuple(
+                room
+                for room in candidate_rooms(config, room_type)
+                if not any(slot.overlaps(busy) for busy in busy_by_room.get(room, ()))
+            )
+        booked = self._days.get(day, _EMPTY_DAY)[1]
+        return [room for room in candidates if not any(slot.overlaps(item) for item in booked.get(room, ()))]
+
+    def version(self, day: str) -> int:
+        return self._days.get(day, _EMPTY_DAY)[0]
+
+    def reserved_for_day(self, day: str) -> dict[str, list[TimeRange]]:
+        return {room: list(slots) for room, slots in self._days.get(day, _EMPTY_DAY)[1].items()}
+
+    def count(self) -> int:
+        return sum(len(slots) for _, booked in list(self._days.values()) for slots in booked.values())
+
+    def forget_before(self, day: str) -> int:
+        """Drops bookings and locks of days before `day` (ISO date); returns how many days were dropped."""
+        with self._guard:
+            past = [key for key in set(self._days) | set(self._locks) if key < day]
+            for key in past:
+                lock = self._locks.pop(key, None)
+                if lock is None:
+                    self._days.pop(key, None)
+                    continue
+                # Waits for a commit in progress; a batch still waiting for this lock sees it
+                # was replaced and takes the new one (see `_day_lock`).
+                with lock:
+                    self._days.pop(key, None)
+        return len(past)
+
+    def _pick(
+        self,
+        day: str,
+        indexes: list[int],
+        requests: list[Request],
+        allocator: RoomAllocator,
+        occupied: dict[str, dict[str, list[TimeRange]]],
+        summary: FreeRoomSummary | None,
+    ) -> tuple[int, list[AllocationResult]]:
+        version, booked = self._days.get(day, _EMPTY_DAY)
+        reserved = {day: defaultdict(list, {room: list(slots) for room, slots in booked.items()})}
+        picks = allocator.allocate_batch(
+            [requests[index] for index in indexes], occupied, reserved=reserved, summary=summary
+        )
+        return version, picks
+
+    def _commit(
+        self,
+        day: str,
+        version: int,
+        indexes: list[int],
+        picks: list[AllocationResult],
+        results: list[AllocationResult | None],
+    ) -> list[int]:
+        """Installs the picks that are still free; returns the indexes to retry. Caller holds the day lock."""
+        current_version, current = self._days.get(day, _EMPTY_DAY)
+        unchanged = current_version == version
+        booked = dict(current)
+        added = False
+        conflicts: list[int] = []
+        for index, item in zip(indexes, picks):
+            if item.room and item.status == "ok":
+                # Picks of one batch never overlap each other, so only slots
+                # committed by other batches since the snapshot can conflict.
+                if not unchanged and any(item.request.slot.overlaps(slot) for slot in current.get(item.room, ())):
+                    conflicts.append(index)
+                    continue
+                booked[item.room] = (*booked.get(item.room, ()), item.request.slot)
+                added = True
+            # "No room" stays true: bookings are only ever added within a schedule snapshot.
+            results[index] = item
+
+        if added:
+            self._days[day] = (current_version + 1, booked)
+        if conflicts:
+            _CONFLICTS.inc(len(conflicts))
+        _COMMITS.inc(outcome="clean" if unchanged else "partial" if conflicts else "merged")
+        return conflicts
+
+    @contextmanager
+    def _day_lock(self, day: str) -> Iterator[None]:
+        while True:
+            lock = self._locks.get(day)
+            if lock is None:
+                with self._guard:
+                    lock = self._locks.setdefault(day, threading.Lock())
+            lock.acquire()
+            if self._locks.get(day) is lock:
+                break
+            # `forget_before` dropped the day while this batch was waiting.
+            lock.release()
+        try:
+            yield
+        finally:
+            lock.release()
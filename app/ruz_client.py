@@ -1,14 +1,28 @@
 from __future__ import annotations
 
 import json
+import time
 from calendar import monthrange
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
+from typing import Any, Callable
 from urllib.parse import urlencode
-from urllib.request import Request, urlopen
 
 from app.config import AppConfig
+from app.metrics import REGISTRY
 from app.models import TimeRange
+from app.profiling import span
+from app.schedule_cache import merge_occupied
+
+_FETCH_SECONDS = REGISTRY.histogram("ruz_building_fetch_seconds", "Wall time to download one building schedule.")
+_NORMALIZE_SECONDS = REGISTRY.histogram("ruz_normalize_seconds", "Time spent normalizing lessons of one building.")
+_RESPONSE_BYTES = REGISTRY.counter("ruz_response_bytes_total", "Bytes received from RUZ API.")
+_REQUEST_FAILURES = REGISTRY.counter("ruz_request_failures_total", "RUZ API requests that failed or returned bad JSON.")
+
+USER_AGENT = "extract-rooms-v2/1.0"
+
+# (url, timeout) -> decoded JSON; `load_json` unless a shared fetch pool is used.
+JsonLoader = Callable[[str, float], Any]
 
 
 @dataclass(frozen=True)
@@ -22,23 +36,54 @@ class FetchStats:
     skipped_out_of_range: int
 
 
+class BuildingFetchError(RuntimeError):
+    """Raised when no request for a building returned usable JSON."""
+
+
+@dataclass(frozen=True)
+class BuildingFetch:
+    """Outcome for one building; `occupied` is empty when `error` is set."""
+
+    building: int
+    occupied: dict[str, dict[str, list[TimeRange]]]
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
 @dataclass(frozen=True)
 class FetchResult:
     occupied: dict[str, dict[str, list[TimeRange]]]
     stats: FetchStats
+    buildings: dict[int, BuildingFetch] = field(default_factory=dict)
+
+    @property
+    def failed_buildings(self) -> list[int]:
+        return [number for number, item in self.buildings.items() if not item.ok]
 
 
 class RuzScheduleClient:
-    """Loads schedules from RUZ API and normalizes the payload."""
+    """Loads schedules from RUZ API and normalizes the payload.
+
+    `load_json` replaces the per-request HTTP download, e.g. with
+    `SharedFetchPool.load_json` when several tenants share one process.
+    """
 
-    def __init__(self, config: AppConfig) -> None:
+    def __init__(self, config: AppConfig, load_json: JsonLoader | None = None) -> None:
         self._config = config
+        self._load_json = load_json
 
     def fetch_occupied_slots(self) -> dict[str, dict[str, list[TimeRange]]]:
         return self.fetch_occupied_slots_with_stats().occupied
 
     def fetch_occupied_slots_with_stats(self) -> FetchResult:
-        occupied: dict[str, dict[str, list[TimeRange]]] = {}
+        with span("ruz.fetch_occupied_slots"):
+            return self._fetch_occupied_slots_with_stats()
+
+    def _fetch_occupied_slots_with_stats(self) -> FetchResult:
+        buildings: dict[int, BuildingFetch] = {}
         counter = {
             "total_lessons": 0,
             "accepted_lessons": 0,
@@ -48,50 +93,44 @@ class RuzScheduleClient:
             "skipped_bad_date_or_time": 0,
             "skipped_out_of_range": 0,
         }
-        range_start, range_end = _build_schedule_window(
+        range_start, range_end = build_schedule_window(
             today=date.today(),
             days_before=self._config.schedule_window_days_before,
             months_after=self._config.schedule_window_months_after,
         )
 
         for building_number, building_oid in self._config.buildings.items():
-<<<<<<< codex/implement-schedule-management-system-msv8qj
-            url = _attach_range_query(
-                base_url=self._config.base_url.format(building_oid=building_oid),
-                range_start=range_start,
-                range_end=range_end,
-                start_param=self._config.schedule_range_start_param,
-                finish_param=self._config.schedule_range_finish_param,
-                lang_param=self._config.schedule_lang_param,
-                lang_value=self._config.schedule_lang_value,
-                date_format=self._config.schedule_range_date_format,
-            )
-            lessons = _load_json(url)
-=======
+            building_label = str(building_number)
             base_url = self._config.base_url.format(building_oid=building_oid)
-            lessons = _load_lessons_with_fallback_formats(
-                base_url=base_url,
-                range_start=range_start,
-                range_end=range_end,
-                from_param=self._config.schedule_range_from_param,
-                to_param=self._config.schedule_range_to_param,
-                preferred_format=self._config.schedule_range_date_format,
-            )
->>>>>>> main
+            try:
+                with _FETCH_SECONDS.time(building=building_label), span("ruz.fetch_building"):
+                    lessons = _load_lessons_with_fallback_formats(
+                        base_url=base_url,
+                        range_start=range_start,
+                        range_end=range_end,
+                        start_param=self._config.schedule_range_start_param,
+                        finish_param=self._config.schedule_range_finish_param,
+                        lang_param=self._config.schedule_lang_param,
+                        lang_value=self._config.schedule_lang_value,
+                        preferred_format=self._config.schedule_range_date_format,
+                        timeout=self._config.ruz_timeout_seconds,
+                        loader=self._load_json,
+                    )
+            except BuildingFetchError as error:
+                buildings[building_number] = BuildingFetch(building=building_number, occupied={}, error=str(error))
+                continue
+            occupied: dict[str, dict[str, list[TimeRange]]] = {}
+            normalize_started = time.perf_counter()
             allowed_rooms = set(self._config.allowed_rooms.get(building_number, []))
 
             for lesson in lessons:
                 counter["total_lessons"] += 1
-<<<<<<< codex/implement-schedule-management-system-msv8qj
-                room = str(lesson.get("auditorium") or lesson.get("room") or lesson.get("auditoriumName") or "").strip()
-=======
                 room = str(
                     lesson.get("auditorium")
                     or lesson.get("room")
                     or lesson.get("auditoriumName")
                     or ""
                 ).strip()
->>>>>>> main
                 if not room:
                     counter["skipped_no_room"] += 1
                     continue
@@ -108,7 +147,7 @@ class RuzScheduleClient:
                     continue
 
                 try:
-                    lesson_day = _parse_date(date_token)
+                    lesson_day = parse_date(date_token)
                     start = _normalize_time(start_token)
                     end = _normalize_time(end_token)
                 except ValueError:
@@ -123,39 +162,57 @@ class RuzScheduleClient:
                 occupied.setdefault(day_key, {}).setdefault(room, []).append(TimeRange(start=start, end=end))
                 counter["accepted_lessons"] += 1
 
-        for day_rooms in occupied.values():
-            for room, slots in day_rooms.items():
-                day_rooms[room] = sorted(slots, key=lambda item: item.start)
+            for day_rooms in occupied.values():
+                for room, slots in day_rooms.items():
+                    day_rooms[room] = sorted(slots, key=lambda item: item.start)
+            _NORMALIZE_SECONDS.observe(time.perf_counter() - normalize_started, building=building_label)
+            buildings[building_number] = BuildingFetch(building=building_number, occupied=occupied)
 
-        return FetchResult(occupied=occupied, stats=FetchStats(**counter))
+        return FetchResult(
+            occupied=merge_occupied(item.occupied for item in buildings.values() if item.ok),
+            stats=FetchStats(**counter),
+            buildings=buildings,
+        )
 
 
-<<<<<<< codex/implement-schedule-management-system-msv8qj
-=======
 def _load_lessons_with_fallback_formats(
     base_url: str,
     range_start: date,
     range_end: date,
-    from_param: str,
-    to_param: str,
+    start_param: str,
+    finish_param: str,
+    lang_param: str,
+    lang_value: int,
     preferred_format: str,
+    timeout: float = 30.0,
+    loader: JsonLoader | None = None,
 ) -> list[dict]:
+    loader = loader or load_json
     candidate_formats = _candidate_date_formats(preferred_format)
     best_lessons: list[dict] = []
     best_score = -1
+    last_error: Exception | None = None
 
     for date_format in candidate_formats:
-        url = _attach_range_query(
+        url = attach_range_query(
             base_url=base_url,
             range_start=range_start,
             range_end=range_end,
-            from_param=from_param,
-            to_param=to_param,
+            start_param=start_param,
+            finish_param=finish_param,
+            lang_param=lang_param,
+            lang_value=lang_value,
             date_format=date_format,
         )
         try:
-            lessons = _load_json(url)
-        except Exception:
+            lessons = loader(url, timeout)
+        except Exception as error:
+            _REQUEST_FAILURES.inc()
+            last_error = error
+            continue
+        if not isinstance(lessons, list):
+            _REQUEST_FAILURES.inc()
+            last_error = ValueError(f"Unexpected payload type {type(lessons).__name__}")
             continue
 
         score = _range_coverage_score(lessons, range_end)
@@ -163,6 +220,9 @@ def _load_lessons_with_fallback_formats(
             best_score = score
             best_lessons = lessons
 
+    if best_score < 0:
+        # Every format failed: report it instead of passing an empty schedule off as real data.
+        raise BuildingFetchError(f"{base_url}: {last_error}")
     return best_lessons
 
 
@@ -184,7 +244,7 @@ def _range_coverage_score(lessons: list[dict], target_end: date) -> int:
         if not date_token:
             continue
         try:
-            lesson_day = _parse_date(date_token)
+            lesson_day = parse_date(date_token)
         except ValueError:
             continue
         parsed_count += 1
@@ -199,14 +259,26 @@ def _range_coverage_score(lessons: list[dict], target_end: date) -> int:
     return max(0, 10_000 - distance_penalty * 100) + parsed_count
 
 
->>>>>>> main
-def _load_json(url: str):
-    request = Request(url, headers={"User-Agent": "extract-rooms-v2/1.0"})
-    with urlopen(request, timeout=30) as response:
-        return json.loads(response.read().decode("utf-8"))
+def load_json(url: str, timeout: float = 30.0, fetch: Callable[[str, float], bytes] | None = None) -> Any:
+    """Downloads `url` (through `fetch`, urllib by default) and decodes the JSON body, counting received bytes."""
+    with span("ruz.http_get"):
+        body = (fetch or _download)(url, timeout)
+    _RESPONSE_BYTES.inc(len(body))
+    with span("ruz.json_decode"):
+        return json.loads(body.decode("utf-8"))
 
 
-def _parse_date(raw: str) -> date:
+def _download(url: str, timeout: float) -> bytes:
+    # urllib.request pulls in http.client, email and ssl; only refreshes need it.
+    from urllib.request import Request, urlopen
+
+    request = Request(url, headers={"User-Agent": USER_AGENT})
+    with urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def parse_date(raw: str) -> date:
+    """Parses a RUZ lesson date: ISO, `dd.mm.yyyy`, ISO datetime or `/Date(ms+hhmm)/`."""
     token = str(raw)
     if token.startswith("/Date("):
         body = token.split("(")[1].split(")")[0]
@@ -243,7 +315,8 @@ def _normalize_time(raw: str):
     raise ValueError(f"Unsupported time format: {raw}")
 
 
-def _build_schedule_window(today: date, days_before: int, months_after: int) -> tuple[date, date]:
+def build_schedule_window(today: date, days_before: int, months_after: int) -> tuple[date, date]:
+    """First and last day of the schedule requested from RUZ."""
     range_start = today - timedelta(days=max(days_before, 0))
     range_end = _add_months(today, max(months_after, 0))
     return range_start, range_end
@@ -257,30 +330,21 @@ def _add_months(input_date: date, months: int) -> date:
     return date(target_year, target_month, target_day)
 
 
-def _attach_range_query(
+def attach_range_query(
     base_url: str,
     range_start: date,
     range_end: date,
-<<<<<<< codex/implement-schedule-management-system-msv8qj
     start_param: str,
     finish_param: str,
     lang_param: str,
     lang_value: int,
     date_format: str,
 ) -> str:
+    """`base_url` with the range and language query parameters RUZ expects."""
     params = {
         start_param: range_start.strftime(date_format),
         finish_param: range_end.strftime(date_format),
         lang_param: lang_value,
-=======
-    from_param: str,
-    to_param: str,
-    date_format: str,
-) -> str:
-    params = {
-        from_param: range_start.strftime(date_format),
-        to_param: range_end.strftime(date_format),
->>>>>>> main
     }
     delimiter = "&" if "?" in base_url else "?"
     return f"{base_url}{delimiter}{urlencode(params)}"
@@ -0,0 +1,306 @@
+"""Stand-in RUZ server for offline refresh tests and load tests.
+
+Serves recorded (`record` mode) or synthetic building schedules at
+`/ruzapi/schedule/building/<oid>`, honours the range and language query
+parameters built by `ruz_client.attach_range_query`, and can inject latency,
+errors and oversized responses.
+
+    python -m app.ruz_standin record --config config.json --fixtures data/ruz_fixtures
+    python -m app.ruz_standin serve --config config.json --fixtures data/ruz_fixtures --latency 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Protocol
+from urllib.parse import parse_qs, urlsplit
+
+from app.config import AppConfig, load_config
+from app.free_rooms import parse_pair_slots
+from app.ruz_client import attach_range_query, build_schedule_window, load_json, parse_date
+
+BUILDING_PATH = "/ruzapi/schedule/building/"
+DATE_FORMATS = ("%Y.%m.%d", "%Y-%m-%d", "%d.%m.%Y")
+# Synthetic schedules are generated per requested day; cap the range so a bad
+# query cannot make the stand-in build years of lessons.
+MAX_SYNTHETIC_DAYS = 400
+
+
+class PayloadSource(Protocol):
+    def lessons(self, building_oid: int, range_start: date, range_end: date) -> list[dict] | None:
+        """Lessons of the building within the range, or None for an unknown building."""
+
+
+class FixturePayloads:
+    """Replays `<oid>.json` files written by `record_fixtures`."""
+
+    def __init__(self, directory: Path) -> None:
+        self._directory = directory
+        self._cache: dict[int, list[dict]] = {}
+        self._lock = threading.Lock()
+
+    def lessons(self, building_oid: int, range_start: date, range_end: date) -> list[dict] | None:
+        with self._lock:
+            if building_oid not in self._cache:
+                path = self._directory / f"{building_oid}.json"
+                if not path.exists():
+                    return None
+                self._cache[building_oid] = json.loads(path.read_text(encoding="utf-8"))
+            recorded = self._cache[building_oid]
+        return [lesson for lesson in recorded if _in_range(lesson, range_start, range_end)]
+
+
+class SyntheticPayloads:
+    """Deterministic lessons in standard pair slots for the configured rooms.
+
+    The same building, room and day always get the same lessons for a given
+    `seed`, however the range is split across requests.
+    """
+
+    def __init__(self, config: AppConfig, pairs_per_room_day: int = 3, seed: int = 0) -> None:
+        self._rooms = {
+            building_oid: config.allowed_rooms.get(building_number, [])
+            for building_number, building_oid in config.buildings.items()
+        }
+        self._pairs = parse_pair_slots(config.pair_slots)
+        self._pairs_per_room_day = min(pairs_per_room_day, len(self._pairs))
+        self._seed = seed
+
+    def lessons(self, building_oid: int, range_start: date, range_end: date) -> list[dict] | None:
+        rooms = self._rooms.get(building_oid)
+        if rooms is None:
+            return None
+        result = []
+        day = range_start
+        last_day = min(range_end, range_start + timedelta(days=MAX_SYNTHETIC_DAYS))
+        while day <= last_day:
+            for room in rooms:
+                rng = random.Random(f"{self._seed}:{building_oid}:{room}:{day.isoformat()}")
+                for slot in sorted(rng.sample(self._pairs, self._pairs_per_room_day), key=lambda item: item.start):
+                    result.append(
+                        {
+                            "auditorium": room,
+                            "date": day.isoformat(),
+                            "beginLesson": slot.start.strftime("%H:%M"),
+                            "endLesson": slot.end.strftime("%H:%M"),
+                            "discipline": "Synthetic lesson",
+                        }
+                    )
+            day += timedelta(days=1)
+        return result
+
+
+@dataclass(frozen=True)
+class FaultOptions:
+    """Misbehaviour injected into every building response."""
+
+    latency_seconds: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = HTTPStatus.SERVICE_UNAVAILABLE
+    fail_buildings: frozenset[int] = frozenset()
+    padding_lessons: int = 0
+    accepted_formats: tuple[str, ...] = DATE_FORMATS
+    seed: int = 0
+
+
+class RuzStandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        payloads: PayloadSource,
+        config: AppConfig,
+        faults: FaultOptions = FaultOptions(),
+    ) -> None:
+        super().__init__(address, RuzStandInHandler)
+        self.payloads = payloads
+        self.config = config
+        self.faults = faults
+        self.requests: Counter[int] = Counter()
+        self._rng = random.Random(faults.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        """`base_url` for `AppConfig` pointing at this server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{BUILDING_PATH}{{building_oid}}"
+
+    def should_fail(self, building_oid: int) -> bool:
+        with self._lock:
+            self.requests[building_oid] += 1
+            return building_oid in self.faults.fail_buildings or self._rng.random() < self.faults.error_rate
+
+
+class RuzStandInHandler(BaseHTTPRequestHandler):
+    server: RuzStandInServer
+    # Keep-alive, like the real RUZ front end; every response has a Content-Length.
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if not url.path.startswith(BUILDING_PATH) or not url.path[len(BUILDING_PATH) :].isdigit():
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+            return
+        building_oid = int(url.path[len(BUILDING_PATH) :])
+        config, faults = self.server.config, self.server.faults
+
+        if faults.latency_seconds:
+            time.sleep(faults.latency_seconds)
+        if self.server.should_fail(building_oid):
+            self._send_json(faults.error_status, {"error": "injected failure"})
+            return
+
+        query = parse_qs(url.query)
+        if not query.get(config.schedule_lang_param):
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"{config.schedule_lang_param} is required"})
+            return
+        try:
+            range_start = _parse_query_date(query, config.schedule_range_start_param, faults.accepted_formats)
+            range_end = _parse_query_date(query, config.schedule_range_finish_param, faults.accepted_formats)
+        except ValueError as error:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": str(error)})
+            return
+
+        lessons = self.server.payloads.lessons(building_oid, range_start, range_end)
+        if lessons is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown building {building_oid}"})
+            return
+        self._send_json(HTTPStatus.OK, lessons + _padding(faults.padding_lessons, range_start))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def record_fixtures(config: AppConfig, directory: Path, today: date | None = None) -> list[Path]:
+    """Saves the real RUZ response of every configured building for the configured window."""
+    range_start, range_end = build_schedule_window(
+        today=today or date.today(),
+        days_before=config.schedule_window_days_before,
+        months_after=config.schedule_window_months_after,
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    written = []
+    for building_oid in config.buildings.values():
+        url = attach_range_query(
+            base_url=config.base_url.format(building_oid=building_oid),
+            range_start=range_start,
+            range_end=range_end,
+            start_param=config.schedule_range_start_param,
+            finish_param=config.schedule_range_finish_param,
+            lang_param=config.schedule_lang_param,
+            lang_value=config.schedule_lang_value,
+            date_format=config.schedule_range_date_format,
+        )
+        path = directory / f"{building_oid}.json"
+        path.write_text(
+            json.dumps(load_json(url, timeout=config.ruz_timeout_seconds), ensure_ascii=False, indent=1),
+            encoding="utf-8",
+        )
+        written.append(path)
+    return written
+
+
+def _parse_query_date(query: dict[str, list[str]], name: str, formats: tuple[str, ...]) -> date:
+    token = (query.get(name) or [""])[0]
+    for pattern in formats:
+        try:
+            return datetime.strptime(token, pattern).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unsupported {name} date {token!r}")
+
+
+def _in_range(lesson: dict, range_start: date, range_end: date) -> bool:
+    token = lesson.get("date") or lesson.get("day") or lesson.get("lessonDate")
+    try:
+        return range_start <= parse_date(token) <= range_end
+    except (TypeError, ValueError):
+        # Lessons the client cannot date are passed through, as RUZ would.
+        return True
+
+
+def _padding(count: int, day: date) -> list[dict]:
+    # Lessons in rooms outside any allowed list: they grow the response without
+    # changing the normalized schedule.
+    return [
+        {
+            "auditorium": f"padding-{index}",
+            "date": day.isoformat(),
+            "beginLesson": "08:00",
+            "endLesson": "09:30",
+            "discipline": "x" * 64,
+        }
+        for index in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in RUZ server for offline refresh tests")
+    parser.add_argument("command", choices=["serve", "record"])
+    parser.add_argument("--config", default="config.json", help="Path to config JSON (buildings, rooms, query params)")
+    parser.add_argument("--fixtures", help="Fixture directory: written by record, replayed by serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of responses replaced by --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--fail-building", type=int, action="append", default=[], help="Building oid that always fails")
+    parser.add_argument("--padding", type=int, default=0, help="Extra irrelevant lessons per response")
+    parser.add_argument("--date-format", action="append", help="Accepted range date format (default: all RUZ formats)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = load_config(Path(args.config))
+    if args.command == "record":
+        if not args.fixtures:
+            raise ValueError("--fixtures is required for record")
+        for path in record_fixtures(config, Path(args.fixtures)):
+            print(f"Recorded {path}")
+        return
+
+    payloads: PayloadSource
+    if args.fixtures:
+        payloads = FixturePayloads(Path(args.fixtures))
+    else:
+        payloads = SyntheticPayloads(config, seed=args.seed)
+    faults = FaultOptions(
+        latency_seconds=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        fail_buildings=frozenset(args.fail_building),
+        padding_lessons=args.padding,
+        accepted_formats=tuple(args.date_format or DATE_FORMATS),
+        seed=args.seed,
+    )
+    server = RuzStandInServer((args.host, args.port), payloads, config, faults)
+    print(f"Stand-in RUZ on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
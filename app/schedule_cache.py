@@ -1,10 +1,68 @@
 from __future__ import annotations
 
 import json
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
+from typing import Iterable
 
+from app.atomic_file import write_atomic
+from app.metrics import REGISTRY
 from app.models import TimeRange
+from app.profiling import span
+
+CACHE_FORMAT_VERSION = 2
+# Building key used for caches written before per-building snapshots existed.
+LEGACY_BUILDING = 0
+
+_LOAD_SECONDS = REGISTRY.histogram("schedule_cache_load_seconds", "Time to read and decode the schedule cache.")
+_SAVE_SECONDS = REGISTRY.histogram("schedule_cache_save_seconds", "Time to encode and write the schedule cache.")
+_SIZE_BYTES = REGISTRY.gauge("schedule_cache_size_bytes", "Size of the schedule cache file.")
+
+
+@dataclass(frozen=True)
+class BuildingSnapshot:
+    """Occupied slots of one building as of `fetched_at` (unix time)."""
+
+    occupied: dict[str, dict[str, list[TimeRange]]]
+    fetched_at: float
+
+
+@dataclass(frozen=True)
+class ScheduleSnapshot:
+    """Per-building schedule data; buildings may have been fetched at different times."""
+
+    buildings: dict[int, BuildingSnapshot]
+
+    def merged(self) -> dict[str, dict[str, list[TimeRange]]]:
+        return merge_occupied(item.occupied for item in self.buildings.values())
+
+    @property
+    def fetched_at(self) -> dict[int, float]:
+        return {number: item.fetched_at for number, item in self.buildings.items()}
+
+    def oldest_fetched_at(self) -> float | None:
+        return min((item.fetched_at for item in self.buildings.values()), default=None)
+
+    def ages(self, now: float) -> dict[int, float]:
+        return {number: max(now - item.fetched_at, 0.0) for number, item in self.buildings.items()}
+
+
+def merge_occupied(parts: Iterable[dict[str, dict[str, list[TimeRange]]]]) -> dict[str, dict[str, list[TimeRange]]]:
+    """Unions day -> room -> slots maps; a room present in several parts gets its slots combined."""
+    parts = list(parts)
+    if len(parts) == 1:
+        return parts[0]
+    result: dict[str, dict[str, list[TimeRange]]] = {}
+    for occupied in parts:
+        for day, rooms in occupied.items():
+            day_rooms = result.setdefault(day, {})
+            for room, slots in rooms.items():
+                if room in day_rooms:
+                    day_rooms[room] = sorted([*day_rooms[room], *slots], key=lambda item: item.start)
+                else:
+                    day_rooms[room] = slots
+    return result
 
 
 class ScheduleCacheRepository:
@@ -13,38 +71,86 @@ class ScheduleCacheRepository:
     def __init__(self, path: Path) -> None:
         self._path = path
 
+    @property
+    def path(self) -> Path:
+        return self._path
+
     def exists(self) -> bool:
         return self._path.exists()
 
+    def updated_at(self) -> float | None:
+        """Unix time of the last save, or None when there is no cache yet."""
+        try:
+            return self._path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+
     def load(self) -> dict[str, dict[str, list[TimeRange]]]:
-        if not self._path.exists():
-            return {}
-        payload = json.loads(self._path.read_text(encoding="utf-8"))
-        result: dict[str, dict[str, list[TimeRange]]] = {}
+        snapshot = self.load_snapshot()
+        return snapshot.merged() if snapshot else {}
 
-        for day, rooms in payload.items():
-            result[day] = {}
-            for room, slots in rooms.items():
-                result[day][room] = [
-                    TimeRange(
-                        start=datetime.strptime(slot["start"], "%H:%M").time(),
-                        end=datetime.strptime(slot["end"], "%H:%M").time(),
+    def load_snapshot(self) -> ScheduleSnapshot | None:
+        """Reads the cache; a legacy flat cache becomes one `LEGACY_BUILDING` entry aged by file mtime."""
+        if not self._path.exists():
+            return None
+        with _LOAD_SECONDS.time(), span("cache.load"):
+            raw = self._path.read_text(encoding="utf-8")
+            payload = json.loads(raw)
+            if payload.get("format") == CACHE_FORMAT_VERSION:
+                buildings = {
+                    int(number): BuildingSnapshot(
+                        occupied=_decode_occupied(item["days"]),
+                        fetched_at=float(item["fetched_at"]),
                     )
-                    for slot in slots
-                ]
-        return result
+                    for number, item in payload["buildings"].items()
+                }
+            else:
+                buildings = {
+                    LEGACY_BUILDING: BuildingSnapshot(
+                        occupied=_decode_occupied(payload),
+                        fetched_at=self._path.stat().st_mtime,
+                    )
+                }
+        _SIZE_BYTES.set(len(raw.encode("utf-8")))
+        return ScheduleSnapshot(buildings=buildings)
 
-    def save(self, occupied: dict[str, dict[str, list[TimeRange]]]) -> Path:
+    def save(self, snapshot: ScheduleSnapshot) -> Path:
         self._path.parent.mkdir(parents=True, exist_ok=True)
-        payload = {
-            day: {
-                room: [
-                    {"start": slot.start.strftime("%H:%M"), "end": slot.end.strftime("%H:%M")}
-                    for slot in slots
-                ]
-                for room, slots in rooms.items()
+        with _SAVE_SECONDS.time(), span("cache.save"):
+            payload = {
+                "format": CACHE_FORMAT_VERSION,
+                "buildings": {
+                    str(number): {"fetched_at": item.fetched_at, "days": _encode_occupied(item.occupied)}
+                    for number, item in sorted(snapshot.buildings.items())
+                },
             }
-            for day, rooms in occupied.items()
-        }
-        self._path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+            text = json.dumps(payload, ensure_ascii=False, indent=2)
+            # Readers in other threads or processes must never see a half-written file.
+            write_atomic(self._path, text)
+        _SIZE_BYTES.set(len(text.encode("utf-8")))
         return self._path
+
+
+def _decode_occupied(payload: dict) -> dict[str, dict[str, list[TimeRange]]]:
+    result: dict[str, dict[str, list[TimeRange]]] = {}
+    for day, rooms in payload.items():
+        result[day] = {}
+        for room, slots in rooms.items():
+            result[day][room] = [
+                TimeRange(
+                    start=datetime.strptime(slot["start"], "%H:%M").time(),
+                    end=datetime.strptime(slot["end"], "%H:%M").time(),
+                )
+                for slot in slots
+            ]
+    return result
+
+
+def _encode_occupied(occupied: dict[str, dict[str, list[TimeRange]]]) -> dict:
+    return {
+        day: {
+            room: [{"start": slot.start.strftime("%H:%M"), "end": slot.end.strftime("%H:%M")} for slot in slots]
+            for room, slots in rooms.items()
+        }
+        for day, rooms in occupied.items()
+    }
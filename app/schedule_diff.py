@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+from app.atomic_file import write_atomic
+from app.free_rooms import format_slot
+from app.models import TimeRange
+
+# Slots listed per direction in a change-log entry; counts are always complete.
+CHANGELOG_SAMPLE_SIZE = 20
+
+SlotKey = tuple[str, str, TimeRange]
+
+
+@dataclass(frozen=True)
+class ReservationCollision:
+    """A booked slot that a lesson added by the latest refresh now overlaps."""
+
+    day: str
+    room: str
+    lesson: TimeRange
+    reservation: TimeRange
+
+    def to_payload(self) -> dict[str, str]:
+        return {
+            "date": self.day,
+            "room": self.room,
+            "lesson": format_slot(self.lesson),
+            "reservation": format_slot(self.reservation),
+        }
+
+
+@dataclass
+class ScheduleDiff:
+    """Occupied slots added and removed between two schedule snapshots."""
+
+    added_days: list[str] = field(default_factory=list)
+    removed_days: list[str] = field(default_factory=list)
+    added: list[SlotKey] = field(default_factory=list)
+    removed: list[SlotKey] = field(default_factory=list)
+
+    @property
+    def changed_days(self) -> set[str]:
+        days = {*self.added_days, *self.removed_days}
+        days.update(day for day, _, _ in self.added)
+        days.update(day for day, _, _ in self.removed)
+        return days
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added_days or self.removed_days or self.added or self.removed)
+
+    def collisions(self, reserved_for_day: Callable[[str], dict[str, list[TimeRange]]]) -> list[ReservationCollision]:
+        """Reservations overlapped by added lessons; `reserved_for_day` is e.g. `ReservationLedger.reserved_for_day`."""
+        result = []
+        booked_by_day: dict[str, dict[str, list[TimeRange]]] = {}
+        for day, room, lesson in self.added:
+            if day not in booked_by_day:
+                booked_by_day[day] = reserved_for_day(day)
+            for reservation in booked_by_day[day].get(room, ()):
+                if lesson.overlaps(reservation):
+                    result.append(ReservationCollision(day=day, room=room, lesson=lesson, reservation=reservation))
+        return result
+
+    def summary_line(self) -> str:
+        return (
+            f"+{len(self.added)}/-{len(self.removed)} slots in {len(self.changed_days)} days "
+            f"(days added: {len(self.added_days)}, removed: {len(self.removed_days)})"
+        )
+
+    def to_payload(self) -> dict:
+        return {
+            "days_added": sorted(self.added_days),
+            "days_removed": sorted(self.removed_days),
+            "changed_days": sorted(self.changed_days),
+            "slots_added": len(self.added),
+            "slots_removed": len(self.removed),
+            "sample_added": [_format_key(key) for key in self.added[:CHANGELOG_SAMPLE_SIZE]],
+            "sample_removed": [_format_key(key) for key in self.removed[:CHANGELOG_SAMPLE_SIZE]],
+        }
+
+
+def diff_schedules(
+    previous: dict[str, dict[str, list[TimeRange]]],
+    current: dict[str, dict[str, list[TimeRange]]],
+) -> ScheduleDiff:
+    diff = ScheduleDiff(
+        added_days=sorted(current.keys() - previous.keys()),
+        removed_days=sorted(previous.keys() - current.keys()),
+    )
+    for day in sorted(previous.keys() | current.keys()):
+        old_rooms, new_rooms = previous.get(day, {}), current.get(day, {})
+        if old_rooms is new_rooms:
+            continue
+        for room in sorted(old_rooms.keys() | new_rooms.keys()):
+            old_slots, new_slots = old_rooms.get(room, []), new_rooms.get(room, [])
+            if old_slots == new_slots:
+                continue
+            old_set, new_set = set(old_slots), set(new_slots)
+            diff.added.extend((day, room, slot) for slot in new_slots if slot not in old_set)
+            diff.removed.extend((day, room, slot) for slot in old_slots if slot not in new_set)
+    return diff
+
+
+class ScheduleChangeLog:
+    """Keeps the last `max_entries` refresh diffs as JSON Lines next to the cache."""
+
+    def __init__(self, path: Path, max_entries: int = 50) -> None:
+        self._path = path
+        self._max_entries = max(max_entries, 1)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @classmethod
+    def for_cache(cls, cache_path: Path, max_entries: int = 50) -> ScheduleChangeLog:
+        return cls(cache_path.with_name(f"{cache_path.stem}.changes.jsonl"), max_entries)
+
+    def append(self, diff: ScheduleDiff, collisions: list[ReservationCollision], failed_buildings: list[int]) -> dict:
+        entry = {
+            "at": datetime.now().astimezone().isoformat(timespec="seconds"),
+            **diff.to_payload(),
+            "failed_buildings": failed_buildings,
+            "collisions": [item.to_payload() for item in collisions],
+        }
+        entries = [*self.load(), entry][-self._max_entries :]
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self._path, "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in entries))
+        return entry
+
+    def load(self) -> list[dict]:
+        try:
+            lines = self._path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return []
+        return [json.loads(line) for line in lines if line.strip()]
+
+
+def _format_key(key: SlotKey) -> str:
+    day, room, slot = key
+    return f"{day} {room} {format_slot(slot)}"
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from app.allocator import NO_DAY
+from app.config import AppConfig
+from app.metrics import REGISTRY, default_labels
+from app.models import TimeRange
+from app.parser import RequestParser
+from app.refresher import ScheduleRefresher
+from app.service import RoomService
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP API requests by endpoint and status code.")
+_REQUEST_SECONDS = REGISTRY.histogram("http_request_seconds", "HTTP API request latency.")
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class RoomApiServer(ThreadingHTTPServer):
+    """Threaded HTTP/JSON front end over one resident `RoomService`.
+
+    Endpoints:
+    - `POST /allocate` — request lines (JSON `{"lines": [...]}` or a text/plain
+      body); granted rooms stay booked for later calls.
+    - `GET /free-rooms?date=YYYY-MM-DD&start=HH:MM&end=HH:MM&type=any` — rooms
+      still bookable for the slot.
+    - `POST /refresh` — refresh in the background (`?wait=1` blocks until done).
+    - `GET /health` — schedule age and counters; `GET /stats` — Prometheus text.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: RoomService) -> None:
+        super().__init__(address, RoomApiHandler)
+        self.service = service
+
+    def resolve(self, path: str) -> tuple[RoomService, str, dict[str, str]]:
+        """Service for `path`, the path within it and the metric labels of the request."""
+        return self.service, path, {}
+
+
+class TenantApiServer(ThreadingHTTPServer):
+    """The `RoomApiServer` endpoints for several tenants, each under `/<tenant>/...`.
+
+    Requests record metrics with a `tenant` label, and `/<tenant>/stats` shows only that tenant's samples.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], services: dict[str, RoomService]) -> None:
+        super().__init__(address, RoomApiHandler)
+        self.services = services
+
+    def resolve(self, path: str) -> tuple[RoomService, str, dict[str, str]]:
+        tenant, _, rest = path.lstrip("/").partition("/")
+        service = self.services.get(tenant)
+        if service is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown tenant {tenant!r}")
+        return service, f"/{rest}", {"tenant": tenant}
+
+
+class RoomApiHandler(BaseHTTPRequestHandler):
+    server: RoomApiServer | TenantApiServer
+    protocol_version = "HTTP/1.1"
+    # Service of the request being handled and its metric labels, chosen by `server.resolve`, and its body.
+    _service: RoomService
+    _labels: dict[str, str]
+    _body: str
+
+    def do_GET(self) -> None:
+        self._dispatch({"/free-rooms": self._free_rooms, "/health": self._health, "/stats": self._stats})
+
+    def do_POST(self) -> None:
+        self._dispatch({"/allocate": self._allocate, "/refresh": self._refresh})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _dispatch(self, routes: dict[str, Any]) -> None:
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        route = None
+        self._labels = {}
+        try:
+            # Read before routing: a body left unread on a kept-alive connection
+            # would be parsed as the next request.
+            self._body = self._read_body()
+            self._service, path, self._labels = self.server.resolve(url.path)
+            route = routes.get(path)
+            if route is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown endpoint {self.command} {url.path}")
+            with default_labels(**self._labels):
+                status, body = route(parse_qs(url.query))
+        except ApiError as error:
+            status, body = error.status, {"error": str(error)}
+        except Exception as error:
+            logger.exception("Request %s %s failed", self.command, self.path)
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(error)}
+
+        if isinstance(body, str):
+            self._send(status, body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send(status, json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+        _REQUESTS.inc(endpoint=path if route else "unknown", code=str(int(status)), **self._labels)
+        _REQUEST_SECONDS.observe(time.perf_counter() - started, **self._labels)
+
+    def _send(self, status: HTTPStatus, payload: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self) -> str:
+        """Reads the whole body; when it cannot be delimited, the connection is closed after the error."""
+        if "Transfer-Encoding" in self.headers:
+            self.close_connection = True
+            raise ApiError(HTTPStatus.LENGTH_REQUIRED, "Chunked bodies are not supported; send Content-Length")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Body exceeds {MAX_BODY_BYTES} bytes")
+        try:
+            return self.rfile.read(length).decode("utf-8")
+        except UnicodeDecodeError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body is not valid UTF-8") from None
+
+    def _read_lines(self) -> list[str]:
+        raw = self._body
+        if not self.headers.get("Content-Type", "").startswith("application/json"):
+            return raw.splitlines()
+        try:
+            payload = json.loads(raw or "{}")
+        except ValueError as error:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {error}") from None
+        lines = payload.get("lines") if isinstance(payload, dict) else None
+        if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Expected {"lines": ["...", ...]}')
+        return lines
+
+    def _allocate(self, query: dict[str, list[str]]) -> tuple[HTTPStatus, Any]:
+        batch = RequestParser.parse_many(self._read_lines())
+        allocations = self._service.reserve(batch.requests)
+        records = {error.line_number: error.to_payload() for error in batch.errors}
+        for (number, _), item in zip(batch.entries, allocations):
+            records[number] = {"line": number, **item.to_payload()}
+        return HTTPStatus.OK, {"results": [records[number] for number in sorted(records)]}
+
+    def _free_rooms(self, query: dict[str, list[str]]) -> tuple[HTTPStatus, Any]:
+        try:
+            day = date.fromisoformat(_single(query, "date"))
+            start = datetime.strptime(_single(query, "start"), "%H:%M").time()
+            end = datetime.strptime(_single(query, "end"), "%H:%M").time()
+        except ValueError as error:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(error)) from None
+        if end <= start:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "end must be later than start")
+        room_type = query.get("type", ["any"])[0]
+        rooms = self._service.free_rooms(day, TimeRange(start=start, end=end), room_type)
+        payload = {"date": day.isoformat(), "start": _single(query, "start"), "end": _single(query, "end"), "type": room_type}
+        if rooms is None:
+            return HTTPStatus.NOT_FOUND, {**payload, "status": NO_DAY, "rooms": []}
+        return HTTPStatus.OK, {**payload, "status": "ok", "rooms": rooms}
+
+    def _refresh(self, query: dict[str, list[str]]) -> tuple[HTTPStatus, Any]:
+        service = self._service
+        if query.get("wait", ["0"])[0] in ("1", "true"):
+            occupied = service.refresh_schedule_cache()
+            diff = service.last_schedule_diff
+            return HTTPStatus.OK, {
+                "days": len(occupied),
+                "failed_buildings": service.last_failed_buildings,
+                "changes": diff.to_payload() if diff else None,
+                "collisions": [item.to_payload() for item in service.last_reservation_collisions],
+            }
+        return HTTPStatus.ACCEPTED, {"started": service.refresh_in_background()}
+
+    def _health(self, query: dict[str, list[str]]) -> tuple[HTTPStatus, Any]:
+        service = self._service
+        occupied = service.ensure_schedule_cache()
+        ages = service.building_ages()
+        stale = service.stale_buildings()
+        return HTTPStatus.OK, {
+            "status": "stale" if stale else "ok",
+            "days": len(occupied),
+            "schedule_age_seconds": round(max(ages.values(), default=0.0), 1),
+            "building_age_seconds": {str(number): round(age, 1) for number, age in sorted(ages.items())},
+            "stale_buildings": [str(number) for number in sorted(stale)],
+            "failed_buildings": service.last_failed_buildings,
+            "reservations": service.ledger.count(),
+            "reservation_collisions": len(service.last_reservation_collisions),
+        }
+
+    def _stats(self, query: dict[str, list[str]]) -> tuple[HTTPStatus, Any]:
+        return HTTPStatus.OK, REGISTRY.render(**self._labels)
+
+
+def _single(query: dict[str, list[str]], name: str) -> str:
+    values = query.get(name)
+    if not values:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Missing query parameter {name!r}")
+    return values[0]
+
+
+def run_server(config: AppConfig) -> None:
+    service = RoomService(config, background_revalidation=True)
+    service.ensure_schedule_cache()
+    refresher = ScheduleRefresher.from_config(service, config)
+    refresher_thread = threading.Thread(target=refresher.run_forever, name="schedule-refresher", daemon=True)
+    refresher_thread.start()
+
+    server = RoomApiServer((config.server_host, config.server_port), service)
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        refresher.stop()
+        refresher_thread.join(timeout=5)
+        service.write_metrics()
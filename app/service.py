@@ -1,79 +1,440 @@
 from __future__ import annotations
 
-import time as sleep_time
-from datetime import datetime, time
+import logging
+import threading
+import time
+from datetime import date
 from pathlib import Path
-from zoneinfo import ZoneInfo
+from typing import TYPE_CHECKING, Any, Mapping
 
-from app.allocator import RoomAllocator
 from app.config import AppConfig
+from app.metrics import REGISTRY, default_labels
 from app.models import AllocationResult, Request, TimeRange
-from app.pdf_mode import PdfPayloadBuilder
-from app.ruz_client import FetchStats, RuzScheduleClient
-from app.schedule_cache import ScheduleCacheRepository
+from app.schedule_cache import LEGACY_BUILDING, BuildingSnapshot, ScheduleCacheRepository, ScheduleSnapshot
 
-MSK_TZ = ZoneInfo("Europe/Moscow")
-REFRESH_TIMES = (time(hour=4, minute=0), time(hour=16, minute=0))
+if TYPE_CHECKING:
+    from app.allocator import RoomAllocator
+    from app.free_rooms import FreeRoomSummary
+    from app.pdf_mode import PdfPayloadBuilder
+    from app.reservations import ReservationLedger
+    from app.schedule_diff import ReservationCollision, ScheduleDiff
+    from app.shared_snapshot import SharedSnapshot, SharedSnapshotFile
+    from app.ruz_client import FetchResult, FetchStats, JsonLoader, RuzScheduleClient
+
+logger = logging.getLogger(__name__)
+
+_REFRESH_SECONDS = REGISTRY.histogram("schedule_refresh_seconds", "Full refresh duration: fetch, normalize and save.")
+_LAST_REFRESH = REGISTRY.gauge("schedule_last_refresh_timestamp_seconds", "Unix time of the last successful refresh.")
+_BUILDING_FETCHED = REGISTRY.gauge(
+    "schedule_building_fetched_timestamp_seconds",
+    "Unix time the served data of each building was fetched.",
+)
+_BUILDING_FAILURES = REGISTRY.counter("schedule_building_refresh_failures_total", "Buildings that failed to refresh.")
+_BACKGROUND_REFRESHES = REGISTRY.counter("schedule_background_refreshes_total", "Stale-while-revalidate refreshes.")
+_CHANGED_SLOTS = REGISTRY.counter("schedule_changed_slots_total", "Occupied slots added or removed by refreshes.")
+_CHANGED_DAYS = REGISTRY.gauge("schedule_changed_days", "Days changed by the last refresh.")
+_COLLISIONS = REGISTRY.gauge("reservation_collisions", "Reservations overlapped by lessons added in the last refresh.")
+_STALE_BUILDINGS = REGISTRY.gauge(
+    "schedule_stale_buildings", "Buildings served with data older than schedule_max_staleness_seconds."
+)
+
+
+class ScheduleRefreshError(RuntimeError):
+    """Every building failed to refresh; the previous cache was left untouched."""
 
 
 class RoomService:
-    """Main application service with cached schedule and report mode."""
+    """Main application service with cached schedule and report mode.
 
-    def __init__(self, config: AppConfig) -> None:
+    Collaborators are built on first use, so `--mode allocate` never imports the
+    HTTP client and `--mode refresh` never builds the allocator.
+    `metric_labels` (e.g. a tenant) mark its background refreshes and limit
+    `write_metrics` to samples carrying them. `background_revalidation` is for
+    long-running processes (server, bot): a one-shot CLI run would exit before
+    a background refresh finished, so by default a stale snapshot is refreshed
+    before the request is answered.
+    """
+
+    def __init__(
+        self,
+        config: AppConfig,
+        load_json: JsonLoader | None = None,
+        metric_labels: Mapping[str, str] | None = None,
+        background_revalidation: bool = False,
+    ) -> None:
         self._config = config
-        self._client = RuzScheduleClient(config)
-        self._allocator = RoomAllocator(config)
-        self._report_builder = PdfPayloadBuilder(config)
+        self._load_json = load_json
+        self._metric_labels = dict(metric_labels or {})
+        self._background_revalidation = background_revalidation
+        self._client: RuzScheduleClient | None = None
+        self._allocator: RoomAllocator | None = None
+        self._report_builder: PdfPayloadBuilder | None = None
         self._cache = ScheduleCacheRepository(Path(config.schedule_cache_path))
         self._last_fetch_stats: FetchStats | None = None
+        self._last_failed_buildings: list[int] = []
+        self._last_diff: ScheduleDiff | None = None
+        self._last_collisions: list[ReservationCollision] = []
+        self._snapshot: ScheduleSnapshot | SharedSnapshot | None = None
+        self._snapshot_mtime: float | None = None
+        # Merged schedule and its free-room summary, swapped together as one tuple so
+        # a concurrent refresh never pairs a new schedule with an old summary.
+        self._resident: tuple[dict[str, dict[str, list[TimeRange]]], FreeRoomSummary | None] = ({}, None)
+        self._refresh_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._ledger: ReservationLedger | None = None
+        self._background_lock = threading.Lock()
+        self._background_refresh: threading.Thread | None = None
+        # Failed refreshes in a row and the time before which requests do not start another one.
+        self._refresh_failures = 0
+        self._retry_at = 0.0
+        self._shared: SharedSnapshotFile | None = None
+        if config.shared_snapshot_path:
+            from app.shared_snapshot import SharedSnapshotFile
+
+            self._shared = SharedSnapshotFile(Path(config.shared_snapshot_path))
+
+    @property
+    def client(self) -> RuzScheduleClient:
+        if self._client is None:
+            from app.ruz_client import RuzScheduleClient
+
+            self._client = RuzScheduleClient(self._config, load_json=self._load_json)
+        return self._client
+
+    @property
+    def allocator(self) -> RoomAllocator:
+        if self._allocator is None:
+            from app.allocator import RoomAllocator
+
+            self._allocator = RoomAllocator(self._config)
+        return self._allocator
+
+    @property
+    def ledger(self) -> ReservationLedger:
+        """Bookings shared by every `reserve` call of this service (server and bot modes)."""
+        if self._ledger is None:
+            from app.reservations import ReservationLedger
+
+            # Unlike the other collaborators the ledger holds state: two threads
+            # racing here must not each book into a ledger of their own.
+            with self._load_lock:
+                if self._ledger is None:
+                    self._ledger = ReservationLedger()
+        return self._ledger
+
+    @property
+    def report_builder(self) -> PdfPayloadBuilder:
+        if self._report_builder is None:
+            from app.pdf_mode import PdfPayloadBuilder
+
+            self._report_builder = PdfPayloadBuilder(self._config)
+        return self._report_builder
 
     def ensure_schedule_cache(self) -> dict[str, dict[str, list[TimeRange]]]:
-        if self._cache.exists():
-            return self._cache.load()
-        return self.refresh_schedule_cache()
+        return self.ensure_schedule_and_summary()[0]
+
+    def ensure_schedule_and_summary(self) -> tuple[dict[str, dict[str, list[TimeRange]]], FreeRoomSummary | None]:
+        """Returns the resident schedule and summary, loading them on first use.
+
+        Once a snapshot exists it is always served. With `stale_while_revalidate`
+        a snapshot older than `schedule_revalidate_after_seconds` is revalidated;
+        in every mode so is one older than `schedule_max_staleness_seconds` (when
+        set), and its buildings are reported by `stale_buildings` instead of
+        failing the request. With `background_revalidation` the refresh runs in
+        the background and only the very first load blocks; otherwise it runs
+        before returning, and a failure still serves the previous snapshot.
+        After a failed refresh, requests start no other one until the retry
+        backoff (`refresh_retry_base_seconds`, doubling up to
+        `refresh_retry_max_seconds`) has passed.
+        """
+        snapshot = self._resident_snapshot()
+        if snapshot is None:
+            self._load_first_snapshot()
+            return self._resident
+
+        now = time.time()
+        age = now - (snapshot.oldest_fetched_at() or 0.0)
+        stale = self.stale_buildings(now)
+        _STALE_BUILDINGS.set(len(stale))
+        if stale or (self._config.stale_while_revalidate and age > self._config.schedule_revalidate_after_seconds):
+            self._revalidate(now)
+        return self._resident
 
     def refresh_schedule_cache(self) -> dict[str, dict[str, list[TimeRange]]]:
-        result = self._client.fetch_occupied_slots_with_stats()
-        self._last_fetch_stats = result.stats
-        self._cache.save(result.occupied)
-        return result.occupied
+        """Fetches every building and saves the merged snapshot.
+
+        A building that fails keeps its previously cached data (and its old
+        fetch time); if every building fails, `ScheduleRefreshError` is raised and
+        the cache is left as it was. The change against the previous snapshot is
+        appended to the change log, only changed days of the free-room summary
+        are recomputed, and bookings that new lessons overlap are reported.
+        """
+        with self._refresh_lock:
+            self._refresh_locked()
+        return self._resident[0]
+
+    def _refresh_locked(self) -> None:
+        """`refresh_schedule_cache` for a caller holding `_refresh_lock`; failures extend the retry backoff."""
+        from app.schedule_diff import diff_schedules
+
+        try:
+            with _REFRESH_SECONDS.time():
+                result = self.client.fetch_occupied_slots_with_stats()
+                self._last_fetch_stats = result.stats
+                previous = self._resident_snapshot()
+                if previous is not None and not isinstance(previous, ScheduleSnapshot):
+                    # A shared snapshot holds the merged schedule only; the per-building split is in the cache file.
+                    previous = self._cache.load_snapshot()
+                snapshot = self._merge_fetch_result(result, previous, time.time())
+                self._cache.save(snapshot)
+                occupied = snapshot.merged()
+                diff = diff_schedules(self._resident[0], occupied)
+                self._set_resident(snapshot, self._cache.updated_at(), occupied=occupied, diff=diff)
+                self._record_diff(diff)
+        except Exception:
+            self._refresh_failures += 1
+            delay = self._config.refresh_retry_base_seconds * 2 ** (self._refresh_failures - 1)
+            self._retry_at = time.time() + min(delay, self._config.refresh_retry_max_seconds)
+            raise
+        self._refresh_failures = 0
+        self._retry_at = 0.0
+        _LAST_REFRESH.set(time.time())
+
+    def refresh_in_background(self) -> bool:
+        """Starts a background refresh unless one is already running."""
+        with self._background_lock:
+            if self._background_refresh is not None and self._background_refresh.is_alive():
+                return False
+            self._background_refresh = threading.Thread(
+                target=self._revalidate_now, name="schedule-revalidate", daemon=True
+            )
+            self._background_refresh.start()
+            return True
+
+    def wait_for_background_refresh(self, timeout: float | None = None) -> None:
+        thread = self._background_refresh
+        if thread is not None:
+            thread.join(timeout)
+
+    def building_ages(self, now: float | None = None) -> dict[int, float]:
+        snapshot = self._resident_snapshot()
+        return snapshot.ages(time.time() if now is None else now) if snapshot else {}
+
+    def stale_buildings(self, now: float | None = None) -> dict[int, float]:
+        """Ages of the buildings served past `schedule_max_staleness_seconds`; empty without a limit."""
+        limit = self._config.schedule_max_staleness_seconds
+        if not limit:
+            return {}
+        return {number: age for number, age in self.building_ages(now).items() if age > limit}
+
+    @property
+    def last_failed_buildings(self) -> list[int]:
+        return list(self._last_failed_buildings)
+
+    @property
+    def last_schedule_diff(self) -> ScheduleDiff | None:
+        return self._last_diff
+
+    @property
+    def last_reservation_collisions(self) -> list[ReservationCollision]:
+        return list(self._last_collisions)
+
+    def schedule_updated_at(self) -> float | None:
+        return self._cache.updated_at()
 
     @property
     def last_fetch_stats(self) -> FetchStats | None:
         return self._last_fetch_stats
 
     def allocate(self, requests: list[Request]) -> list[AllocationResult]:
-        occupied = self.ensure_schedule_cache()
-        return self._allocator.allocate_batch(requests=requests, occupied=occupied)
+        occupied, summary = self.ensure_schedule_and_summary()
+        return self.allocator.allocate_batch(requests=requests, occupied=occupied, summary=summary)
 
-    def generate_pdf_payload(self, allocations: list[AllocationResult]) -> str:
-        return self._report_builder.build_text_report(allocations)
+    def reserve(self, requests: list[Request]) -> list[AllocationResult]:
+        """Like `allocate`, but granted rooms stay booked for later calls."""
+        occupied, summary = self.ensure_schedule_and_summary()
+        return self.ledger.book(requests, self.allocator, occupied, summary)
 
+    def free_rooms(self, day: date, slot: TimeRange, room_type: str) -> list[str] | None:
+        """Rooms still bookable for `slot`; None when the day is outside the cached schedule."""
+        occupied, summary = self.ensure_schedule_and_summary()
+        return self.ledger.free_rooms(self._config, day.isoformat(), slot, room_type, occupied, summary)
 
-class ScheduleRefresher:
-    """Background-friendly refresher for 04:00/16:00 MSK schedule updates."""
+    def _resident_snapshot(self) -> ScheduleSnapshot | SharedSnapshot | None:
+        """In-memory snapshot, reloaded only when another writer replaced the cache file.
 
-    def __init__(self, service: RoomService, poll_seconds: int) -> None:
-        self._service = service
-        self._poll_seconds = max(poll_seconds, 5)
-        self._last_refresh_key: str | None = None
+        With `shared_snapshot_path` the newest published shared generation is
+        used instead; the cache file is read only until one has been published.
+        """
+        if self._shared is not None:
+            shared = self._shared.attach()
+            if shared is not None:
+                if shared is not self._snapshot:
+                    self._install_shared(shared)
+                return shared
+        mtime = self._cache.updated_at()
+        if mtime is not None and mtime != self._snapshot_mtime:
+            with self._load_lock:
+                if mtime != self._snapshot_mtime:
+                    snapshot = self._cache.load_snapshot()
+                    if snapshot is not None:
+                        self._set_resident(snapshot, mtime)
+        return self._snapshot
 
-    def tick(self, now: datetime | None = None) -> bool:
-        now = now.astimezone(MSK_TZ) if now else datetime.now(MSK_TZ)
-        refresh_key = now.strftime("%Y-%m-%d %H:%M")
-        if should_refresh(now) and self._last_refresh_key != refresh_key:
-            self._service.refresh_schedule_cache()
-            self._last_refresh_key = refresh_key
-            return True
-        return False
+    def _set_resident(
+        self,
+        snapshot: ScheduleSnapshot | SharedSnapshot,
+        mtime: float | None,
+        occupied: dict[str, dict[str, list[TimeRange]]] | None = None,
+        diff: ScheduleDiff | None = None,
+    ) -> None:
+        """Installs a snapshot; with a `diff` from the resident one, only changed summary days are rebuilt.
+
+        With `shared_snapshot_path` the result is published as the next shared
+        generation and this process switches to the mapped copy as well.
+        """
+        from app.free_rooms import FreeRoomSummary, FreeRoomSummaryRepository, summary_source
+
+        occupied = snapshot.merged() if occupied is None else occupied
+        repository = FreeRoomSummaryRepository.for_cache(self._cache.path)
+        source = summary_source(self._config, snapshot.fetched_at)
+        previous_summary = self._resident[1]
+        if diff is not None and previous_summary is not None:
+            summary = previous_summary.rebuild_days(occupied, self._config, diff.changed_days, source)
+            repository.save(summary)
+        else:
+            summary = None if diff is not None else repository.load(source)
+            if summary is None:
+                summary = FreeRoomSummary.build(occupied, self._config, source=source)
+                repository.save(summary)
+        self._snapshot_mtime = mtime
+        if self._shared is not None:
+            self._install_shared(self._shared.publish(occupied, snapshot.fetched_at, summary))
+            return
+        self._resident = (occupied, summary)
+        self._snapshot = snapshot
+        for number, fetched_at in snapshot.fetched_at.items():
+            _BUILDING_FETCHED.set(fetched_at, building=str(number))
+        self._forget_past_bookings(occupied)
 
-    def run_forever(self) -> None:
-        while True:
-            self.tick()
-            sleep_time.sleep(self._poll_seconds)
+    def _install_shared(self, shared: SharedSnapshot) -> None:
+        self._resident = (shared.occupied, shared.summary)
+        self._snapshot = shared
+        for number, fetched_at in shared.fetched_at.items():
+            _BUILDING_FETCHED.set(fetched_at, building=str(number))
+        self._forget_past_bookings(shared.occupied)
 
+    def _forget_past_bookings(self, occupied: Mapping[str, Any]) -> None:
+        """Drops bookings of days before the served schedule window; they can no longer be booked or collide.
+
+        Without this a long-running server or bot would keep every booking of every past day.
+        """
+        if self._ledger is None or not occupied:
+            return
+        first_day = min(occupied)
+        dropped = self._ledger.forget_before(first_day)
+        if dropped:
+            logger.info("Forgot bookings of %d days before %s", dropped, first_day)
+
+    def _record_diff(self, diff: ScheduleDiff) -> None:
+        from app.schedule_diff import ScheduleChangeLog
+
+        collisions = diff.collisions(self._ledger.reserved_for_day) if self._ledger is not None else []
+        for item in collisions:
+            payload = item.to_payload()
+            logger.warning(
+                "New lesson %s overlaps reservation %s in room %s on %s",
+                payload["lesson"],
+                payload["reservation"],
+                item.room,
+                item.day,
+            )
+        _CHANGED_SLOTS.inc(len(diff.added), change="added")
+        _CHANGED_SLOTS.inc(len(diff.removed), change="removed")
+        _CHANGED_DAYS.set(len(diff.changed_days))
+        _COLLISIONS.set(len(collisions))
+        self._last_diff = diff
+        self._last_collisions = collisions
+        ScheduleChangeLog.for_cache(self._cache.path, self._config.schedule_changelog_entries).append(
+            diff, collisions, self._last_failed_buildings
+        )
+
+    def _merge_fetch_result(
+        self,
+        result: FetchResult,
+        previous: ScheduleSnapshot | None,
+        now: float,
+    ) -> ScheduleSnapshot:
+        fetched = {number: item.occupied for number, item in result.buildings.items() if item.ok}
+        failed = {number: item.error for number, item in result.buildings.items() if not item.ok}
+        if not result.buildings:
+            fetched = self._split_by_building(result.occupied)
+        if failed and not fetched:
+            raise ScheduleRefreshError(f"All buildings failed to refresh: {failed}")
+
+        previous_buildings = self._previous_by_building(previous)
+        buildings = {number: BuildingSnapshot(occupied=occupied, fetched_at=now) for number, occupied in fetched.items()}
+        for number, error in failed.items():
+            _BUILDING_FAILURES.inc(building=str(number))
+            logger.warning("Building %s failed to refresh, keeping previous data: %s", number, error)
+            if number in previous_buildings:
+                buildings[number] = previous_buildings[number]
+        self._last_failed_buildings = sorted(failed)
+        return ScheduleSnapshot(buildings=buildings)
+
+    def _previous_by_building(self, previous: ScheduleSnapshot | None) -> dict[int, BuildingSnapshot]:
+        if previous is None:
+            return {}
+        buildings = dict(previous.buildings)
+        legacy = buildings.pop(LEGACY_BUILDING, None)
+        if legacy is not None:
+            for number, occupied in self._split_by_building(legacy.occupied).items():
+                buildings.setdefault(number, BuildingSnapshot(occupied=occupied, fetched_at=legacy.fetched_at))
+        return buildings
+
+    def _split_by_building(
+        self, occupied: dict[str, dict[str, list[TimeRange]]]
+    ) -> dict[int, dict[str, dict[str, list[TimeRange]]]]:
+        """Splits a flat map by the configured room lists; unknown rooms go to `LEGACY_BUILDING`."""
+        building_of = {room: number for number, rooms in self._config.allowed_rooms.items() for room in rooms}
+        result: dict[int, dict[str, dict[str, list[TimeRange]]]] = {}
+        for day, rooms in occupied.items():
+            # Days without lessons are still schedule days; keep them for every building.
+            for number in self._config.allowed_rooms:
+                result.setdefault(number, {}).setdefault(day, {})
+            for room, slots in rooms.items():
+                number = building_of.get(room, LEGACY_BUILDING)
+                result.setdefault(number, {}).setdefault(day, {})[room] = slots
+        return result
+
+    def _load_first_snapshot(self) -> None:
+        """Blocking refresh when there is nothing to serve; concurrent callers wait for a single one."""
+        wait = self._retry_at - time.time()
+        if wait > 0:
+            raise ScheduleRefreshError(f"No schedule loaded yet; the last refresh failed, next attempt in {wait:.0f} s")
+        with self._refresh_lock:
+            if self._resident_snapshot() is None:
+                self._refresh_locked()
+
+    def _revalidate(self, now: float) -> None:
+        if now < self._retry_at:
+            return
+        if self._background_revalidation:
+            self.refresh_in_background()
+        else:
+            self._revalidate_now()
+
+    def _revalidate_now(self) -> None:
+        with default_labels(**self._metric_labels):
+            _BACKGROUND_REFRESHES.inc()
+            try:
+                self.refresh_schedule_cache()
+            except Exception:
+                logger.exception("Schedule revalidation failed; serving the previous snapshot")
+
+    def write_metrics(self) -> Path:
+        return REGISTRY.write(Path(self._config.metrics_path), **self._metric_labels)
+
+    def generate_pdf_payload(self, allocations: list[AllocationResult]) -> str:
+        return self.report_builder.build_text_report(allocations)
 
-def should_refresh(now: datetime | None = None) -> bool:
-    """Returns True around 04:00 and 16:00 MSK (exact minute)."""
-    now = now.astimezone(MSK_TZ) if now else datetime.now(MSK_TZ)
-    return any(now.hour == slot.hour and now.minute == slot.minute for slot in REFRESH_TIMES)
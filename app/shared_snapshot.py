@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import time
+from pathlib import Path
+from typing import Iterator, Mapping
+
+from app.atomic_file import write_atomic
+from app.free_rooms import FreeRoomSummary, SummaryKey
+from app.metrics import REGISTRY
+from app.models import TimeRange
+from app.profiling import span
+
+logger = logging.getLogger(__name__)
+
+SHARED_FORMAT_VERSION = 1
+MAGIC = b"ROOMSNAP"
+# Arrays are stored in native byte order: the file is shared by processes of
+# one host, and a reader on a different architecture rejects it by this mark.
+_BYTE_ORDER_MARK = 0x01020304
+# magic, format, byte order mark, generation, metadata length
+_HEADER = struct.Struct("=8sIIQI4x")
+_ALIGN = 8
+
+# Section name -> array typecode. day_entries/entry_slots/summary_offsets are
+# CSR offsets (one more item than rows); slots holds start/end minute pairs.
+_SECTIONS = (
+    ("day_entries", "I"),
+    ("entry_rooms", "I"),
+    ("entry_slots", "I"),
+    ("slots", "H"),
+    ("summary_present", "B"),
+    ("summary_offsets", "I"),
+    ("summary_rooms", "I"),
+)
+
+_GENERATION = REGISTRY.gauge("shared_snapshot_generation", "Generation of the shared schedule snapshot in use.")
+_SIZE_BYTES = REGISTRY.gauge("shared_snapshot_size_bytes", "Size of the published shared schedule snapshot.")
+
+_TIMES = tuple(time(minute // 60, minute % 60) for minute in range(24 * 60))
+_RANGES: dict[int, TimeRange] = {}
+
+
+class SharedSnapshot:
+    """One published generation of the schedule, mapped read-only.
+
+    `occupied` and `summary.free_rooms` decode the requested day, room or
+    slot straight from the mapped pages, so every process attached to the same
+    generation shares one copy in the page cache. Exposes the same age helpers
+    as `ScheduleSnapshot`; the per-building split stays in the JSON cache.
+    """
+
+    def __init__(self, buffer: mmap.mmap, generation: int, meta: dict, sections: dict[str, memoryview]) -> None:
+        self._buffer = buffer
+        self.generation = generation
+        self.fetched_at = {int(number): float(value) for number, value in meta["fetched_at"].items()}
+        self.nbytes = len(buffer)
+        self._days: list[str] = meta["days"]
+        self._day_index = {day: index for index, day in enumerate(self._days)}
+        self._rooms: list[str] = meta["rooms"]
+        self._room_index = {room: index for index, room in enumerate(self._rooms)}
+        self._day_entries = sections["day_entries"]
+        self._entry_rooms = sections["entry_rooms"]
+        self._entry_slots = sections["entry_slots"]
+        self._slots = sections["slots"]
+        self.occupied = SharedSchedule(self)
+        self.summary: FreeRoomSummary | None = None
+        if meta["summary_source"] is not None:
+            self.summary = FreeRoomSummary(_SummaryView(self, meta, sections), source=meta["summary_source"])
+
+    def merged(self) -> SharedSchedule:
+        return self.occupied
+
+    def oldest_fetched_at(self) -> float | None:
+        return min(self.fetched_at.values(), default=None)
+
+    def ages(self, now: float) -> dict[int, float]:
+        return {number: max(now - fetched_at, 0.0) for number, fetched_at in self.fetched_at.items()}
+
+    def _slots_of(self, entry: int) -> list[TimeRange]:
+        bounds = iter(self._slots[2 * self._entry_slots[entry] : 2 * self._entry_slots[entry + 1]])
+        ranges = _RANGES
+        return [ranges.get(start << 16 | end) or _time_range(start, end) for start, end in zip(bounds, bounds)]
+
+
+class SharedSchedule(Mapping[str, Mapping[str, list[TimeRange]]]):
+    """Read-only day -> room -> slots view of a `SharedSnapshot`."""
+
+    def __init__(self, snapshot: SharedSnapshot) -> None:
+        self._snapshot = snapshot
+
+    def __getitem__(self, day: str) -> _SharedDay:
+        snapshot = self._snapshot
+        index = snapshot._day_index[day]
+        return _SharedDay(snapshot, snapshot._day_entries[index], snapshot._day_entries[index + 1])
+
+    def __contains__(self, day: object) -> bool:
+        return day in self._snapshot._day_index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._snapshot._days)
+
+    def __len__(self) -> int:
+        return len(self._snapshot._days)
+
+
+class _SharedDay(Mapping[str, list[TimeRange]]):
+    __slots__ = ("_snapshot", "_first", "_end")
+
+    def __init__(self, snapshot: SharedSnapshot, first: int, end: int) -> None:
+        self._snapshot = snapshot
+        self._first = first
+        self._end = end
+
+    def __getitem__(self, room: str) -> list[TimeRange]:
+        slots = self.get(room)
+        if slots is None:
+            raise KeyError(room)
+        return slots
+
+    def get(self, room: str, default=None):  # type: ignore[override]
+        # Overridden because the allocator probes every candidate room with `get`.
+        snapshot = self._snapshot
+        index = snapshot._room_index.get(room)
+        if index is not None:
+            # Entries of a day are sorted by room index.
+            entry = bisect_left(snapshot._entry_rooms, index, self._first, self._end)
+            if entry < self._end and snapshot._entry_rooms[entry] == index:
+                return snapshot._slots_of(entry)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        rooms = self._snapshot._rooms
+        return (rooms[index] for index in self._snapshot._entry_rooms[self._first : self._end])
+
+    def __len__(self) -> int:
+        return self._end - self._first
+
+
+class _SummaryView(Mapping[SummaryKey, tuple[str, ...]]):
+    """Free-room summary entries laid out as a dense day x class x pair grid."""
+
+    def __init__(self, snapshot: SharedSnapshot, meta: dict, sections: dict[str, memoryview]) -> None:
+        self._snapshot = snapshot
+        self._classes: list[str] = meta["classes"]
+        self._class_index = {room_class: index for index, room_class in enumerate(self._classes)}
+        self._pairs = [_time_range(start, end) for start, end in meta["pairs"]]
+        self._pair_index = {slot: index for index, slot in enumerate(self._pairs)}
+        self._entries = int(meta["summary_entries"])
+        self._present = sections["summary_present"]
+        self._offsets = sections["summary_offsets"]
+        self._rooms = sections["summary_rooms"]
+
+    def __getitem__(self, key: SummaryKey) -> tuple[str, ...]:
+        day, room_class, slot = key
+        try:
+            index = self._cell(self._snapshot._day_index[day], self._class_index[room_class], self._pair_index[slot])
+        except KeyError:
+            raise KeyError(key) from None
+        if not self._present[index]:
+            raise KeyError(key)
+        names = self._snapshot._rooms
+        return tuple(names[room] for room in self._rooms[self._offsets[index] : self._offsets[index + 1]])
+
+    def __iter__(self) -> Iterator[SummaryKey]:
+        for day_index, day in enumerate(self._snapshot._days):
+            for class_index, room_class in enumerate(self._classes):
+                for pair_index, slot in enumerate(self._pairs):
+                    if self._present[self._cell(day_index, class_index, pair_index)]:
+                        yield (day, room_class, slot)
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def _cell(self, day_index: int, class_index: int, pair_index: int) -> int:
+        return (day_index * len(self._classes) + class_index) * len(self._pairs) + pair_index
+
+
+class SharedSnapshotFile:
+    """Publishes schedule snapshots to an mmap-able file and attaches to the newest one.
+
+    Each `publish` writes a complete new file with the next generation number
+    and renames it over the old one, so an attached reader sees either the old
+    or the new generation, never a mix. Readers keep the generation they
+    mapped until `attach` notices a new file; the old mapping stays valid for
+    whoever still holds it and is released with its last reference.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._current: tuple[tuple[int, int, int], SharedSnapshot] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def attach(self) -> SharedSnapshot | None:
+        """Newest published generation, or None when nothing (compatible) was published yet."""
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        current = self._current
+        if current is not None and current[0] == _file_key(stat):
+            return current[1]
+        with self._lock:
+            try:
+                with open(self._path, "rb") as file:
+                    key = _file_key(os.fstat(file.fileno()))
+                    if self._current is not None and self._current[0] == key:
+                        return self._current[1]
+                    buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                return None
+            try:
+                snapshot = _decode(buffer)
+            except ValueError as error:
+                logger.warning("Ignoring shared schedule snapshot %s: %s", self._path, error)
+                return None
+            self._current = (key, snapshot)
+        _GENERATION.set(snapshot.generation)
+        return snapshot
+
+    def publish(
+        self,
+        occupied: Mapping[str, Mapping[str, list[TimeRange]]],
+        fetched_at: dict[int, float],
+        summary: FreeRoomSummary | None = None,
+    ) -> SharedSnapshot:
+        """Writes the next generation and returns it attached."""
+        with span("shared_snapshot.publish"):
+            current = self.attach()
+            data = _encode(current.generation + 1 if current else 1, occupied, fetched_at, summary)
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(self._path, data)
+        _SIZE_BYTES.set(len(data))
+        snapshot = self.attach()
+        if snapshot is None:
+            raise RuntimeError(f"Shared schedule snapshot {self._path} disappeared right after publishing")
+        return snapshot
+
+
+def _encode(
+    generation: int,
+    occupied: Mapping[str, Mapping[str, list[TimeRange]]],
+    fetched_at: dict[int, float],
+    summary: FreeRoomSummary | None,
+) -> bytes:
+    days = sorted(occupied)
+    free_items = list(summary.items()) if summary is not None else []
+    rooms = sorted(
+        {room for day in days for room in occupied[day]} | {room for _, free in free_items for room in free}
+    )
+    room_index = {room: index for index, room in enumerate(rooms)}
+    arrays = {name: array(code) for name, code in _SECTIONS}
+
+    arrays["day_entries"].append(0)
+    arrays["entry_slots"].append(0)
+    for day in days:
+        by_room = occupied[day]
+        for room in sorted(by_room):
+            arrays["entry_rooms"].append(room_index[room])
+            for slot in by_room[room]:
+                arrays["slots"].extend((_minutes(slot.start), _minutes(slot.end)))
+            arrays["entry_slots"].append(len(arrays["slots"]) // 2)
+        arrays["day_entries"].append(len(arrays["entry_rooms"]))
+
+    classes = sorted({room_class for (_, room_class, _), _ in free_items})
+    pairs = sorted({slot for (_, _, slot), _ in free_items}, key=lambda slot: (slot.start, slot.end))
+    day_index = {day: index for index, day in enumerate(days)}
+    class_index = {room_class: index for index, room_class in enumerate(classes)}
+    pair_index = {slot: index for index, slot in enumerate(pairs)}
+    grid: list[tuple[str, ...] | None] = [None] * (len(days) * len(classes) * len(pairs))
+    for (day, room_class, slot), free in free_items:
+        if day in day_index:
+            grid[(day_index[day] * len(classes) + class_index[room_class]) * len(pairs) + pair_index[slot]] = free
+    arrays["summary_offsets"].append(0)
+    for free in grid:
+        arrays["summary_present"].append(free is not None)
+        arrays["summary_rooms"].extend(room_index[room] for room in free or ())
+        arrays["summary_offsets"].append(len(arrays["summary_rooms"]))
+
+    body = bytearray()
+    sections = {}
+    for name, _ in _SECTIONS:
+        sections[name] = [len(body), len(arrays[name])]
+        body += arrays[name].tobytes()
+        body += bytes(-len(body) % _ALIGN)
+    meta = json.dumps(
+        {
+            "fetched_at": {str(number): value for number, value in sorted(fetched_at.items())},
+            "days": days,
+            "rooms": rooms,
+            "classes": classes,
+            "pairs": [[_minutes(slot.start), _minutes(slot.end)] for slot in pairs],
+            "summary_source": summary.source if summary is not None else None,
+            "summary_entries": sum(free is not None for free in grid),
+            "sections": sections,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    header = _HEADER.pack(MAGIC, SHARED_FORMAT_VERSION, _BYTE_ORDER_MARK, generation, len(meta))
+    return header + meta + bytes(-(len(header) + len(meta)) % _ALIGN) + body
+
+
+def _decode(buffer: mmap.mmap) -> SharedSnapshot:
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        raise ValueError("file is shorter than the header")
+    magic, version, byte_order_mark, generation, meta_length = _HEADER.unpack_from(view)
+    if magic != MAGIC or version != SHARED_FORMAT_VERSION:
+        raise ValueError(f"expected format {SHARED_FORMAT_VERSION}, got {magic!r} version {version}")
+    if byte_order_mark != _BYTE_ORDER_MARK:
+        raise ValueError("written on a host with a different byte order")
+    meta = json.loads(bytes(view[_HEADER.size : _HEADER.size + meta_length]))
+    base = _HEADER.size + meta_length
+    base += -base % _ALIGN
+    sections = {}
+    for name, code in _SECTIONS:
+        offset, count = meta["sections"][name]
+        start = base + offset
+        sections[name] = view[start : start + count * array(code).itemsize].cast(code)
+    return SharedSnapshot(buffer, generation, meta, sections)
+
+
+def _file_key(stat: os.stat_result) -> tuple[int, int, int]:
+    # Every publish renames a new file into place, so the inode changes even
+    # when two generations are written within the mtime resolution.
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _minutes(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _time_range(start: int, end: int) -> TimeRange:
+    # Lessons reuse a handful of slots; sharing the objects keeps decoding cheap.
+    key = start << 16 | end
+    slot = _RANGES.get(key)
+    if slot is None:
+        slot = _RANGES.setdefault(key, TimeRange(_TIMES[start], _TIMES[end]))
+    return slot
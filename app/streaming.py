@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, TextIO
+
+from app.allocator import RoomAllocator, new_reservations
+from app.models import AllocationResult, TimeRange
+from app.parser import INVALID_REQUEST, ParseBatch, RequestParser
+
+if TYPE_CHECKING:
+    from app.free_rooms import FreeRoomSummary
+
+__all__ = ["DEFAULT_CHUNK_SIZE", "INVALID_REQUEST", "allocate_in_chunks", "stream_allocations", "write_json_lines"]
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def stream_allocations(
+    lines: Iterable[str],
+    allocator: RoomAllocator,
+    occupied: dict[str, dict[str, list[TimeRange]]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    year: int | None = None,
+    summary: FreeRoomSummary | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Allocates requests read lazily from `lines`, one output record per non-empty line.
+
+    Lines are processed in input order in chunks of `chunk_size`. All chunks share
+    one reservation map, so results are conflict-free across the whole input; the
+    map holds only granted, non-overlapping slots per room and day, so its size is
+    bounded by room capacity rather than by the number of lines.
+    Malformed lines yield an `invalid request` record instead of aborting the run.
+    """
+    for batch, results in allocate_in_chunks(lines, allocator, occupied, chunk_size, year, summary):
+        records = {error.line_number: error.to_payload() for error in batch.errors}
+        for (number, _), item in zip(batch.entries, results):
+            records[number] = {"line": number, **item.to_payload()}
+
+        for number in sorted(records):
+            yield records[number]
+
+
+def allocate_in_chunks(
+    lines: Iterable[str],
+    allocator: RoomAllocator,
+    occupied: dict[str, dict[str, list[TimeRange]]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    year: int | None = None,
+    summary: FreeRoomSummary | None = None,
+) -> Iterator[tuple[ParseBatch, list[AllocationResult]]]:
+    """Parses `lines` lazily and yields each chunk with its allocations (one per entry), in input order.
+
+    The results equal one `allocate_batch` call over the whole input.
+    """
+    reserved = new_reservations()
+    for batch in RequestParser.iter_batches(lines, chunk_size=chunk_size, year=year):
+        yield batch, allocator.allocate_batch(batch.requests, occupied, reserved=reserved, summary=summary)
+
+
+def write_json_lines(records: Iterable[dict[str, Any]], stream: TextIO) -> int:
+    written = 0
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False))
+        stream.write("\n")
+        written += 1
+    stream.flush()
+    return written
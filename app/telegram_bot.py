@@ -1,13 +1,21 @@
 from __future__ import annotations
 
 import json
+import logging
 import threading
+import time
 from dataclasses import dataclass
 from pathlib import Path
 
 from app.config import AppConfig, load_config
 from app.parser import RequestParser
-from app.service import RoomService, ScheduleRefresher
+from app.profiling import install_span_toggle_signal
+from app.refresher import ScheduleRefresher
+from app.service import RoomService
+
+METRICS_WRITE_INTERVAL_SECONDS = 15.0
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
@@ -25,32 +33,46 @@ class TelegramBotStub:
     """
 
     def __init__(self, config: AppConfig) -> None:
-        self._service = RoomService(config)
-        self._refresher = ScheduleRefresher(self._service, poll_seconds=config.refresh_poll_seconds)
+        self._service = RoomService(config, background_revalidation=True)
+        self._refresher = ScheduleRefresher.from_config(self._service, config)
+        self._metrics_written_at = 0.0
+
+    @property
+    def service(self) -> RoomService:
+        """The service answering this bot's messages, e.g. to load or refresh the schedule from outside."""
+        return self._service
 
     def run(self) -> None:
         self._service.ensure_schedule_cache()
-        threading.Thread(target=self._refresher.run_forever, daemon=True).start()
-
-        for message in self._poll_updates():
-            self._handle_message(message)
+        refresher_thread = threading.Thread(target=self._refresher.run_forever, name="schedule-refresher", daemon=True)
+        refresher_thread.start()
+
+        try:
+            for message in self._poll_updates():
+                try:
+                    self._handle_message(message)
+                except Exception:
+                    # One failed message (e.g. no schedule could be loaded yet) must not stop the bot.
+                    logger.exception("Failed to handle a message from chat %s", message.chat_id)
+        finally:
+            self._refresher.stop()
+            refresher_thread.join(timeout=5)
 
     def _handle_message(self, message: IncomingMessage) -> None:
-        requests = [RequestParser.parse(line) for line in message.text.splitlines() if line.strip()]
-        allocations = self._service.allocate(requests)
-        response = [
-            {
-                "name": item.request.full_name,
-                "goal": item.request.goal,
-                "date": item.request.day.isoformat(),
-                "start": item.request.slot.start.strftime("%H:%M"),
-                "end": item.request.slot.end.strftime("%H:%M"),
-                "room": item.room,
-                "status": item.status,
-            }
-            for item in allocations
-        ]
+        batch = RequestParser.parse_many(message.text.splitlines())
+        allocations = self._service.reserve(batch.requests)
+        records = {error.line_number: error.to_payload() for error in batch.errors}
+        for (number, _), item in zip(batch.entries, allocations):
+            records[number] = item.to_payload()
+        response = [records[number] for number in sorted(records)]
         self._send_message(message.chat_id, json.dumps(response, ensure_ascii=False, indent=2))
+        self._maybe_write_metrics()
+
+    def _maybe_write_metrics(self) -> None:
+        now = time.monotonic()
+        if now - self._metrics_written_at >= METRICS_WRITE_INTERVAL_SECONDS:
+            self._metrics_written_at = now
+            self._service.write_metrics()
 
     def _poll_updates(self) -> list[IncomingMessage]:
         """TODO: implement Telegram getUpdates polling or webhook adapter."""
@@ -63,4 +85,5 @@ class TelegramBotStub:
 
 def run_bot(config_path: Path = Path("config.json")) -> None:
     config = load_config(config_path)
+    install_span_toggle_signal()
     TelegramBotStub(config).run()
@@ -0,0 +1,229 @@
+"""Several tenants (one `AppConfig` each) in one process.
+
+Every tenant keeps its own `RoomService`: schedule cache, free-room summary,
+allocator, reservations and refresh times. Only the RUZ downloads are shared,
+through one `SharedFetchPool`, which downloads identical building+range
+requests once and limits connections and request rate for all tenants.
+
+Metrics stay in the process-wide `REGISTRY`; everything a tenant records is
+labelled `tenant="<name>"`, so its refresher writes only its own samples to
+its `metrics_path`, while the host's `metrics_path` gets them all.
+
+    python -m app.tenants --host-config tenants.json refresh
+    python -m app.tenants --host-config tenants.json serve
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+from app.config import AppConfig, load_config
+from app.fetch_pool import SharedFetchPool
+from app.free_rooms import FreeRoomSummaryRepository
+from app.metrics import REGISTRY, default_labels
+from app.schedule_diff import ScheduleChangeLog
+from app.service import RoomService
+
+if TYPE_CHECKING:
+    from app.refresher import ScheduleRefresher
+
+logger = logging.getLogger(__name__)
+
+# Tenant names become the first segment of API paths.
+TENANT_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class HostConfig:
+    """Tenants and the limits of the fetch pool they share."""
+
+    tenants: dict[str, AppConfig]
+    max_connections: int = 4
+    requests_per_second: float = 0.0
+    burst: int = 4
+    dedup_seconds: float = 60.0
+    server_host: str = "127.0.0.1"
+    server_port: int = 8080
+    metrics_path: str = "data/metrics.prom"
+
+    @staticmethod
+    def from_dict(data: dict[str, Any], base_dir: Path = Path(".")) -> HostConfig:
+        """`tenants` maps a name to a config file (relative to `base_dir`) or an inline config object."""
+        tenants = {}
+        for name, item in data["tenants"].items():
+            if not TENANT_NAME.fullmatch(name):
+                raise ValueError(f"Invalid tenant name {name!r}: use letters, digits, '-' and '_'")
+            tenants[name] = AppConfig.from_dict(item) if isinstance(item, dict) else load_config(base_dir / item)
+        config = HostConfig(
+            tenants=tenants,
+            max_connections=int(data.get("ruz_max_connections", 4)),
+            requests_per_second=float(data.get("ruz_requests_per_second", 0)),
+            burst=int(data.get("ruz_burst", 4)),
+            dedup_seconds=float(data.get("fetch_dedup_seconds", 60)),
+            server_host=str(data.get("server_host", "127.0.0.1")),
+            server_port=int(data.get("server_port", 8080)),
+            metrics_path=str(data.get("metrics_path", "data/metrics.prom")),
+        )
+        config.validate()
+        return config
+
+    def validate(self) -> None:
+        """Tenants must not share files: each one owns its cache, summary, change log, shared snapshot and metrics.
+
+        The summary and change log are named after the cache (`<stem>.free_rooms.json`,
+        `<stem>.changes.jsonl`), so `a.json` and `a.bin` in one directory collide too.
+        The host writes every tenant's metrics to its own `metrics_path`, so no tenant may use that file either.
+        """
+        if not self.tenants:
+            raise ValueError("At least one tenant is required")
+        owners: dict[Path, str] = {Path(self.metrics_path).resolve(): "the host"}
+        for name, tenant in self.tenants.items():
+            cache_path = Path(tenant.schedule_cache_path)
+            paths = [
+                cache_path,
+                FreeRoomSummaryRepository.for_cache(cache_path).path,
+                ScheduleChangeLog.for_cache(cache_path).path,
+                tenant.shared_snapshot_path,
+                tenant.metrics_path,
+            ]
+            for path in filter(None, paths):
+                resolved = Path(path).resolve()
+                if resolved in owners:
+                    raise ValueError(f"{owners[resolved].capitalize()} and tenant {name!r} both use {path}")
+                owners[resolved] = f"tenant {name!r}"
+
+
+def load_host_config(path: Path) -> HostConfig:
+    with path.open("r", encoding="utf-8") as file:
+        payload = json.load(file)
+    return HostConfig.from_dict(payload, base_dir=path.parent)
+
+
+class TenantHost:
+    """Owns the tenants' services and the fetch pool they share."""
+
+    def __init__(self, config: HostConfig, pool: SharedFetchPool | None = None) -> None:
+        config.validate()
+        self.config = config
+        self.pool = pool or SharedFetchPool(
+            max_connections=config.max_connections,
+            requests_per_second=config.requests_per_second,
+            burst=config.burst,
+            dedup_seconds=config.dedup_seconds,
+        )
+        self.services = {
+            name: RoomService(
+                tenant, load_json=self.pool.load_json, metric_labels={"tenant": name}, background_revalidation=True
+            )
+            for name, tenant in config.tenants.items()
+        }
+        self._refreshers: list[tuple[ScheduleRefresher, threading.Thread]] = []
+
+    def service(self, tenant: str) -> RoomService:
+        return self.services[tenant]
+
+    def refresh_all(self) -> dict[str, BaseException | None]:
+        """Refreshes every tenant at once, so their identical requests overlap and are downloaded once."""
+        errors: dict[str, BaseException | None] = {}
+        with ThreadPoolExecutor(max_workers=len(self.services), thread_name_prefix="tenant-refresh") as executor:
+            futures = {
+                name: executor.submit(_as_tenant, name, service.refresh_schedule_cache)
+                for name, service in self.services.items()
+            }
+            for name, future in futures.items():
+                error = future.exception()
+                if error is not None:
+                    logger.error("Tenant %s failed to refresh: %s", name, error)
+                errors[name] = error
+        return errors
+
+    def start_refreshers(self) -> None:
+        """One `ScheduleRefresher` per tenant; tenants with equal `refresh_times` refresh together."""
+        from app.refresher import ScheduleRefresher
+
+        for name, service in self.services.items():
+            refresher = ScheduleRefresher.from_config(service, self.config.tenants[name])
+            thread = threading.Thread(
+                target=_as_tenant, args=(name, refresher.run_forever), name=f"schedule-refresher-{name}", daemon=True
+            )
+            thread.start()
+            self._refreshers.append((refresher, thread))
+
+    def stop(self) -> None:
+        for refresher, _ in self._refreshers:
+            refresher.stop()
+        for _, thread in self._refreshers:
+            thread.join(timeout=5)
+        self._refreshers.clear()
+        self.pool.close()
+
+    def write_metrics(self) -> Path:
+        """Writes the samples of all tenants, told apart by their `tenant` label."""
+        return REGISTRY.write(Path(self.config.metrics_path))
+
+
+def _as_tenant(name: str, func: Callable[[], T]) -> T:
+    with default_labels(tenant=name):
+        return func()
+
+
+def run_host(config: HostConfig) -> None:
+    from app.profiling import install_span_toggle_signal
+    from app.server import TenantApiServer
+
+    install_span_toggle_signal()
+    host = TenantHost(config)
+    for service in host.services.values():
+        service.ensure_schedule_cache()
+    host.start_refreshers()
+
+    server = TenantApiServer((config.server_host, config.server_port), host.services)
+    address, port = server.server_address[:2]
+    print(f"Serving {', '.join(sorted(host.services))} on http://{address}:{port}/<tenant>/...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        host.stop()
+        host.write_metrics()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Host several room configs in one process")
+    parser.add_argument("command", choices=["refresh", "serve"])
+    parser.add_argument("--host-config", default="tenants.json", help="Tenants and shared RUZ fetch limits")
+    args = parser.parse_args()
+
+    config = load_host_config(Path(args.host_config))
+    if args.command == "serve":
+        run_host(config)
+        return
+
+    host = TenantHost(config)
+    try:
+        errors = host.refresh_all()
+    finally:
+        host.stop()
+    for name, service in host.services.items():
+        status = f"failed: {errors[name]}" if errors[name] else f"{len(service.ensure_schedule_cache())} days"
+        print(f"{name}: {status}")
+    print(f"RUZ downloads: {host.pool.downloads}, connections opened: {host.pool.connections.opened}")
+    host.write_metrics()
+    if any(errors.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,47 @@
 import sys
+from dataclasses import replace
 from pathlib import Path
+from typing import Any, Callable
+
+import pytest
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import AppConfig  # noqa: E402
+
+
+def _base_config() -> AppConfig:
+    return AppConfig(
+        base_url="http://example/{building_oid}",
+        buildings={2: 145, 6: 147},
+        allowed_rooms={2: ["212", "305", "402"], 6: ["610", "620"]},
+        big_rooms={2: ["305", "402"], 6: ["620"]},
+        contact_fields={},
+        schedule_window_days_before=1,
+        schedule_window_months_after=1,
+        schedule_range_start_param="start",
+        schedule_range_finish_param="finish",
+        schedule_range_date_format="%Y-%m-%d",
+        schedule_lang_param="lng",
+        schedule_lang_value=1,
+        schedule_cache_path="data/test_cache.json",
+        refresh_poll_seconds=30,
+    )
+
+
+@pytest.fixture
+def make_config() -> Callable[..., AppConfig]:
+    """Test `AppConfig` factory; keyword arguments override fields through `dataclasses.replace`.
+
+    `cache_path` also puts the metrics file next to the cache, so tests never write into data/.
+    """
+
+    def make(cache_path: Path | None = None, **overrides: Any) -> AppConfig:
+        config = _base_config()
+        if cache_path is not None:
+            config = replace(
+                config, schedule_cache_path=str(cache_path), metrics_path=str(cache_path.parent / "metrics.prom")
+            )
+        return replace(config, **overrides)
+
+    return make
@@ -1,37 +1,13 @@
 from datetime import date, time
 
 from app.allocator import NO_DAY, NO_ROOM, RoomAllocator
-from app.config import AppConfig
 from app.models import Request, TimeRange
 
+ROOMS = {"allowed_rooms": {2: ["212", "305"], 6: ["610"]}, "big_rooms": {2: ["305"], 6: ["610"]}}
 
-def _config() -> AppConfig:
-    return AppConfig(
-        base_url="http://example/{building_oid}",
-        buildings={2: 145, 6: 147},
-        allowed_rooms={2: ["212", "305"], 6: ["610"]},
-        big_rooms={2: ["305"], 6: ["610"]},
-        contact_fields={},
-        schedule_window_days_before=1,
-        schedule_window_months_after=1,
-<<<<<<< codex/implement-schedule-management-system-msv8qj
-        schedule_range_start_param="start",
-        schedule_range_finish_param="finish",
-        schedule_range_date_format="%Y-%m-%d",
-        schedule_lang_param="lng",
-        schedule_lang_value=1,
-=======
-        schedule_range_from_param="dateFrom",
-        schedule_range_to_param="dateTo",
-        schedule_range_date_format="%Y-%m-%d",
->>>>>>> main
-        schedule_cache_path="data/test_cache.json",
-        refresh_poll_seconds=30,
-    )
 
-
-def test_allocates_without_batch_overlap() -> None:
-    allocator = RoomAllocator(_config())
+def test_allocates_without_batch_overlap(make_config) -> None:
+    allocator = RoomAllocator(make_config(**ROOMS))
     occupied = {
         "2026-01-01": {
             "212": [TimeRange(start=time(10, 0), end=time(11, 0))],
@@ -51,8 +27,8 @@ def test_allocates_without_batch_overlap() -> None:
     assert results[0].room != results[1].room
 
 
-def test_returns_no_day_and_no_room() -> None:
-    allocator = RoomAllocator(_config())
+def test_returns_no_day_and_no_room(make_config) -> None:
+    allocator = RoomAllocator(make_config(**ROOMS))
     occupied = {"2026-01-01": {"212": [TimeRange(time(8, 0), time(20, 0))]}}
     requests = [
         Request("A B", "goal", date(2026, 1, 2), TimeRange(time(10, 0), time(11, 0)), "any"),
@@ -0,0 +1,50 @@
+import json
+
+from app.bot_loadtest import LoadTestReport, find_double_bookings, run_load_test
+
+
+def test_load_test_refreshes_midway_without_double_bookings(tmp_path, make_config) -> None:
+    report = run_load_test(make_config(), chats=300, concurrency=6, seed=3, work_dir=tmp_path)
+
+    assert report.messages == 300
+    assert len(report.latencies) == 300
+    assert report.refreshed
+    assert report.double_bookings == []
+    assert report.statuses["ok"] > 0
+    assert report.statuses["invalid request"] > 0
+    assert sum(report.statuses.values()) == report.lines
+    assert report.percentile(50) <= report.percentile(95) <= report.percentile(99)
+    assert not (tmp_path / "data").exists()
+    assert (tmp_path / "clean_schedule.json").exists()
+
+
+def test_find_double_bookings_reports_overlaps_across_chats() -> None:
+    def reply(room: str, start: str, end: str, status: str = "ok") -> str:
+        return json.dumps([{"date": "2026-03-12", "room": room, "start": start, "end": end, "status": status}])
+
+    replies = {
+        "a": reply("212", "09:15", "10:50"),
+        "b": reply("212", "10:10", "11:00"),
+        "c": reply("212", "11:00", "12:00"),
+        "d": reply("305", "09:15", "10:50"),
+        "e": reply("212", "09:15", "10:50", status="no free room"),
+    }
+
+    assert find_double_bookings(replies) == ["2026-03-12 room 212: b 10:10-11:00 vs a 09:15-10:50"]
+
+
+def test_report_percentiles_use_nearest_rank() -> None:
+    report = LoadTestReport(
+        messages=100,
+        lines=100,
+        seconds=2.0,
+        latencies=[index / 1000 for index in range(100, 0, -1)],
+        statuses={},
+        double_bookings=[],
+        refreshed=False,
+    )
+
+    assert report.throughput == 50.0
+    assert report.percentile(50) == 0.05
+    assert report.percentile(99) == 0.099
+    assert "p95=95.00 ms" in report.render()
@@ -0,0 +1,123 @@
+import random
+import threading
+from datetime import date, time
+from pathlib import Path
+
+from app.allocator import RoomAllocator, new_reservations
+from app.config import AppConfig
+from app.free_rooms import FreeRoomSummary, FreeRoomSummaryRepository, parse_pair_slots
+from app.models import Request, TimeRange
+from app.ruz_client import FetchResult, FetchStats
+from app.service import RoomService
+
+
+class _FakeClient:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def fetch_occupied_slots_with_stats(self):
+        return FetchResult(occupied=self.payload, stats=FetchStats(0, 0, 0, 0, 0, 0, 0))
+
+
+def _random_schedule(rng: random.Random, config: AppConfig) -> dict[str, dict[str, list[TimeRange]]]:
+    rooms = [room for items in config.allowed_rooms.values() for room in items]
+    occupied = {}
+    for day in range(1, 6):
+        occupied[date(2026, 3, day).isoformat()] = {
+            room: sorted(
+                (TimeRange(time(hour, 0), time(hour + 1, 30)) for hour in rng.sample(range(7, 20), 3)),
+                key=lambda slot: slot.start,
+            )
+            for room in rooms
+        }
+    return occupied
+
+
+def _random_requests(rng: random.Random, config: AppConfig, count: int) -> list[Request]:
+    pairs = parse_pair_slots(config.pair_slots)
+    room_types = ["any", "any2", "any6", "big", "big2", "big6", "212", "610"]
+    requests = []
+    for index in range(count):
+        if rng.random() < 0.7:
+            slot = rng.choice(pairs)
+        else:
+            hour = rng.randrange(8, 20)
+            slot = TimeRange(time(hour, 10), time(hour + 1, 0))
+        requests.append(Request(f"User {index}", "goal", date(2026, 3, rng.randrange(1, 7)), slot, rng.choice(room_types)))
+    return requests
+
+
+def test_summary_answers_match_the_general_allocator_across_shared_reservations(make_config) -> None:
+    rng = random.Random(7)
+    config = make_config()
+    allocator = RoomAllocator(config)
+    occupied = _random_schedule(rng, config)
+    summary = FreeRoomSummary.build(occupied, config)
+    requests = _random_requests(rng, config, 600)
+
+    plain_reserved, summary_reserved = new_reservations(), new_reservations()
+    plain, fast = [], []
+    for start in range(0, len(requests), 50):
+        chunk = requests[start : start + 50]
+        plain += allocator.allocate_batch(chunk, occupied, reserved=plain_reserved)
+        fast += allocator.allocate_batch(chunk, occupied, reserved=summary_reserved, summary=summary)
+
+    assert fast == plain
+    assert any(item.status == "ok" for item in fast)
+
+
+def test_summary_covers_only_room_classes_in_standard_slots(make_config) -> None:
+    config = make_config()
+    occupied = {"2026-03-02": {"305": [TimeRange(time(9, 0), time(10, 0))]}}
+    summary = FreeRoomSummary.build(occupied, config)
+    first_pair, _, third_pair = parse_pair_slots(config.pair_slots)[:3]
+
+    assert summary.free_rooms("2026-03-02", "BIG2", first_pair) == ("402",)
+    assert summary.free_rooms("2026-03-02", "any", third_pair) == ("212", "305", "402", "610", "620")
+    assert summary.free_rooms("2026-03-02", "212", first_pair) is None
+    assert summary.free_rooms("2026-03-02", "any", TimeRange(time(9, 0), time(10, 0))) is None
+    assert summary.free_rooms("2026-03-03", "any", first_pair) is None
+
+
+def test_refresh_stores_summary_next_to_cache_and_reload_checks_its_source(tmp_path: Path, make_config) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    service = RoomService(make_config(cache_path))
+    service._client = _FakeClient({"2026-03-02": {"212": [TimeRange(time(7, 0), time(12, 0))]}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    repository = FreeRoomSummaryRepository.for_cache(cache_path)
+    first_pair = parse_pair_slots(make_config().pair_slots)[0]
+
+    restarted = RoomService(make_config(cache_path))
+    summary = restarted.ensure_schedule_and_summary()[1]
+    assert summary is not None
+    assert repository.load(summary.source) is not None
+    assert summary.free_rooms("2026-03-02", "any2", first_pair) == ("305", "402")
+
+    narrowed = RoomService(make_config(cache_path, pair_slots=("07:30-09:05",)))
+    rebuilt = narrowed.ensure_schedule_and_summary()[1]
+    assert rebuilt is not None and rebuilt.source != summary.source
+    assert len(rebuilt) == 6
+
+
+def test_concurrent_summary_saves_never_move_each_others_files(tmp_path: Path, make_config) -> None:
+    config = make_config()
+    summary = FreeRoomSummary.build(_random_schedule(random.Random(5), config), config, source="abc")
+    repository = FreeRoomSummaryRepository.for_cache(tmp_path / "clean_schedule.json")
+    errors = []
+
+    def save_repeatedly() -> None:
+        try:
+            for _ in range(200):
+                repository.save(summary)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=save_repeatedly) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert repository.load("abc") is not None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["clean_schedule.free_rooms.json"]
@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+
+from app.metrics import MetricsRegistry, render_stats
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("fetch_seconds", "Fetch time.", buckets=(0.1, 1.0))
+    histogram.observe(0.05, building="2")
+    histogram.observe(0.5, building="2")
+    histogram.observe(5.0, building="2")
+
+    text = registry.render()
+
+    assert '# TYPE fetch_seconds histogram' in text
+    assert 'fetch_seconds_bucket{building="2",le="0.1"} 1' in text
+    assert 'fetch_seconds_bucket{building="2",le="1"} 2' in text
+    assert 'fetch_seconds_bucket{building="2",le="+Inf"} 3' in text
+    assert 'fetch_seconds_count{building="2"} 3' in text
+
+
+def test_write_keeps_families_from_previous_runs(tmp_path: Path) -> None:
+    path = tmp_path / "metrics.prom"
+    refresh_run = MetricsRegistry()
+    refresh_run.counter("ruz_response_bytes_total", "Bytes.").inc(100)
+    refresh_run.write(path)
+
+    allocate_run = MetricsRegistry()
+    allocate_run.counter("allocation_results_total", "Results.").inc(2, status="ok")
+    allocate_run.write(path)
+
+    text = path.read_text(encoding="utf-8")
+    assert "ruz_response_bytes_total 100" in text
+    assert 'allocation_results_total{status="ok"} 2' in text
+
+
+def test_counters_and_histograms_add_up_across_runs_and_gauges_are_replaced(tmp_path: Path) -> None:
+    path = tmp_path / "metrics.prom"
+    for run in range(2):
+        registry = MetricsRegistry()
+        registry.counter("allocation_results_total", "Results.").inc(2, status="ok")
+        registry.histogram("fetch_seconds", "Fetch time.", buckets=(1.0,)).observe(0.5)
+        registry.gauge("schedule_changed_days", "Days.").set(5 + run)
+        registry.write(path)
+
+    text = path.read_text(encoding="utf-8")
+    assert 'allocation_results_total{status="ok"} 4' in text
+    assert 'fetch_seconds_bucket{le="1"} 2' in text
+    assert "fetch_seconds_sum 1" in text and "fetch_seconds_count 2" in text
+    assert "schedule_changed_days 6" in text
+
+
+def test_repeated_writes_of_one_process_add_only_the_growth(tmp_path: Path) -> None:
+    path = tmp_path / "metrics.prom"
+    earlier_run = MetricsRegistry()
+    earlier_run.counter("http_requests_total", "Requests.").inc(10)
+    earlier_run.write(path)
+
+    server = MetricsRegistry()
+    requests = server.counter("http_requests_total", "Requests.")
+    requests.inc(3)
+    server.write(path)
+    requests.inc(2)
+    server.write(path)
+    server.write(path)
+
+    assert "http_requests_total 15" in path.read_text(encoding="utf-8")
+
+
+def test_render_stats_reports_refresh_age(tmp_path: Path) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    cache_path.write_text("{}", encoding="utf-8")
+    os.utime(cache_path, (1000, 1000))
+
+    text = render_stats(tmp_path / "missing.prom", cache_path, now=1060)
+
+    assert "schedule_refresh_age_seconds 60" in text
@@ -1,7 +1,10 @@
 from datetime import datetime
+from pathlib import Path
 
+from app import parser as parser_module
 from app.parser import RequestParser
-from app.service import should_refresh
+from app.refresher import ScheduleRefresher
+from app.service import RoomService
 
 
 def test_parser() -> None:
@@ -12,7 +15,44 @@ def test_parser() -> None:
     assert req.room_type == "big2"
 
 
-def test_should_refresh_msk_points() -> None:
-    assert should_refresh(datetime.fromisoformat("2026-03-12T04:00:00+03:00")) is True
-    assert should_refresh(datetime.fromisoformat("2026-03-12T16:00:00+03:00")) is True
-    assert should_refresh(datetime.fromisoformat("2026-03-12T16:01:00+03:00")) is False
+def test_default_refresh_slots_are_msk_04_00_and_16_00(tmp_path: Path, make_config) -> None:
+    refresher = ScheduleRefresher(RoomService(make_config(tmp_path / "clean_schedule.json")))
+    msk = datetime.fromisoformat
+
+    assert refresher.next_slot(msk("2026-03-12T03:59:00+03:00")) == msk("2026-03-12T04:00:00+03:00")
+    assert refresher.previous_slot(msk("2026-03-12T16:00:00+03:00")) == msk("2026-03-12T16:00:00+03:00")
+    assert refresher.previous_slot(msk("2026-03-12T16:01:00+03:00")) == msk("2026-03-12T16:00:00+03:00")
+    assert refresher.next_slot(msk("2026-03-12T16:00:00+03:00")) == msk("2026-03-13T04:00:00+03:00")
+
+
+def test_parse_many_collects_errors_with_line_numbers() -> None:
+    lines = [
+        "[Иван Иванов Консультация 12.03 10:10 11:45 big2]",
+        "",
+        "опечатка",
+        "[Петр Петров Встреча 31.02 10:10 11:45 any]",
+        "[Анна Смирнова Семинар 13.03 25:00 26:00 any]",
+        "[Анна Смирнова 13.03 9:05 10:40 305]",
+    ]
+
+    batch = RequestParser.parse_many(lines, year=2026)
+
+    assert [number for number, _ in batch.entries] == [1, 6]
+    assert batch.requests[1].goal == ""
+    assert batch.requests[1].slot.start.strftime("%H:%M") == "09:05"
+    assert [(error.line_number, error.message.split(":")[0]) for error in batch.errors] == [
+        (3, "Invalid request format"),
+        (4, "Invalid day"),
+        (5, "Invalid time"),
+    ]
+
+
+def test_parse_many_parallel_matches_sequential(monkeypatch) -> None:
+    monkeypatch.setattr(parser_module, "PARALLEL_CHUNK_SIZE", 50)
+    lines = [f"[Имя{i} Фамилия Цель {i % 28 + 1:02d}.03 10:00 11:00 any]" for i in range(180)] + ["bad"]
+
+    sequential = RequestParser.parse_many(lines, year=2026)
+    parallel = RequestParser.parse_many(lines, year=2026, workers=2)
+
+    assert parallel.entries == sequential.entries
+    assert parallel.errors == sequential.errors
@@ -0,0 +1,165 @@
+import json
+import re
+import subprocess
+import sys
+import tracemalloc
+import zlib
+from datetime import date, time
+from pathlib import Path
+
+import pytest
+
+from app.models import AllocationResult, Request, TimeRange
+from app.pdf_mode import PdfPayloadBuilder, group_by_day, report_sort_key
+from app.pdf_writer import DEFAULT_FONT_CANDIDATES, BuiltinFont, PdfWriter, TrueTypeFont
+
+ROOT = Path(__file__).resolve().parents[1]
+HAS_TTF = any(Path(candidate).is_file() for candidate in DEFAULT_FONT_CANDIDATES)
+REPORT_CONFIG = {
+    "buildings": {2: 145},
+    "allowed_rooms": {2: ["212", "305"]},
+    "big_rooms": {2: ["305"]},
+    "contact_fields": {"phone": "+7-900-000-00-00"},
+    "pdf_font_path": "/nonexistent.ttf",
+}
+
+
+def _allocations(count: int):
+    for index in range(count):
+        request = Request(
+            f"Имя{index} Фамилия",
+            "Консультация",
+            date(2026, 3, 1 + index % 28),
+            TimeRange(time(8 + index % 10, 0), time(9 + index % 10, 0)),
+            "any",
+        )
+        yield AllocationResult(request=request, room="212" if index % 3 else "", status="ok" if index % 3 else "no free room")
+
+
+def _assert_valid_xref(payload: bytes) -> int:
+    xref_offset = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", payload).group(1))
+    header = re.match(rb"xref\n0 (\d+)\n", payload[xref_offset:])
+    total = int(header.group(1))
+    entries = payload[xref_offset + header.end() :].split(b"\n")[1:total]
+    for object_id, entry in enumerate(entries, start=1):
+        offset = int(entry[:10])
+        assert payload[offset:].startswith(b"%d 0 obj\n" % object_id)
+    return total
+
+
+def test_text_report_is_streamed_to_file(tmp_path: Path, make_config) -> None:
+    builder = PdfPayloadBuilder(make_config(**REPORT_CONFIG))
+    allocations = list(_allocations(5))
+
+    path = builder.save_report(iter(allocations), tmp_path / "report.txt")
+
+    assert path.read_text(encoding="utf-8") == builder.build_text_report(allocations)
+
+
+def test_pdf_report_has_valid_structure_and_pages(tmp_path: Path, make_config) -> None:
+    builder = PdfPayloadBuilder(make_config(**REPORT_CONFIG))
+    allocations = sorted(_allocations(300), key=report_sort_key)
+
+    path = builder.save_report(allocations, tmp_path / "report.pdf")
+    payload = path.read_bytes()
+
+    assert payload.startswith(b"%PDF-1.4")
+    _assert_valid_xref(payload)
+    page_count = int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", payload).group(1))
+    assert page_count > 1
+    assert b"/BaseFont /Helvetica" in payload
+
+
+@pytest.mark.skipif(not HAS_TTF, reason="no TrueType font with Cyrillic available")
+def test_pdf_embeds_truetype_font_for_cyrillic(tmp_path: Path) -> None:
+    font_path = next(candidate for candidate in DEFAULT_FONT_CANDIDATES if Path(candidate).is_file())
+    font = TrueTypeFont(Path(font_path))
+    assert font.glyph("Ж") != 0
+
+    with (tmp_path / "report.pdf").open("wb") as file:
+        writer = PdfWriter(file, font)
+        writer.add_line("Иван Иванов | Консультация")
+        writer.close()
+    payload = (tmp_path / "report.pdf").read_bytes()
+
+    _assert_valid_xref(payload)
+    assert b"/CIDFontType2" in payload and b"/FontFile2" in payload
+    assert font.encode("Ж") == b"<%04X>" % font.glyph("Ж")
+
+
+def test_pdf_writer_memory_stays_flat(tmp_path: Path) -> None:
+    def peak_for(count: int) -> int:
+        tracemalloc.start()
+        with (tmp_path / f"report_{count}.pdf").open("wb") as file:
+            writer = PdfWriter(file, BuiltinFont())
+            for item in _allocations(count):
+                writer.add_line(f"{item.request.full_name} {item.request.goal} {item.room}")
+            writer.close()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    assert peak_for(20_000) < peak_for(2_000) * 2
+
+
+
+def test_group_by_day_matches_a_full_sort() -> None:
+    allocations = list(_allocations(500))
+
+    assert list(group_by_day(iter(allocations))) == sorted(allocations, key=report_sort_key)
+    assert list(group_by_day([])) == []
+
+
+def test_pdf_mode_allocates_the_input_in_chunks(tmp_path: Path) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    cache_path.write_text(json.dumps({"2026-03-12": {"212": []}, "2026-03-13": {"212": []}}), encoding="utf-8")
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "base_url": "http://127.0.0.1:9/{building_oid}",
+                "buildings": {"2": 145},
+                "allowed_rooms": {"2": ["212"]},
+                "schedule_cache_path": str(cache_path),
+                "metrics_path": str(tmp_path / "metrics.prom"),
+                "pdf_font_path": "/nonexistent.ttf",
+            }
+        ),
+        encoding="utf-8",
+    )
+    input_path = tmp_path / "requests.txt"
+    input_path.write_text(
+        "[Иван Иванов Консультация 13.03 10:10 11:45 any]\n"
+        "битая строка\n"
+        "[Пётр Петров Семинар 12.03 10:10 11:45 any]\n"
+        "[Анна Смирнова Семинар 12.03 10:00 11:00 any]\n",
+        encoding="utf-8",
+    )
+
+    def run(output: Path) -> subprocess.CompletedProcess:
+        args = ["--config", str(config_path), "--input", str(input_path), "--mode", "pdf", "--chunk-size", "1"]
+        return subprocess.run(
+            [sys.executable, "-m", "app.main", *args, "--output", str(output)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    text = run(tmp_path / "report.txt")
+    pdf = run(tmp_path / "report.pdf")
+
+    assert f"{input_path}:2:" in text.stderr and f"{input_path}:2:" in pdf.stderr
+    # Chunks share one reservation map: the overlapping third request gets no room.
+    report = (tmp_path / "report.txt").read_text(encoding="utf-8").splitlines()
+    assert report[-3:] == [
+        "- Иван Иванов | Консультация | 2026-03-13 10:10-11:45 => 212",
+        "- Пётр Петров | Семинар | 2026-03-12 10:10-11:45 => 212",
+        "- Анна Смирнова | Семинар | 2026-03-12 10:00-11:00 => no free room",
+    ]
+    payload = (tmp_path / "report.pdf").read_bytes()
+    _assert_valid_xref(payload)
+    pages = b"".join(
+        zlib.decompress(stream) for stream in re.findall(rb"stream\n(.*?)\nendstream", payload, re.S)
+    )
+    assert pages.index(b"(2026-03-12)") < pages.index(b"(2026-03-13)")
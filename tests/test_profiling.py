@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from app.profiling import SPANS, SpanRecorder, profile_call, span
+
+
+def test_disabled_recorder_returns_shared_noop_span() -> None:
+    recorder = SpanRecorder()
+
+    assert recorder.span("a") is recorder.span("b")
+    with recorder.span("a"):
+        pass
+    assert recorder.snapshot() == {}
+
+
+def test_enabled_recorder_accumulates_calls() -> None:
+    recorder = SpanRecorder()
+    recorder.enable()
+    for _ in range(3):
+        with recorder.span("allocator.allocate_batch"):
+            pass
+
+    count, total = recorder.snapshot()["allocator.allocate_batch"]
+    assert count == 3
+    assert total >= 0
+    assert "allocator.allocate_batch" in recorder.report()
+
+
+def test_profile_call_writes_artifacts_and_disables_spans(tmp_path: Path) -> None:
+    def work() -> int:
+        with span("work"):
+            return sum(range(1000))
+
+    result, artifacts = profile_call(work, tmp_path / "run.pstats", trace_memory=True)
+
+    assert result == sum(range(1000))
+    assert artifacts.stats_path.exists()
+    assert "work" in artifacts.spans_path.read_text(encoding="utf-8")
+    assert artifacts.memory_path is not None and artifacts.memory_path.exists()
+    assert artifacts.peak_memory_bytes is not None
+    assert SPANS.enabled is False
@@ -0,0 +1,175 @@
+import random
+import threading
+import time as clock
+from collections import defaultdict
+from datetime import date, time
+from pathlib import Path
+
+from app.allocator import RoomAllocator
+from app.models import Request, TimeRange
+from app.ruz_client import FetchResult, FetchStats
+from app.reservations import ReservationLedger
+from app.service import RoomService
+
+DAYS = [date(2026, 3, day) for day in range(9, 14)]
+
+
+class _YieldingAllocator(RoomAllocator):
+    """Gives up the GIL mid-pick so that concurrent commits really interleave."""
+
+    def allocate_batch(self, *args, **kwargs):
+        clock.sleep(0.0001)
+        return super().allocate_batch(*args, **kwargs)
+
+
+def _occupied() -> dict[str, dict[str, list[TimeRange]]]:
+    return {day.isoformat(): {"212": [TimeRange(time(13, 0), time(14, 35))]} for day in DAYS}
+
+
+def _request(name: str, day: date, start: int, room_type: str = "any") -> Request:
+    return Request(name, "goal", day, TimeRange(time(start, 0), time(start + 1, 30)), room_type)
+
+
+def test_commit_retries_only_the_conflicting_pick(make_config) -> None:
+    config = make_config()
+    allocator = RoomAllocator(config)
+    ledger = ReservationLedger()
+    day = DAYS[0].isoformat()
+    requests = [_request("A", DAYS[0], 9, "212"), _request("B", DAYS[0], 16, "any")]
+
+    version, picks = ledger._pick(day, [0, 1], requests, allocator, _occupied(), None)
+    ledger.book([_request("C", DAYS[0], 9, "212")], allocator, _occupied())
+    results = [None, None]
+    with ledger._day_lock(day):
+        conflicts = ledger._commit(day, version, [0, 1], picks, results)
+
+    assert conflicts == [0]
+    assert results[1] is not None and results[1].room == "212"
+    assert ledger.version(day) == 2
+    retried = ledger.book([requests[0]], allocator, _occupied())
+    assert retried[0].status == "no free room"
+
+
+def test_other_days_are_booked_while_a_day_is_locked(make_config) -> None:
+    allocator = RoomAllocator(make_config())
+    ledger = ReservationLedger()
+    done = threading.Event()
+
+    with ledger._day_lock(DAYS[0].isoformat()):
+        worker = threading.Thread(
+            target=lambda: (ledger.book([_request("A", DAYS[1], 9)], allocator, _occupied()), done.set())
+        )
+        worker.start()
+        assert done.wait(5)
+    worker.join(5)
+    assert ledger.reserved_for_day(DAYS[1].isoformat()) == {"212": [TimeRange(time(9, 0), time(10, 30))]}
+
+
+def test_concurrent_batches_never_double_book(make_config) -> None:
+    allocator = _YieldingAllocator(make_config())
+    ledger = ReservationLedger()
+    occupied = _occupied()
+    room_types = ["any", "any2", "any6", "big", "big2", "big6", "212", "610"]
+    granted: list = []
+    granted_lock = threading.Lock()
+    start = threading.Barrier(16)
+
+    def client(seed: int) -> None:
+        rng = random.Random(seed)
+        start.wait()
+        for batch_number in range(40):
+            batch = [
+                _request(f"{seed}-{batch_number}-{index}", rng.choice(DAYS), rng.randrange(8, 20), rng.choice(room_types))
+                for index in range(rng.randrange(1, 6))
+            ]
+            results = ledger.book(batch, allocator, occupied)
+            assert [item.request for item in results] == batch
+            with granted_lock:
+                granted.extend(item for item in results if item.status == "ok")
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    by_room: dict[tuple[str, str], list[TimeRange]] = defaultdict(list)
+    for item in granted:
+        key = (item.request.day.isoformat(), item.room)
+        assert not any(item.request.slot.overlaps(slot) for slot in by_room[key]), f"double booking of {key}"
+        assert not any(item.request.slot.overlaps(slot) for slot in occupied[key[0]].get(item.room, []))
+        by_room[key].append(item.request.slot)
+    assert granted
+    assert ledger.count() == len(granted)
+
+
+def test_service_builds_one_ledger_for_racing_threads(monkeypatch, make_config) -> None:
+    original_init = ReservationLedger.__init__
+
+    def slow_init(self) -> None:
+        clock.sleep(0.01)
+        original_init(self)
+
+    monkeypatch.setattr(ReservationLedger, "__init__", slow_init)
+    service = RoomService(make_config())
+    ledgers = []
+    start = threading.Barrier(8)
+
+    def worker() -> None:
+        start.wait()
+        ledgers.append(service.ledger)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(ledgers) == 8
+    assert all(ledger is ledgers[0] for ledger in ledgers)
+
+
+def test_days_before_the_window_are_forgotten_while_a_commit_waits(make_config) -> None:
+    allocator = RoomAllocator(make_config())
+    ledger = ReservationLedger()
+    ledger.book([_request("A", DAYS[0], 9), _request("B", DAYS[2], 9)], allocator, _occupied())
+    booked = []
+
+    with ledger._day_lock(DAYS[0].isoformat()):
+        worker = threading.Thread(
+            target=lambda: booked.extend(ledger.book([_request("C", DAYS[0], 9)], allocator, _occupied()))
+        )
+        worker.start()
+        clock.sleep(0.05)
+        forget = threading.Thread(target=ledger.forget_before, args=(DAYS[1].isoformat(),))
+        forget.start()
+        clock.sleep(0.05)
+    worker.join(5)
+    forget.join(5)
+
+    # The waiting batch took the day's new lock instead of the dropped one.
+    assert booked[0].status == "ok"
+    assert ledger._locks[DAYS[0].isoformat()].locked() is False
+    assert ledger.forget_before(DAYS[1].isoformat()) == 1
+    assert ledger.count() == 1
+    assert sorted(ledger._locks) == [DAYS[2].isoformat()]
+
+
+def test_service_forgets_bookings_when_the_schedule_window_moves(tmp_path: Path, make_config) -> None:
+    class _Client:
+        payload = {day.isoformat(): {} for day in DAYS[:3]}
+
+        def fetch_occupied_slots_with_stats(self):
+            return FetchResult(occupied=self.payload, stats=FetchStats(0, 0, 0, 0, 0, 0, 0))
+
+    service = RoomService(make_config(tmp_path / "clean_schedule.json"))
+    client = _Client()
+    service._client = client  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    service.reserve([_request("A", DAYS[0], 9), _request("B", DAYS[2], 9)])
+
+    client.payload = {day.isoformat(): {} for day in DAYS[2:]}
+    service.refresh_schedule_cache()
+
+    assert service.ledger.count() == 1
+    assert service.ledger.reserved_for_day(DAYS[2].isoformat())
@@ -0,0 +1,86 @@
+import threading
+from dataclasses import replace
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.ruz_client import BuildingFetchError, RuzScheduleClient, _load_lessons_with_fallback_formats
+from app.ruz_standin import FaultOptions, FixturePayloads, RuzStandInServer, SyntheticPayloads, record_fixtures
+
+
+@pytest.fixture
+def standin(make_config):
+    servers = []
+
+    def start(payloads=None, **faults):
+        config = make_config(allowed_rooms={2: ["212", "305"], 6: ["610"]}, big_rooms={2: ["305"], 6: []})
+        server = RuzStandInServer(("127.0.0.1", 0), payloads or SyntheticPayloads(config), config, FaultOptions(**faults))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, replace(config, base_url=server.base_url)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_client_refreshes_from_synthetic_schedule_within_range(standin) -> None:
+    server, config = standin(padding_lessons=500)
+    result = RuzScheduleClient(config).fetch_occupied_slots_with_stats()
+
+    window_days = (date.today() + timedelta(days=31) - (date.today() - timedelta(days=1))).days
+    assert result.failed_buildings == []
+    assert set(result.occupied[date.today().isoformat()]) == {"212", "305", "610"}
+    assert len(result.occupied) >= window_days - 3
+    assert result.stats.skipped_not_allowed_room == 500 * 2
+    assert result.stats.skipped_out_of_range == 0
+    assert server.requests == {145: 3, 147: 3}  # one request per candidate date format
+
+
+def test_client_falls_back_to_a_date_format_the_server_accepts(standin) -> None:
+    server, config = standin(accepted_formats=("%d.%m.%Y",))
+    lessons = _load_lessons_with_fallback_formats(
+        base_url=config.base_url.format(building_oid=145),
+        range_start=date(2026, 3, 10),
+        range_end=date(2026, 3, 12),
+        start_param="start",
+        finish_param="finish",
+        lang_param="lng",
+        lang_value=1,
+        preferred_format="%Y-%m-%d",
+    )
+
+    assert {lesson["date"] for lesson in lessons} == {"2026-03-10", "2026-03-11", "2026-03-12"}
+    assert server.requests[145] == 3
+
+
+def test_failed_building_and_timeouts_are_reported(standin) -> None:
+    _, config = standin(fail_buildings=frozenset({147}))
+    result = RuzScheduleClient(config).fetch_occupied_slots_with_stats()
+    assert result.failed_buildings == [6]
+    assert "610" not in result.occupied[date.today().isoformat()]
+
+    _, slow = standin(latency_seconds=0.5)
+    with pytest.raises(BuildingFetchError, match="timed out"):
+        _load_lessons_with_fallback_formats(
+            base_url=slow.base_url.format(building_oid=145),
+            range_start=date(2026, 3, 10),
+            range_end=date(2026, 3, 12),
+            start_param="start",
+            finish_param="finish",
+            lang_param="lng",
+            lang_value=1,
+            preferred_format="%Y-%m-%d",
+            timeout=0.1,
+        )
+
+
+def test_recorded_fixtures_replay_the_same_schedule(standin, tmp_path: Path) -> None:
+    _, live = standin()
+    record_fixtures(live, tmp_path)
+    _, replay = standin(payloads=FixturePayloads(tmp_path))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["145.json", "147.json"]
+    assert RuzScheduleClient(replay).fetch_occupied_slots() == RuzScheduleClient(live).fetch_occupied_slots()
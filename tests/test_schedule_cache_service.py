@@ -1,9 +1,20 @@
+import json
+import os
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
+import pytest
+
 from app.config import AppConfig
-from app.ruz_client import FetchResult, FetchStats
-from app.service import RoomService, ScheduleRefresher
+from app.models import TimeRange
+from app.ruz_client import BuildingFetch, FetchResult, FetchStats
+from app.refresher import ScheduleRefresher, parse_refresh_times
+from app.schedule_cache import BuildingSnapshot, ScheduleSnapshot, merge_occupied
+from app.service import RoomService, ScheduleRefreshError
+
+ONE_ROOM = {"buildings": {2: 145}, "allowed_rooms": {2: ["212"]}, "big_rooms": {2: []}, "refresh_poll_seconds": 1}
 
 
 class _FakeClient:
@@ -27,33 +38,8 @@ class _FakeClient:
         )
 
 
-def _config(cache_path: Path) -> AppConfig:
-    return AppConfig(
-        base_url="http://example/{building_oid}",
-        buildings={2: 145},
-        allowed_rooms={2: ["212"]},
-        big_rooms={2: []},
-        contact_fields={},
-        schedule_window_days_before=1,
-        schedule_window_months_after=1,
-<<<<<<< codex/implement-schedule-management-system-msv8qj
-        schedule_range_start_param="start",
-        schedule_range_finish_param="finish",
-        schedule_range_date_format="%Y-%m-%d",
-        schedule_lang_param="lng",
-        schedule_lang_value=1,
-=======
-        schedule_range_from_param="dateFrom",
-        schedule_range_to_param="dateTo",
-        schedule_range_date_format="%Y-%m-%d",
->>>>>>> main
-        schedule_cache_path=str(cache_path),
-        refresh_poll_seconds=1,
-    )
-
-
-def test_refresh_saves_cache_and_allocate_uses_cached_data(tmp_path: Path) -> None:
-    config = _config(tmp_path / "clean_schedule.json")
+def test_refresh_saves_cache_and_allocate_uses_cached_data(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", **ONE_ROOM)
     service = RoomService(config)
     fake_payload = {"2026-01-01": {"212": []}}
     fake_client = _FakeClient(fake_payload)
@@ -68,15 +54,264 @@ def test_refresh_saves_cache_and_allocate_uses_cached_data(tmp_path: Path) -> No
     assert fake_client.calls == 1
 
 
-def test_refresher_triggers_once_per_target_minute(tmp_path: Path) -> None:
-    config = _config(tmp_path / "clean_schedule.json")
+def test_refresher_triggers_once_per_target_minute(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", **ONE_ROOM)
     service = RoomService(config)
     fake_client = _FakeClient({"2026-01-01": {"212": []}})
     service._client = fake_client  # type: ignore[attr-defined]
 
-    refresher = ScheduleRefresher(service, poll_seconds=5)
+    refresher = ScheduleRefresher(service)
     now = datetime.fromisoformat("2026-03-12T04:00:00+03:00")
 
     assert refresher.tick(now) is True
     assert refresher.tick(now) is False
     assert fake_client.calls == 1
+
+
+class _FlakyClient(_FakeClient):
+    def __init__(self, payload, failures: int):
+        super().__init__(payload)
+        self.failures = failures
+
+    def fetch_occupied_slots_with_stats(self):
+        if self.failures:
+            self.failures -= 1
+            self.calls += 1
+            raise OSError("RUZ unavailable")
+        return super().fetch_occupied_slots_with_stats()
+
+
+def test_refresher_catches_up_missed_slot_and_finds_next(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", **ONE_ROOM)
+    service = RoomService(config)
+    service._client = _FakeClient({"2026-01-01": {"212": []}})  # type: ignore[attr-defined]
+    refresher = ScheduleRefresher(service, refresh_times=parse_refresh_times(["16:00", "04:00"]))
+
+    refresher.tick(datetime.fromisoformat("2026-03-12T04:00:00+03:00"))
+    late = datetime.fromisoformat("2026-03-12T19:42:00+03:00")
+
+    assert refresher.is_due(late) is True
+    assert refresher.tick(late) is True
+    assert refresher.is_due(late) is False
+    assert refresher.next_slot(late) == datetime.fromisoformat("2026-03-13T04:00:00+03:00")
+    assert refresher.previous_slot(datetime.fromisoformat("2026-03-13T01:00:00+03:00")).hour == 16
+
+
+def test_refresher_uses_cache_age_after_restart(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", **ONE_ROOM)
+    service = RoomService(config)
+    service._client = _FakeClient({"2026-01-01": {"212": []}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+
+    restarted = ScheduleRefresher(service)
+
+    assert restarted.last_refresh_at is not None
+    assert restarted.is_due(restarted.last_refresh_at) is False
+
+
+def test_refresher_retries_with_backoff_until_success(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", **ONE_ROOM)
+    service = RoomService(config)
+    client = _FlakyClient({"2026-01-01": {"212": []}}, failures=2)
+    service._client = client  # type: ignore[attr-defined]
+    now = datetime.fromisoformat("2026-03-12T04:00:30+03:00")
+    refresher = ScheduleRefresher(service, retry_base_seconds=0.01, retry_max_seconds=0.02, clock=lambda: now)
+
+    worker = threading.Thread(target=refresher.run_forever)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while refresher.is_due(now) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    refresher.stop()
+    worker.join(timeout=5)
+
+    assert client.calls == 3
+    assert not worker.is_alive()
+    assert 0.5 <= refresher.retry_delay(0, rng=lambda: 0.0) / 0.01 <= 1.0
+    assert refresher.retry_delay(10, rng=lambda: 1.0) == 0.02
+
+
+class _PartialClient:
+    def __init__(self, parts, failed=()):
+        self.parts = parts
+        self.failed = set(failed)
+        self.calls = 0
+
+    def fetch_occupied_slots_with_stats(self):
+        self.calls += 1
+        buildings = {
+            number: BuildingFetch(
+                building=number,
+                occupied={} if number in self.failed else occupied,
+                error="HTTP 502" if number in self.failed else "",
+            )
+            for number, occupied in self.parts.items()
+        }
+        ok = [item.occupied for item in buildings.values() if item.ok]
+        return FetchResult(occupied=merge_occupied(ok), stats=FetchStats(0, 0, 0, 0, 0, 0, 0), buildings=buildings)
+
+
+def _two_building_config(make_config, cache_path: Path, **overrides) -> AppConfig:
+    return make_config(
+        cache_path, **{**ONE_ROOM, "buildings": {2: 145, 3: 146}, "allowed_rooms": {2: ["212"], 3: ["301"]}, **overrides}
+    )
+
+
+def _slot(start: str, end: str):
+    return TimeRange(start=datetime.strptime(start, "%H:%M").time(), end=datetime.strptime(end, "%H:%M").time())
+
+
+def test_failed_building_keeps_previous_data_with_its_age(tmp_path: Path, make_config) -> None:
+    service = RoomService(_two_building_config(make_config, tmp_path / "clean_schedule.json"))
+    first = {2: {"2026-01-01": {"212": [_slot("09:00", "10:00")]}}, 3: {"2026-01-01": {"301": [_slot("11:00", "12:00")]}}}
+    service._client = _PartialClient(first)  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+
+    old_fetch = service._cache.load_snapshot().buildings[3].fetched_at
+    second = {2: {"2026-01-01": {"212": [_slot("13:00", "14:00")]}}, 3: {}}
+    service._client = _PartialClient(second, failed={3})  # type: ignore[attr-defined]
+    occupied = service.refresh_schedule_cache()
+
+    assert occupied["2026-01-01"]["212"] == [_slot("13:00", "14:00")]
+    assert occupied["2026-01-01"]["301"] == [_slot("11:00", "12:00")]
+    assert service.last_failed_buildings == [3]
+    assert service._cache.load_snapshot().buildings[3].fetched_at == old_fetch
+    assert set(service.building_ages()) == {2, 3}
+
+
+def test_all_buildings_failing_leaves_cache_untouched(tmp_path: Path, make_config) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    service = RoomService(_two_building_config(make_config, cache_path))
+    service._client = _PartialClient({2: {"2026-01-01": {"212": []}}, 3: {}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    before = cache_path.read_text(encoding="utf-8")
+
+    service._client = _PartialClient({2: {}, 3: {}}, failed={2, 3})  # type: ignore[attr-defined]
+    with pytest.raises(ScheduleRefreshError):
+        service.refresh_schedule_cache()
+    assert cache_path.read_text(encoding="utf-8") == before
+
+
+def test_legacy_flat_cache_is_loaded_and_split_on_refresh(tmp_path: Path, make_config) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    cache_path.write_text(
+        json.dumps({"2026-01-01": {"212": [{"start": "09:00", "end": "10:00"}], "301": [{"start": "11:00", "end": "12:00"}]}}),
+        encoding="utf-8",
+    )
+    service = RoomService(_two_building_config(make_config, cache_path))
+    assert service.ensure_schedule_cache()["2026-01-01"]["301"] == [_slot("11:00", "12:00")]
+
+    service._client = _PartialClient({2: {"2026-01-02": {"212": []}}, 3: {}}, failed={3})  # type: ignore[attr-defined]
+    occupied = service.refresh_schedule_cache()
+
+    assert occupied["2026-01-01"]["301"] == [_slot("11:00", "12:00")]
+    assert "212" not in occupied["2026-01-01"]
+    assert set(service._cache.load_snapshot().buildings) == {2, 3}
+
+
+def test_max_staleness_serves_last_snapshot_and_backs_off_after_failures(tmp_path: Path, make_config) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    service = RoomService(
+        _two_building_config(make_config, cache_path, schedule_max_staleness_seconds=3600), background_revalidation=True
+    )
+    service._client = _PartialClient({2: {"2026-01-01": {"212": []}}, 3: {"2026-01-01": {"301": []}}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    snapshot = service._cache.load_snapshot()
+
+    aged = ScheduleSnapshot(
+        buildings={number: BuildingSnapshot(item.occupied, item.fetched_at - 7200) for number, item in snapshot.buildings.items()}
+    )
+    service._cache.save(aged)
+    os.utime(cache_path, (time.time() - 10, time.time() - 10))
+
+    client = _PartialClient({2: {}, 3: {}}, failed={2, 3})
+    service._client = client  # type: ignore[attr-defined]
+    for _ in range(3):
+        assert "301" in service.ensure_schedule_cache()["2026-01-01"]
+        service.wait_for_background_refresh(timeout=5)
+    assert client.calls == 1  # later requests wait out the retry backoff
+    assert sorted(service.stale_buildings()) == [2, 3]
+
+    service._client = _PartialClient({2: {"2026-01-02": {"212": []}}, 3: {"2026-01-02": {"301": []}}})  # type: ignore[attr-defined]
+    service._retry_at = 0.0  # type: ignore[attr-defined]
+    service.ensure_schedule_cache()
+    service.wait_for_background_refresh(timeout=5)
+    assert "2026-01-02" in service.ensure_schedule_cache()
+    assert service.stale_buildings() == {}
+
+
+def test_first_load_failure_is_not_retried_by_every_request(tmp_path: Path, make_config) -> None:
+    service = RoomService(_two_building_config(make_config, tmp_path / "clean_schedule.json"))
+    client = _PartialClient({2: {}, 3: {}}, failed={2, 3})
+    service._client = client  # type: ignore[attr-defined]
+
+    for _ in range(3):
+        with pytest.raises(ScheduleRefreshError):
+            service.ensure_schedule_cache()
+
+    assert client.calls == 1
+
+
+def test_stale_while_revalidate_serves_old_snapshot_and_refreshes_in_background(tmp_path: Path, make_config) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    config = make_config(cache_path, **ONE_ROOM, stale_while_revalidate=True, schedule_revalidate_after_seconds=60)
+    service = RoomService(config, background_revalidation=True)
+    service._client = _FakeClient({"2026-01-01": {"212": [_slot("09:00", "10:00")]}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    old = time.time() - 600
+    snapshot = service._cache.load_snapshot()
+    service._cache.save(ScheduleSnapshot(buildings={2: BuildingSnapshot(snapshot.buildings[2].occupied, old)}))
+    os.utime(cache_path, (old, old))
+
+    release = threading.Event()
+
+    class _SlowClient(_FakeClient):
+        def fetch_occupied_slots_with_stats(self):
+            release.wait(5)
+            return super().fetch_occupied_slots_with_stats()
+
+    client = _SlowClient({"2026-01-01": {"212": [_slot("15:00", "16:00")]}})
+    service._client = client  # type: ignore[attr-defined]
+
+    served = service.ensure_schedule_cache()
+    assert served["2026-01-01"]["212"] == [_slot("09:00", "10:00")]
+    assert service.refresh_in_background() is False
+
+    release.set()
+    service.wait_for_background_refresh(timeout=5)
+    assert client.calls == 1
+    assert service.ensure_schedule_cache()["2026-01-01"]["212"] == [_slot("15:00", "16:00")]
+
+
+def test_one_shot_runs_revalidate_before_answering(tmp_path: Path, make_config) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    config = make_config(cache_path, **ONE_ROOM, stale_while_revalidate=True, schedule_revalidate_after_seconds=60)
+    service = RoomService(config)
+    service._client = _FakeClient({"2026-01-01": {"212": [_slot("09:00", "10:00")]}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    old = time.time() - 600
+    snapshot = service._cache.load_snapshot()
+    service._cache.save(ScheduleSnapshot(buildings={2: BuildingSnapshot(snapshot.buildings[2].occupied, old)}))
+    os.utime(cache_path, (old, old))
+
+    # Fresh processes, as in cron runs: nothing may be left to a thread that dies with them.
+    failing = RoomService(config)
+    client = _PartialClient({2: {}}, failed={2})
+    failing._client = client  # type: ignore[attr-defined]
+    assert failing.ensure_schedule_cache()["2026-01-01"]["212"] == [_slot("09:00", "10:00")]
+    assert client.calls == 1
+
+    one_shot = RoomService(config)
+    one_shot._client = _FakeClient({"2026-01-01": {"212": [_slot("15:00", "16:00")]}})  # type: ignore[attr-defined]
+    assert one_shot.ensure_schedule_cache()["2026-01-01"]["212"] == [_slot("15:00", "16:00")]
+    assert one_shot._background_refresh is None  # type: ignore[attr-defined]
+
+
+def test_stale_while_revalidate_accepts_only_json_booleans() -> None:
+    base = {"base_url": "http://example/{building_oid}", "buildings": {"2": 145}, "allowed_rooms": {"2": ["212"]}}
+
+    assert AppConfig.from_dict({**base, "stale_while_revalidate": True}).stale_while_revalidate is True
+    assert AppConfig.from_dict(base).stale_while_revalidate is False
+    for value in ("false", "true", 0, None):
+        with pytest.raises(ValueError, match="stale_while_revalidate"):
+            AppConfig.from_dict({**base, "stale_while_revalidate": value})
@@ -0,0 +1,72 @@
+from datetime import date, time
+from pathlib import Path
+
+from app.free_rooms import parse_pair_slots
+from app.models import Request, TimeRange
+from app.ruz_client import FetchResult, FetchStats
+from app.schedule_diff import ScheduleChangeLog, diff_schedules
+from app.service import RoomService
+
+TWO_ROOMS = {"buildings": {2: 145}, "allowed_rooms": {2: ["212", "305"]}, "big_rooms": {2: ["305"]}}
+
+
+class _FakeClient:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def fetch_occupied_slots_with_stats(self):
+        return FetchResult(occupied=self.payload, stats=FetchStats(0, 0, 0, 0, 0, 0, 0))
+
+
+def _slot(start: int, end: int) -> TimeRange:
+    return TimeRange(time(start, 0), time(end, 0))
+
+
+def test_diff_reports_days_rooms_and_slots() -> None:
+    previous = {"2026-03-10": {"212": [_slot(9, 10)]}, "2026-03-11": {"212": [_slot(9, 10), _slot(12, 13)]}}
+    current = {"2026-03-11": {"212": [_slot(9, 10)], "305": [_slot(14, 15)]}, "2026-03-12": {}}
+
+    diff = diff_schedules(previous, current)
+
+    assert (diff.added_days, diff.removed_days) == (["2026-03-12"], ["2026-03-10"])
+    assert diff.added == [("2026-03-11", "305", _slot(14, 15))]
+    assert diff.removed == [("2026-03-10", "212", _slot(9, 10)), ("2026-03-11", "212", _slot(12, 13))]
+    assert diff.changed_days == {"2026-03-10", "2026-03-11", "2026-03-12"}
+    assert diff_schedules(current, current).is_empty
+
+
+def test_refresh_rebuilds_only_changed_summary_days_and_logs_changes(tmp_path: Path, make_config) -> None:
+    cache_path = tmp_path / "clean_schedule.json"
+    service = RoomService(make_config(cache_path, **TWO_ROOMS, schedule_changelog_entries=2))
+    unchanged = {"212": [_slot(9, 10)]}
+    service._client = _FakeClient({"2026-03-10": unchanged, "2026-03-11": {}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    before = service.ensure_schedule_and_summary()[1]
+
+    service._client = _FakeClient({"2026-03-10": unchanged, "2026-03-11": {"305": [_slot(9, 10)]}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    service.refresh_schedule_cache()
+    after = service.ensure_schedule_and_summary()[1]
+    first_pair = parse_pair_slots(make_config(cache_path, **TWO_ROOMS).pair_slots)[0]
+
+    assert after.free_rooms("2026-03-10", "any", first_pair) is before.free_rooms("2026-03-10", "any", first_pair)
+    assert after.free_rooms("2026-03-11", "any", first_pair) == ("212",)
+    entries = ScheduleChangeLog.for_cache(cache_path).load()
+    assert len(entries) == 2
+    assert entries[0]["sample_added"] == ["2026-03-11 305 09:00-10:00"]
+    assert entries[1]["slots_added"] == 0 and entries[1]["changed_days"] == []
+
+
+def test_refresh_flags_reservations_that_new_lessons_overlap(tmp_path: Path, make_config) -> None:
+    service = RoomService(make_config(tmp_path / "clean_schedule.json", **TWO_ROOMS))
+    service._client = _FakeClient({"2026-03-10": {}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    booked = service.reserve([Request("A B", "goal", date(2026, 3, 10), _slot(9, 10), "212")])
+    assert booked[0].room == "212"
+
+    service._client = _FakeClient({"2026-03-10": {"212": [TimeRange(time(9, 30), time(11, 0))]}})  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+
+    [collision] = service.last_reservation_collisions
+    assert collision.to_payload() == {"date": "2026-03-10", "room": "212", "lesson": "09:30-11:00", "reservation": "09:00-10:00"}
+    assert ScheduleChangeLog.for_cache(tmp_path / "clean_schedule.json").load()[-1]["collisions"] == [collision.to_payload()]
@@ -0,0 +1,126 @@
+import http.client
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time
+from pathlib import Path
+
+import pytest
+
+from app.models import TimeRange
+from app.ruz_client import FetchResult, FetchStats
+from app.server import RoomApiServer
+from app.service import RoomService
+
+TWO_ROOMS = {"buildings": {2: 145}, "allowed_rooms": {2: ["212", "305"]}, "big_rooms": {2: ["305"]}}
+
+
+class _FakeClient:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    def fetch_occupied_slots_with_stats(self):
+        self.calls += 1
+        return FetchResult(occupied=self.payload, stats=FetchStats(0, 0, 0, 0, 0, 0, 0))
+
+
+@pytest.fixture
+def api(tmp_path: Path, make_config):
+    service = RoomService(make_config(tmp_path / "clean_schedule.json", **TWO_ROOMS))
+    client = _FakeClient({"2026-03-12": {"212": [TimeRange(time(13, 0), time(14, 35))]}, "2026-03-13": {}})
+    service._client = client  # type: ignore[attr-defined]
+    service.refresh_schedule_cache()
+    server = RoomApiServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    yield f"http://{host}:{port}", service, client
+    server.shutdown()
+    server.server_close()
+
+
+def _call(url: str, body: dict | None = None) -> tuple[int, dict]:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def test_allocate_books_rooms_across_calls_and_reports_bad_lines(api) -> None:
+    base, _, _ = api
+    status, first = _call(f"{base}/allocate", {"lines": ["Иван Петров Семинар 12.03 09:15 10:50 any", "oops"]})
+    _, second = _call(f"{base}/allocate", {"lines": ["Анна Смирнова Лекция 12.03 09:15 10:50 any"]})
+
+    assert status == 200
+    assert first["results"][0]["room"] == "212"
+    assert first["results"][1] == {"line": 2, "status": "invalid request", "error": "Invalid request format: oops"}
+    assert second["results"][0]["room"] == "305"
+
+
+def test_free_rooms_accounts_for_schedule_and_bookings(api) -> None:
+    base, _, _ = api
+    _call(f"{base}/allocate", {"lines": ["Иван Петров Семинар 12.03 09:15 10:50 big"]})
+
+    _, morning = _call(f"{base}/free-rooms?date=2026-03-12&start=09:15&end=10:50&type=any")
+    _, afternoon = _call(f"{base}/free-rooms?date=2026-03-12&start=13:00&end=14:35")
+    missing_status, missing = _call(f"{base}/free-rooms?date=2026-05-01&start=09:15&end=10:50")
+    bad_status, _ = _call(f"{base}/free-rooms?date=2026-03-12&start=9")
+    inverted_status, _ = _call(f"{base}/free-rooms?date=2026-03-12&start=10:50&end=09:15")
+
+    assert morning["rooms"] == ["212"]
+    assert afternoon["rooms"] == ["305"]
+    assert (missing_status, missing["status"]) == (404, "no day in shulde")
+    assert bad_status == 400
+    assert inverted_status == 400
+
+
+def test_refresh_health_and_stats(api) -> None:
+    base, _, client = api
+    status, refreshed = _call(f"{base}/refresh?wait=1", {})
+    _, health = _call(f"{base}/health")
+    with urllib.request.urlopen(f"{base}/stats", timeout=5) as response:
+        stats = response.read().decode("utf-8")
+
+    assert (status, refreshed["days"], client.calls) == (200, 2, 2)
+    assert health["status"] == "ok" and health["days"] == 2
+    assert "http_requests_total" in stats
+
+
+def test_concurrent_clients_never_share_a_room(api) -> None:
+    base, service, _ = api
+    lines = [f"User{index} Test Встреча 13.03 09:15 10:50 any" for index in range(20)]
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        responses = list(pool.map(lambda line: _call(f"{base}/allocate", {"lines": [line]})[1], lines))
+
+    rooms = [item["results"][0]["room"] for item in responses if item["results"][0]["status"] == "ok"]
+    assert sorted(rooms) == ["212", "305"]
+    assert service.ledger.count() == 2
+
+
+def test_error_responses_keep_the_connection_usable(api) -> None:
+    base, _, _ = api
+    host, port = base.removeprefix("http://").split(":")
+    connection = http.client.HTTPConnection(host, int(port), timeout=5)
+
+    connection.request("POST", "/nope", body=b"x" * 50)
+    unknown = connection.getresponse()
+    unknown.read()
+    connection.request("GET", "/health")
+    health = connection.getresponse()
+    health.read()
+
+    connection.request("POST", "/allocate", headers={"Content-Length": "-1"})
+    negative = connection.getresponse()
+    negative.read()
+    connection.close()
+
+    assert unknown.status == 404
+    assert health.status == 200
+    assert (negative.status, negative.getheader("Connection")) == (400, "close")
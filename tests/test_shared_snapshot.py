@@ -0,0 +1,169 @@
+import json
+import random
+import subprocess
+import sys
+from dataclasses import replace
+from datetime import date, time
+from pathlib import Path
+
+from app.allocator import RoomAllocator, new_reservations
+from app.config import AppConfig
+from app.free_rooms import FreeRoomSummary, parse_pair_slots
+from app.models import Request, TimeRange
+from app.ruz_client import FetchResult, FetchStats
+from app.service import RoomService
+from app.shared_snapshot import SharedSchedule, SharedSnapshotFile
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class _FakeClient:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def fetch_occupied_slots_with_stats(self):
+        return FetchResult(occupied=self.payload, stats=FetchStats(0, 0, 0, 0, 0, 0, 0))
+
+
+def _random_schedule(rng: random.Random, config: AppConfig) -> dict[str, dict[str, list[TimeRange]]]:
+    rooms = [room for items in config.allowed_rooms.values() for room in items]
+    occupied = {}
+    for day in range(1, 6):
+        occupied[date(2026, 3, day).isoformat()] = {
+            room: sorted(
+                (TimeRange(time(hour, 0), time(hour + 1, 30)) for hour in rng.sample(range(7, 20), 3)),
+                key=lambda slot: slot.start,
+            )
+            for room in rng.sample(rooms, 3)
+        }
+    occupied["2026-03-06"] = {}
+    occupied["2026-03-07"] = {"212": []}
+    return occupied
+
+
+def _as_dicts(occupied) -> dict:
+    return {day: {room: list(slots) for room, slots in rooms.items()} for day, rooms in occupied.items()}
+
+
+def test_published_snapshot_reads_back_schedule_and_summary(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", shared_snapshot_path=str(tmp_path / "schedule.snapshot"))
+    occupied = _random_schedule(random.Random(3), config)
+    summary = FreeRoomSummary.build(occupied, config, source="abc")
+
+    shared = SharedSnapshotFile(tmp_path / "schedule.snapshot").publish(occupied, {2: 100.0, 6: 50.0}, summary)
+
+    assert isinstance(shared.occupied, SharedSchedule)
+    assert _as_dicts(shared.occupied) == occupied
+    assert "2026-03-06" in shared.occupied and "2026-03-31" not in shared.occupied
+    assert shared.occupied["2026-03-07"].get("305") is None
+    assert shared.summary is not None and shared.summary.source == "abc"
+    assert dict(shared.summary.items()) == dict(summary.items())
+    assert shared.summary.free_rooms("2026-03-02", "any", TimeRange(time(9, 0), time(10, 0))) is None
+    assert shared.generation == 1
+    assert shared.oldest_fetched_at() == 50.0
+    assert shared.ages(120.0) == {2: 20.0, 6: 70.0}
+    assert shared.occupied._snapshot._slots.readonly
+
+
+def test_allocations_from_the_mapped_snapshot_match_plain_dicts(tmp_path: Path, make_config) -> None:
+    rng = random.Random(11)
+    config = make_config(tmp_path / "clean_schedule.json", shared_snapshot_path=str(tmp_path / "schedule.snapshot"))
+    allocator = RoomAllocator(config)
+    occupied = _random_schedule(rng, config)
+    summary = FreeRoomSummary.build(occupied, config)
+    shared = SharedSnapshotFile(tmp_path / "schedule.snapshot").publish(occupied, {2: 1.0}, summary)
+    pairs = parse_pair_slots(config.pair_slots)
+    room_types = ["any", "any2", "any6", "big", "big2", "big6", "212", "610"]
+    requests = [
+        Request(
+            f"User {index}",
+            "goal",
+            date(2026, 3, rng.randrange(1, 9)),
+            rng.choice(pairs) if rng.random() < 0.7 else TimeRange(time(rng.randrange(8, 20), 10), time(20, 30)),
+            rng.choice(room_types),
+        )
+        for index in range(400)
+    ]
+
+    plain = allocator.allocate_batch(requests, occupied, reserved=new_reservations(), summary=summary)
+    mapped = allocator.allocate_batch(requests, shared.occupied, reserved=new_reservations(), summary=shared.summary)
+    scanned = allocator.allocate_batch(requests, shared.occupied, reserved=new_reservations())
+
+    assert mapped == plain
+    assert scanned == plain
+
+
+def test_new_generation_is_picked_up_while_old_mapping_stays_readable(tmp_path: Path) -> None:
+    path = tmp_path / "schedule.snapshot"
+    slot = TimeRange(time(9, 0), time(10, 30))
+    writer, reader = SharedSnapshotFile(path), SharedSnapshotFile(path)
+    writer.publish({"2026-03-02": {"212": [slot]}}, {2: 1.0})
+    first = reader.attach()
+
+    writer.publish({"2026-03-02": {"305": [slot]}, "2026-03-03": {}}, {2: 2.0})
+    second = reader.attach()
+
+    assert first is not None and second is not None
+    assert (first.generation, second.generation) == (1, 2)
+    assert _as_dicts(first.occupied) == {"2026-03-02": {"212": [slot]}}
+    assert _as_dicts(second.occupied) == {"2026-03-02": {"305": [slot]}, "2026-03-03": {}}
+    assert reader.attach() is second
+
+
+def test_other_process_attaches_to_the_published_generation(tmp_path: Path) -> None:
+    path = tmp_path / "schedule.snapshot"
+    writer = SharedSnapshotFile(path)
+    writer.publish({"2026-03-02": {"212": [TimeRange(time(9, 0), time(10, 30))]}}, {2: 1.0})
+    writer.publish({"2026-03-02": {"610": [TimeRange(time(11, 0), time(12, 35))]}}, {6: 2.0})
+    script = (
+        "import json, sys\n"
+        "from pathlib import Path\n"
+        "from app.shared_snapshot import SharedSnapshotFile\n"
+        "shared = SharedSnapshotFile(Path(sys.argv[1])).attach()\n"
+        "rooms = {room: [str(slot.start) for slot in slots] for room, slots in shared.occupied['2026-03-02'].items()}\n"
+        "print(json.dumps({'generation': shared.generation, 'rooms': rooms}))\n"
+    )
+
+    completed = subprocess.run(
+        [sys.executable, "-c", script, str(path)], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    assert json.loads(completed.stdout) == {"generation": 2, "rooms": {"610": ["11:00:00"]}}
+
+
+def test_services_share_the_refreshers_snapshot(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", shared_snapshot_path=str(tmp_path / "schedule.snapshot"))
+    refresher, worker = RoomService(config), RoomService(config)
+    client = _FakeClient({"2026-03-02": {"212": [TimeRange(time(9, 15), time(10, 50))]}})
+    refresher._client = client  # type: ignore[attr-defined]
+    slot = parse_pair_slots(config.pair_slots)[1]
+
+    refresher.refresh_schedule_cache()
+    occupied, summary = worker.ensure_schedule_and_summary()
+
+    assert isinstance(occupied, SharedSchedule)
+    assert summary is not None and summary.free_rooms("2026-03-02", "any2", slot) == ("305", "402")
+    assert worker.free_rooms(date(2026, 3, 2), slot, "any2") == ["305", "402"]
+    assert isinstance(refresher.ensure_schedule_cache(), SharedSchedule)
+
+    client.payload = {"2026-03-02": {"305": [TimeRange(time(9, 15), time(10, 50))]}}
+    refresher.refresh_schedule_cache()
+
+    assert refresher.last_schedule_diff is not None and len(refresher.last_schedule_diff.added) == 1
+    assert worker.free_rooms(date(2026, 3, 2), slot, "any2") == ["212", "402"]
+    assert worker._snapshot.generation == 2  # type: ignore[union-attr]
+
+
+def test_unreadable_snapshot_is_republished_from_the_cache(tmp_path: Path, make_config) -> None:
+    config = make_config(tmp_path / "clean_schedule.json", shared_snapshot_path=str(tmp_path / "schedule.snapshot"))
+    plain = RoomService(replace(config, shared_snapshot_path=""))
+    plain._client = _FakeClient({"2026-03-02": {"212": []}})  # type: ignore[attr-defined]
+    plain.refresh_schedule_cache()
+    Path(config.shared_snapshot_path).write_bytes(b"not a snapshot")
+
+    worker = RoomService(config)
+    occupied = worker.ensure_schedule_cache()
+
+    assert isinstance(occupied, SharedSchedule)
+    assert _as_dicts(occupied) == {"2026-03-02": {"212": []}}
+    assert worker._snapshot.generation == 1  # type: ignore[union-attr]
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Sum of top-level cumulative import times reported by `-X importtime`.
+# Generous by default so slow CI hosts pass; tighten locally via the env var.
+IMPORT_BUDGET_US = int(os.environ.get("STARTUP_IMPORT_BUDGET_MS", "300")) * 1000
+
+HEAVY_MODULES = {"urllib.request", "http.client", "ssl", "zoneinfo", "cProfile", "tracemalloc", "app.pdf_mode", "app.telegram_bot"}
+
+
+def _importtime(args: list[str]) -> tuple[set[str], int]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "app.main", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules: set[str] = set()
+    top_level_us = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        if len(name) - len(name.lstrip()) == 1:
+            top_level_us += int(cumulative)
+    return modules, top_level_us
+
+
+@pytest.fixture()
+def cli_files(tmp_path: Path) -> dict[str, Path]:
+    cache_path = tmp_path / "clean_schedule.json"
+    cache_path.write_text(json.dumps({"2026-03-12": {"212": []}}), encoding="utf-8")
+    config_path = tmp_path / "config.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "base_url": "http://127.0.0.1:9/{building_oid}",
+                "buildings": {"2": 145},
+                "allowed_rooms": {"2": ["212"]},
+                "schedule_cache_path": str(cache_path),
+                "metrics_path": str(tmp_path / "metrics.prom"),
+            }
+        ),
+        encoding="utf-8",
+    )
+    input_path = tmp_path / "requests.txt"
+    input_path.write_text("[Иван Иванов Консультация 12.03 10:10 11:45 any]\n", encoding="utf-8")
+    return {"config": config_path, "input": input_path}
+
+
+def test_allocate_mode_skips_network_refresh_and_report_modules(cli_files: dict[str, Path]) -> None:
+    modules, top_level_us = _importtime(["--config", str(cli_files["config"]), "--input", str(cli_files["input"])])
+
+    assert "app.allocator" in modules
+    assert not HEAVY_MODULES & modules
+    assert top_level_us < IMPORT_BUDGET_US
+
+
+def test_stats_mode_imports_only_config_and_metrics(cli_files: dict[str, Path]) -> None:
+    modules, top_level_us = _importtime(["--config", str(cli_files["config"]), "--mode", "stats"])
+
+    assert {"app.config", "app.metrics"} <= modules
+    assert not {"app.service", "app.allocator", "app.parser", "app.schedule_cache"} & modules
+    assert not HEAVY_MODULES & modules
+    assert top_level_us < IMPORT_BUDGET_US
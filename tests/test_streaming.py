@@ -0,0 +1,51 @@
+import io
+import json
+from itertools import count, islice
+
+from app.allocator import RoomAllocator
+from app.streaming import INVALID_REQUEST, stream_allocations, write_json_lines
+
+OCCUPIED = {"2026-03-12": {"212": [], "305": [], "610": []}}
+ROOMS = {"allowed_rooms": {2: ["212", "305"], 6: ["610"]}, "big_rooms": {2: ["305"], 6: ["610"]}}
+
+
+def test_chunks_share_reservations_and_keep_input_order(make_config) -> None:
+    lines = [f"[Имя{i} Фамилия Цель 12.03 10:00 11:00 any]\n" for i in range(4)]
+
+    records = list(stream_allocations(lines, RoomAllocator(make_config(**ROOMS)), OCCUPIED, chunk_size=1, year=2026))
+
+    assert [record["line"] for record in records] == [1, 2, 3, 4]
+    granted = [record["room"] for record in records if record["status"] == "ok"]
+    assert sorted(granted) == ["212", "305", "610"]
+    assert records[3]["status"] == "no free room"
+
+
+def test_malformed_lines_are_reported_per_line(make_config) -> None:
+    lines = ["[A B Цель 12.03 10:00 11:00 any]", "", "garbage", "[C D Цель 32.03 10:00 11:00 any]"]
+
+    records = list(stream_allocations(lines, RoomAllocator(make_config(**ROOMS)), OCCUPIED, year=2026))
+
+    assert [(record["line"], record["status"]) for record in records] == [
+        (1, "ok"),
+        (3, INVALID_REQUEST),
+        (4, INVALID_REQUEST),
+    ]
+    assert records[1]["error"] == "Invalid request format: garbage"
+
+
+def test_input_is_consumed_lazily(make_config) -> None:
+    endless = (f"[A{i} B Цель 13.03 10:00 11:00 any]" for i in count())
+
+    records = list(islice(stream_allocations(endless, RoomAllocator(make_config(**ROOMS)), OCCUPIED, chunk_size=10, year=2026), 25))
+
+    assert len(records) == 25
+    assert all(record["status"] == "no day in shulde" for record in records)
+
+
+def test_write_json_lines() -> None:
+    stream = io.StringIO()
+
+    written = write_json_lines([{"line": 1, "status": "ok"}, {"line": 2, "status": "ok"}], stream)
+
+    assert written == 2
+    assert [json.loads(line)["line"] for line in stream.getvalue().splitlines()] == [1, 2]
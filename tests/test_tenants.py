@@ -0,0 +1,305 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from dataclasses import replace
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pytest
+
+from app.fetch_pool import ConnectionPool, RateLimiter, RuzHttpError, SharedFetchPool
+from app.free_rooms import parse_pair_slots
+from app.models import Request
+from app.ruz_standin import FaultOptions, RuzStandInServer, SyntheticPayloads
+from app.server import TenantApiServer
+from app.tenants import HostConfig, TenantHost, load_host_config
+
+
+def _rooms(rooms: list[str]) -> dict:
+    # Rooms 6xx are in building 6, the rest in building 2.
+    return {
+        "allowed_rooms": {
+            2: [room for room in rooms if not room.startswith("6")],
+            6: [room for room in rooms if room.startswith("6")],
+        },
+        "big_rooms": {2: [], 6: []},
+    }
+
+
+@pytest.fixture
+def standin(make_config):
+    servers = []
+
+    def start(**faults):
+        config = make_config(**_rooms(["212", "305", "610", "620"]))
+        server = RuzStandInServer(("127.0.0.1", 0), SyntheticPayloads(config), config, FaultOptions(**faults))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _host(make_config, tmp_path: Path, server: RuzStandInServer, **tenants: list[str]) -> HostConfig:
+    return HostConfig(
+        tenants={
+            name: make_config(tmp_path / name / "clean_schedule.json", base_url=server.base_url, **_rooms(rooms))
+            for name, rooms in tenants.items()
+        },
+        dedup_seconds=60.0,
+    )
+
+
+def test_tenants_share_identical_downloads_but_keep_their_own_data(tmp_path: Path, standin, make_config) -> None:
+    server = standin(latency_seconds=0.05)
+    host = TenantHost(_host(make_config, tmp_path, server, math=["212", "610"], physics=["305", "620"]))
+
+    assert host.refresh_all() == {"math": None, "physics": None}
+    host.stop()
+
+    # Three date formats per building, downloaded once for both tenants.
+    assert dict(server.requests) == {145: 3, 147: 3}
+    assert host.pool.downloads == 6
+    math_rooms = {room for rooms in host.service("math").ensure_schedule_cache().values() for room in rooms}
+    physics_rooms = {room for rooms in host.service("physics").ensure_schedule_cache().values() for room in rooms}
+    assert math_rooms == {"212", "610"}
+    assert physics_rooms == {"305", "620"}
+    assert (tmp_path / "math" / "clean_schedule.json").exists()
+    assert (tmp_path / "physics" / "clean_schedule.json").exists()
+
+
+def test_tenants_book_rooms_independently(tmp_path: Path, standin, make_config) -> None:
+    server = standin()
+    host = TenantHost(_host(make_config, tmp_path, server, math=["212"], physics=["212"]))
+    host.refresh_all()
+    slot = parse_pair_slots(host.config.tenants["math"].pair_slots)[0]
+    day = next(
+        date.fromisoformat(key)
+        for key, rooms in sorted(host.service("math").ensure_schedule_cache().items())
+        if not any(slot.overlaps(busy) for busy in rooms.get("212", []))
+    )
+    request = Request("Иван Иванов", "Семинар", day, slot, "212")
+
+    assert host.service("math").reserve([request])[0].status == "ok"
+    assert host.service("math").reserve([request])[0].status == "no free room"
+    assert host.service("physics").reserve([request])[0].status == "ok"
+    host.stop()
+
+
+def test_different_windows_are_not_merged(tmp_path: Path, standin, make_config) -> None:
+    server = standin()
+    config = _host(make_config, tmp_path, server, math=["212"], physics=["212"])
+    tenants = dict(config.tenants)
+    tenants["physics"] = replace(tenants["physics"], schedule_window_months_after=2)
+    host = TenantHost(replace(config, tenants=tenants))
+
+    host.refresh_all()
+    host.stop()
+
+    assert dict(server.requests) == {145: 6, 147: 6}
+
+
+def test_concurrent_identical_requests_are_downloaded_once(standin) -> None:
+    server = standin(latency_seconds=0.2)
+    pool = SharedFetchPool(dedup_seconds=0.0)
+    today = date.today()
+    url = server.base_url.format(building_oid=145) + f"?start={today}&finish={today + timedelta(days=3)}&lng=1"
+    results = []
+    barrier = threading.Barrier(5)
+
+    def fetch() -> None:
+        barrier.wait()
+        results.append(pool.load_json(url, 5.0))
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(results) == 5 and all(item is results[0] for item in results)
+    assert server.requests[145] == 1
+    # With dedup_seconds=0 a later call downloads again, over the kept-alive connection.
+    pool.load_json(url, 5.0)
+    assert server.requests[145] == 2
+    assert pool.connections.opened == 1
+    pool.close()
+
+
+def test_failures_are_not_remembered(standin) -> None:
+    server = standin(fail_buildings=frozenset({145}))
+    pool = SharedFetchPool(dedup_seconds=60.0)
+    url = server.base_url.format(building_oid=145) + "?start=2026-03-01&finish=2026-03-02&lng=1"
+
+    for _ in range(2):
+        with pytest.raises(RuzHttpError) as error:
+            pool.load_json(url, 5.0)
+        assert error.value.status == 503
+
+    assert server.requests[145] == 2
+    pool.close()
+
+
+class _RedirectingHandler(BaseHTTPRequestHandler):
+    # Request targets as received: a path, or an absolute URL when used as a proxy.
+    targets: list[str] = []
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.targets.append(self.path)
+        route = urlsplit(self.path).path
+        location = {"/old": "/new?from=old", "/loop": "/loop"}.get(route)
+        self.send_response(302 if location else 200)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def test_connection_pool_follows_redirects_and_honours_proxies(monkeypatch) -> None:
+    monkeypatch.delenv("no_proxy", raising=False)
+    monkeypatch.delenv("NO_PROXY", raising=False)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RedirectingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    targets = _RedirectingHandler.targets = []
+    try:
+        direct = ConnectionPool(proxies={})
+        assert direct.get(f"{base}/old", 5.0) == b"[]"
+        assert targets == ["/old", "/new?from=old"]
+        assert direct.opened == 1
+        with pytest.raises(RuzHttpError) as error:
+            direct.get(f"{base}/loop", 5.0)
+        assert error.value.status == 302
+        direct.close()
+
+        targets.clear()
+        proxied = ConnectionPool(proxies={"http": base})
+        assert proxied.get("http://ruz.invalid/old", 5.0) == b"[]"
+        assert targets == ["http://ruz.invalid/old", "http://ruz.invalid/new?from=old"]
+        assert proxied.opened == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_rate_limiter_spaces_requests_after_the_burst() -> None:
+    now = [0.0]
+
+    def sleep(seconds: float) -> None:
+        now[0] += seconds
+
+    limiter = RateLimiter(rate=2.0, burst=2, clock=lambda: now[0], sleep=sleep)
+
+    assert [limiter.acquire() for _ in range(5)] == [0.0, 0.0, 0.5, 0.5, 0.5]
+    now[0] += 10.0
+    assert limiter.acquire() == 0.0
+    assert RateLimiter(rate=0).acquire() == 0.0
+
+
+def test_api_routes_requests_by_tenant(tmp_path: Path, standin, make_config) -> None:
+    server = standin()
+    host = TenantHost(_host(make_config, tmp_path, server, math=["212"], physics=["305", "620"]))
+    host.refresh_all()
+    api = TenantApiServer(("127.0.0.1", 0), host.services)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{api.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{base}/physics/health") as response:
+            health = json.loads(response.read())
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/chemistry/health")
+        with urllib.request.urlopen(f"{base}/math/stats") as response:
+            stats = response.read().decode("utf-8")
+    finally:
+        api.shutdown()
+        api.server_close()
+        host.stop()
+
+    assert health["status"] == "ok" and health["days"] > 0
+    assert error.value.code == 404
+    assert "chemistry" in json.loads(error.value.read())["error"]
+    samples = [line for line in stats.splitlines() if not line.startswith("#")]
+    assert any(line.startswith("schedule_last_refresh_timestamp_seconds{") for line in samples)
+    assert samples and all('tenant="math"' in line for line in samples)
+
+
+def test_each_tenant_writes_only_its_own_metrics(tmp_path: Path, standin, make_config) -> None:
+    server = standin()
+    config = replace(
+        _host(make_config, tmp_path, server, math=["212"], physics=["305"]), metrics_path=str(tmp_path / "host.prom")
+    )
+    host = TenantHost(config)
+    host.refresh_all()
+    host.stop()
+
+    for name in ("math", "physics"):
+        path = host.service(name).write_metrics()
+        assert path == tmp_path / name / "metrics.prom"
+        samples = [line for line in path.read_text(encoding="utf-8").splitlines() if not line.startswith("#")]
+        assert any(line.startswith("schedule_refresh_seconds_count{") for line in samples)
+        assert all(f'tenant="{name}"' in line for line in samples)
+    combined = host.write_metrics().read_text(encoding="utf-8")
+    assert 'schedule_last_refresh_timestamp_seconds{tenant="math"}' in combined
+    assert 'schedule_last_refresh_timestamp_seconds{tenant="physics"}' in combined
+
+
+def test_host_config_loads_tenant_files_and_rejects_shared_caches(tmp_path: Path) -> None:
+    tenant = {
+        "base_url": "http://example/{building_oid}",
+        "buildings": {"2": 145},
+        "allowed_rooms": {"2": ["212"]},
+        "schedule_cache_path": str(tmp_path / "math.json"),
+        "metrics_path": str(tmp_path / "math.prom"),
+    }
+    (tmp_path / "math.json.config").write_text(json.dumps(tenant), encoding="utf-8")
+    host_path = tmp_path / "tenants.json"
+    host_path.write_text(
+        json.dumps(
+            {
+                "tenants": {
+                    "math": "math.json.config",
+                    "physics": {**tenant, "schedule_cache_path": str(tmp_path / "p.json"), "metrics_path": str(tmp_path / "p.prom")},
+                },
+                "metrics_path": str(tmp_path / "host.prom"),
+                "ruz_requests_per_second": 5,
+                "fetch_dedup_seconds": 30,
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    config = load_host_config(host_path)
+    assert sorted(config.tenants) == ["math", "physics"]
+    assert config.requests_per_second == 5.0 and config.dedup_seconds == 30.0
+
+    with pytest.raises(ValueError, match="both use"):
+        HostConfig.from_dict({"tenants": {"math": tenant, "physics": tenant}})
+    with pytest.raises(ValueError, match="Tenant 'math' and tenant 'physics' both use .*math.prom"):
+        HostConfig.from_dict(
+            {"tenants": {"math": tenant, "physics": {**tenant, "schedule_cache_path": str(tmp_path / "p.json")}}}
+        )
+    # Different caches with one stem would share the summary and the change log.
+    with pytest.raises(ValueError, match=r"both use .*math\.free_rooms\.json"):
+        HostConfig.from_dict(
+            {
+                "tenants": {
+                    "math": tenant,
+                    "physics": {**tenant, "schedule_cache_path": str(tmp_path / "math.bin"), "metrics_path": str(tmp_path / "p.prom")},
+                }
+            }
+        )
+    with pytest.raises(ValueError, match="The host and tenant 'math' both use"):
+        HostConfig.from_dict({"tenants": {"math": tenant}, "metrics_path": tenant["metrics_path"]})
+    with pytest.raises(ValueError, match="Invalid tenant name"):
+        HostConfig.from_dict({"tenants": {"a/b": tenant}})